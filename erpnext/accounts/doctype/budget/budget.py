@@ -5,9 +5,10 @@
 from __future__ import unicode_literals
 import frappe
 from frappe import _
-from frappe.utils import flt, getdate, add_months, get_last_day, fmt_money
+from frappe.utils import flt, cint, cstr, getdate, add_months, get_first_day, get_last_day, fmt_money
 from frappe.model.naming import make_autoname
 from frappe.model.document import Document
+from erpnext.utilities.raw_insert import add_to_row
 
 class BudgetError(frappe.ValidationError): pass
 class DuplicateBudgetError(frappe.ValidationError): pass
@@ -61,66 +62,197 @@ class Budget(Document):
 		else:
 			self.cost_center = None
 
+	def on_submit(self):
+		make_budget_expenses(self)
+
+	def on_cancel(self):
+		frappe.db.sql("delete from `tabBudget Expense` where budget=%s", self.name)
+
+def get_budgets(company, fiscal_year):
+	"""Returns the submitted budgets of the company for the fiscal year.
+		Budgets are cached and reloaded when a budget of the fiscal year is submitted, cancelled or updated."""
+	signature = frappe.db.sql("""select count(name), max(modified) from `tabBudget`
+		where company=%s and fiscal_year=%s and docstatus=1""", (company, fiscal_year))[0]
+	signature = [cint(signature[0]), cstr(signature[1])]
+
+	key = "{0}::{1}".format(company, fiscal_year)
+	cached = frappe.cache().hget("budgets", key)
+	if cached and cached.get("signature") == signature:
+		return cached.get("budgets")
+
+	budgets = []
+	if signature[0]:
+		for b in frappe.db.sql("""select name, budget_against as budget_against_field, cost_center, project,
+				monthly_distribution, action_if_annual_budget_exceeded,
+				action_if_accumulated_monthly_budget_exceeded
+			from `tabBudget`
+			where company=%s and fiscal_year=%s and docstatus=1""", (company, fiscal_year), as_dict=1):
+				b.budget_against = b.project if b.budget_against_field == "Project" else b.cost_center
+				b.accounts = dict(frappe.db.sql("""select account, budget_amount from `tabBudget Account`
+					where parent=%s""", b.name))
+				budgets.append(b)
+
+	frappe.cache().hset("budgets", key, {"signature": signature, "budgets": budgets})
+	return budgets
+
+def get_budget_entries(gl_entries):
+	"""Returns a list of (budget, gl entry) for the GL entries which fall under a submitted budget"""
+	budget_entries = []
+
+	entries_by_fiscal_year = {}
+	for d in gl_entries:
+		if d.get("fiscal_year") and (d.get("cost_center") or d.get("project")):
+			entries_by_fiscal_year.setdefault((d.company, d.fiscal_year), []).append(d)
+
+	for (company, fiscal_year), entries in entries_by_fiscal_year.items():
+		budgets = get_budgets(company, fiscal_year)
+		if not budgets:
+			continue
+
+		parent_cost_centers = get_parent_cost_centers([d.cost_center for d in entries if d.cost_center])
+		for d in entries:
+			for budget in budgets:
+				if d.account not in budget.accounts:
+					continue
+
+				if budget.budget_against_field == "Project":
+					applicable = d.get("project") and d.project == budget.budget_against
+				else:
+					applicable = budget.budget_against in parent_cost_centers.get(d.cost_center, [])
+
+				if applicable:
+					budget_entries.append((budget, d))
+
+	return budget_entries
+
+def get_parent_cost_centers(cost_centers):
+	"""Returns {cost center: [the cost center and all its parents]}"""
+	cost_centers = list(set(cost_centers))
+	if not cost_centers:
+		return {}
+
+	parent_cost_centers = {}
+	for cost_center, parent in frappe.db.sql("""select cc.name, parent.name
+		from `tabCost Center` cc, `tabCost Center` parent
+		where cc.name in ({0}) and parent.lft <= cc.lft and parent.rgt >= cc.rgt"""
+		.format(", ".join(["%s"] * len(cost_centers))), cost_centers):
+			parent_cost_centers.setdefault(cost_center, []).append(parent)
+
+	return parent_cost_centers
+
+def update_budget_expenses(gl_entries, cancel=False):
+	"""Adds the expense of the GL entries to the running actual expense of the budgets
+		they fall under, per budget, account and month"""
+	expenses = {}
+	for budget, d in get_budget_entries(gl_entries):
+		key = (budget.name, d.account, get_first_day(d.posting_date))
+		expenses[key] = expenses.get(key, 0.0) + flt(d.debit) - flt(d.credit)
+
+	for (budget, account, month_start_date), amount in expenses.items():
+		add_to_budget_expense(budget, account, month_start_date, -1 * amount if cancel else amount)
+
+def reverse_budget_expenses(voucher_type, voucher_no):
+	"""Called before the GL Entries of a voucher are deleted"""
+	update_budget_expenses(frappe.db.sql("""select account, cost_center, project, company, fiscal_year,
+			posting_date, debit, credit
+		from `tabGL Entry`
+		where voucher_type=%s and voucher_no=%s""", (voucher_type, voucher_no), as_dict=1), cancel=True)
+
+def add_to_budget_expense(budget, account, month_start_date, amount):
+	if not flt(amount):
+		return
+
+	add_to_row("Budget Expense", {"budget": budget, "account": account,
+		"month_start_date": month_start_date}, {"amount": flt(amount)})
+
+def make_budget_expenses(budget):
+	"""Builds the running actual expense of the budget from the general ledger"""
+	frappe.db.sql("delete from `tabBudget Expense` where budget=%s", budget.name)
+
+	if budget.budget_against == "Cost Center":
+		lft, rgt = frappe.db.get_value("Cost Center", budget.cost_center, ["lft", "rgt"])
+		condition = """exists(select name from `tabCost Center`
+			where lft>=%s and rgt<=%s and name=gle.cost_center)""" % (lft, rgt)
+	else:
+		condition = "gle.project='%s'" % frappe.db.escape(budget.project)
+
+	accounts = [d.account for d in budget.get("accounts") if d.account]
+	if not accounts:
+		return
+
+	for d in frappe.db.sql("""
+		select gle.account, year(gle.posting_date) as year, month(gle.posting_date) as month,
+			sum(gle.debit) - sum(gle.credit) as amount
+		from `tabGL Entry` gle
+		where gle.company=%s and gle.fiscal_year=%s and gle.docstatus=1
+			and gle.account in ({accounts}) and {condition}
+		group by gle.account, year(gle.posting_date), month(gle.posting_date)"""
+		.format(accounts=", ".join(["%s"] * len(accounts)), condition=condition),
+		[budget.company, budget.fiscal_year] + accounts, as_dict=1):
+			add_to_budget_expense(budget.name, d.account, getdate("{0}-{1}-01".format(d.year, d.month)), d.amount)
+
+def get_budget_expense(budget, account, month_end_date=None):
+	"""Returns the actual expense of the budget account for the fiscal year, or till the month end date"""
+	condition = " and month_start_date <= %(month_end_date)s" if month_end_date else ""
+
+	return flt(frappe.db.sql("""select sum(amount) from `tabBudget Expense`
+		where budget=%(budget)s and account=%(account)s {0}""".format(condition),
+		{"budget": budget, "account": account, "month_end_date": month_end_date})[0][0])
+
 def validate_expense_against_budget(args):
-	args = frappe._dict(args)
-	if not args.cost_center and not args.project:
+	validate_gl_entries_against_budget([args])
+
+def validate_gl_entries_against_budget(gl_entries):
+	"""Validates the expense of all the GL entries of a voucher against the cached budgets,
+		comparing with the running actual expense of each budget account"""
+	gl_entries = [d for d in gl_entries if d.get("cost_center") or d.get("project")]
+	if not gl_entries:
 		return
-	for budget_against in ['project', 'cost_center']:
-		if args.get(budget_against) \
-				and frappe.db.get_value("Account", {"name": args.account, "root_type": "Expense"}):
-
-			if args.project and budget_against == 'project':
-				condition = "and b.project='%s'" % frappe.db.escape(args.project)
-				args.budget_against_field = "Project"
-			
-			elif args.cost_center and budget_against == 'cost_center':
-				cc_lft, cc_rgt = frappe.db.get_value("Cost Center", args.cost_center, ["lft", "rgt"])
-				condition = """and exists(select name from `tabCost Center` 
-					where lft<=%s and rgt>=%s and name=b.cost_center)""" % (cc_lft, cc_rgt)
-				args.budget_against_field = "Cost Center"
-
-			args.budget_against = args.get(budget_against)
-
-			budget_records = frappe.db.sql("""
-				select
-					b.{budget_against_field} as budget_against, ba.budget_amount, b.monthly_distribution,
-					b.action_if_annual_budget_exceeded, 
-					b.action_if_accumulated_monthly_budget_exceeded
-				from 
-					`tabBudget` b, `tabBudget Account` ba
-				where
-					b.name=ba.parent and b.fiscal_year=%s 
-					and ba.account=%s and b.docstatus=1
-					{condition}
-			""".format(condition=condition, 
-				budget_against_field=frappe.scrub(args.get("budget_against_field"))),
-				(args.fiscal_year, args.account), as_dict=True)
-				
-			if budget_records:
-				validate_budget_records(args, budget_records)
+
+	accounts = list(set([d.account for d in gl_entries]))
+	expense_accounts = frappe.db.sql_list("""select name from `tabAccount`
+		where root_type='Expense' and name in ({0})""".format(", ".join(["%s"] * len(accounts))), accounts)
+
+	validated = []
+	for budget, d in get_budget_entries([d for d in gl_entries if d.account in expense_accounts]):
+		key = (budget.name, d.account, get_last_day(d.posting_date))
+		if key in validated:
+			continue
+
+		validated.append(key)
+		validate_budget_records(frappe._dict({
+			"account": d.account,
+			"company": d.company,
+			"fiscal_year": d.fiscal_year,
+			"posting_date": d.posting_date,
+			"budget_against_field": budget.budget_against_field,
+			"budget_against": budget.budget_against
+		}), [budget])
 
 def validate_budget_records(args, budget_records):
 	for budget in budget_records:
-		if flt(budget.budget_amount):
+		budget_amount = flt(budget.accounts.get(args.account))
+		if budget_amount:
 			yearly_action = budget.action_if_annual_budget_exceeded
 			monthly_action = budget.action_if_accumulated_monthly_budget_exceeded
 
 			if monthly_action in ["Stop", "Warn"]:
-				budget_amount = get_accumulated_monthly_budget(budget.monthly_distribution,
-					args.posting_date, args.fiscal_year, budget.budget_amount)
-				args["month_end_date"] = get_last_day(args.posting_date)
+				accumulated_monthly_budget = get_accumulated_monthly_budget(budget.monthly_distribution,
+					args.posting_date, args.fiscal_year, budget_amount)
+				actual_expense = get_budget_expense(budget.name, args.account, get_last_day(args.posting_date))
 
-				compare_expense_with_budget(args, budget_amount, 
+				compare_expense_with_budget(args, accumulated_monthly_budget, actual_expense,
 					_("Accumulated Monthly"), monthly_action, budget.budget_against)
 
 			if yearly_action in ("Stop", "Warn") and monthly_action != "Stop" \
 				and yearly_action != monthly_action:
-				compare_expense_with_budget(args, flt(budget.budget_amount), 
+				actual_expense = get_budget_expense(budget.name, args.account)
+
+				compare_expense_with_budget(args, budget_amount, actual_expense,
 						_("Annual"), yearly_action, budget.budget_against)
 
 
-def compare_expense_with_budget(args, budget_amount, action_for, action, budget_against):
-	actual_expense = get_actual_expense(args)
+def compare_expense_with_budget(args, budget_amount, actual_expense, action_for, action, budget_against):
 	if actual_expense > budget_amount:
 		diff = actual_expense - budget_amount
 		currency = frappe.db.get_value('Company', args.company, 'default_currency')
@@ -148,7 +280,7 @@ def get_actual_expense(args):
 			where lft>=%(lft)s and rgt<=%(rgt)s and name=gle.cost_center)"""
 	
 	elif args.budget_against_field == "Project":
-		condition2 = "and exists(select name from `tabProject` where name=gle.project)"
+		condition2 = "and gle.project=%(budget_against)s"
 
 	return flt(frappe.db.sql("""
 		select sum(gle.debit) - sum(gle.credit)
@@ -5,7 +5,7 @@ from __future__ import unicode_literals
 
 import frappe
 import unittest
-from erpnext.accounts.doctype.budget.budget import get_actual_expense, BudgetError
+from erpnext.accounts.doctype.budget.budget import get_actual_expense, get_budget_expense, BudgetError
 from erpnext.accounts.doctype.journal_entry.test_journal_entry import make_journal_entry
 
 class TestBudget(unittest.TestCase):		
@@ -167,6 +167,29 @@ class TestBudget(unittest.TestCase):
 		frappe.delete_doc('Journal Entry', jv.name)
 		frappe.delete_doc('Cost Center', cost_center)
 
+	def test_budget_expense_on_submit_and_cancel(self):
+		set_total_expense_zero("2013-02-28", "Cost Center")
+
+		budget = make_budget("Cost Center")
+		account = "_Test Account Cost for Goods Sold - _TC"
+		before = get_budget_expense(budget.name, account)
+
+		jv = make_journal_entry(account, "_Test Bank - _TC", 20000, "_Test Cost Center - _TC", submit=True)
+		self.assertEqual(get_budget_expense(budget.name, account) - before, 20000)
+		self.assertEqual(get_budget_expense(budget.name, account), get_actual_expense(frappe._dict({
+			"budget_against_field": "Cost Center",
+			"budget_against": "_Test Cost Center - _TC",
+			"account": account,
+			"company": "_Test Company",
+			"fiscal_year": "_Test Fiscal Year 2013"
+		})))
+
+		jv.cancel()
+		self.assertEqual(get_budget_expense(budget.name, account), before)
+
+		budget.cancel()
+		self.assertFalse(frappe.db.get_value("Budget Expense", {"budget": budget.name}))
+
 def set_total_expense_zero(posting_date, budget_against_field=None, budget_against_CC=None):
 	if budget_against_field == "Project":
 		budget_against = "_Test Project"
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe.model.document import Document
+
+class BudgetExpense(Document):
+	pass
+
+def on_doctype_update():
+	# one row per budget, account and month
+	frappe.db.add_unique("Budget Expense", ["budget", "account", "month_start_date"])
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe.utils import flt
+from frappe.model.document import Document
+from erpnext.utilities.raw_insert import add_to_row
+
+from six import iteritems
+
+invoice_party_field = {
+	"Sales Invoice": ("Customer", "customer"),
+	"Purchase Invoice": ("Supplier", "supplier")
+}
+
+class PartyAccountSummary(Document):
+	pass
+
+def on_doctype_update():
+	# one row per party, company and fiscal year, also serves the lookups by party
+	frappe.db.add_unique("Party Account Summary", ["party_type", "party", "company", "fiscal_year"])
+
+def add_to_summary(party_type, party, company, fiscal_year, currency=None, **amounts):
+	'''Increment the running totals of the summary row for the party, company and fiscal year,
+		creating the row if missing'''
+	amounts = dict((k, flt(v)) for k, v in iteritems(amounts) if flt(v))
+	if not amounts:
+		return
+
+	add_to_row("Party Account Summary", {"party_type": party_type, "party": party, "company": company,
+		"fiscal_year": fiscal_year}, amounts, {"currency": currency})
+
+def update_billing_summary(doc, method=None):
+	'''Called on submit / cancel of Sales Invoice and Purchase Invoice'''
+	from erpnext.accounts.utils import get_fiscal_year
+
+	party_type, party_field = invoice_party_field[doc.doctype]
+	sign = -1 if doc.docstatus == 2 else 1
+
+	add_to_summary(party_type, doc.get(party_field), doc.company,
+		get_fiscal_year(doc.posting_date, company=doc.company)[0],
+		currency=doc.get("party_account_currency"),
+		billing_amount=sign * flt(doc.grand_total),
+		base_billing_amount=sign * flt(doc.base_grand_total))
+
+def update_balance_summary(gle):
+	'''Called for every GL Entry posted against a party'''
+	if not (gle.party_type and gle.party):
+		return
+
+	add_to_summary(gle.party_type, gle.party, gle.company, gle.fiscal_year,
+		currency=gle.account_currency,
+		debit_in_account_currency=gle.debit_in_account_currency,
+		credit_in_account_currency=gle.credit_in_account_currency)
+
+def reverse_balance_summary(voucher_type, voucher_no):
+	'''Called before the GL Entries of a voucher are deleted'''
+	for d in frappe.db.sql("""
+		select party_type, party, company, fiscal_year,
+			sum(debit_in_account_currency) as debit, sum(credit_in_account_currency) as credit
+		from `tabGL Entry`
+		where voucher_type=%s and voucher_no=%s and ifnull(party, '') != ''
+		group by party_type, party, company, fiscal_year""", (voucher_type, voucher_no), as_dict=1):
+			add_to_summary(d.party_type, d.party, d.company, d.fiscal_year,
+				debit_in_account_currency=-1 * flt(d.debit),
+				credit_in_account_currency=-1 * flt(d.credit))
+
+def get_party_summary(party_type, party, fiscal_year=None):
+	'''Returns billing for the fiscal year and the total balance of the party in account currency'''
+	summary = frappe.db.sql("""
+		select
+			sum(if(fiscal_year=%(fiscal_year)s, billing_amount, 0)) as billing_amount,
+			sum(if(fiscal_year=%(fiscal_year)s, base_billing_amount, 0)) as base_billing_amount,
+			sum(debit_in_account_currency) - sum(credit_in_account_currency) as balance
+		from `tabParty Account Summary`
+		where party_type=%(party_type)s and party=%(party)s""",
+		{"party_type": party_type, "party": party, "fiscal_year": fiscal_year}, as_dict=1)
+
+	return summary[0] if summary else frappe._dict()
+
+def get_expected_summary(party_type=None, party=None):
+	'''Computes the summary for all parties (or the given party) from invoices and the general ledger'''
+	from erpnext.accounts.utils import get_fiscal_year
+
+	expected = {}
+
+	def _get_row(key):
+		return expected.setdefault(key, frappe._dict(billing_amount=0.0, base_billing_amount=0.0,
+			debit_in_account_currency=0.0, credit_in_account_currency=0.0, currency=None))
+
+	fiscal_year_map = {}
+	def _get_fiscal_year(posting_date, company):
+		if (posting_date, company) not in fiscal_year_map:
+			fiscal_year_map[(posting_date, company)] = get_fiscal_year(posting_date, company=company)[0]
+		return fiscal_year_map[(posting_date, company)]
+
+	for invoice_doctype, (invoice_party_type, party_field) in iteritems(invoice_party_field):
+		if party_type and party_type != invoice_party_type:
+			continue
+
+		for d in frappe.db.sql("""
+			select {party_field} as party, company, posting_date, max(party_account_currency) as currency,
+				sum(grand_total) as billing_amount, sum(base_grand_total) as base_billing_amount
+			from `tab{doctype}`
+			where docstatus=1 {condition}
+			group by {party_field}, company, posting_date""".format(party_field=party_field,
+				doctype=invoice_doctype, condition="and {0}=%(party)s".format(party_field) if party else ""),
+			{"party": party}, as_dict=1):
+				row = _get_row((invoice_party_type, d.party, d.company,
+					_get_fiscal_year(d.posting_date, d.company)))
+				row.billing_amount += flt(d.billing_amount)
+				row.base_billing_amount += flt(d.base_billing_amount)
+				row.currency = d.currency
+
+	conditions = []
+	if party_type:
+		conditions.append("party_type=%(party_type)s")
+	if party:
+		conditions.append("party=%(party)s")
+
+	for d in frappe.db.sql("""
+		select party_type, party, company, fiscal_year, max(account_currency) as currency,
+			sum(debit_in_account_currency) as debit, sum(credit_in_account_currency) as credit
+		from `tabGL Entry`
+		where ifnull(party, '') != '' {0}
+		group by party_type, party, company, fiscal_year""".format(
+			" and " + " and ".join(conditions) if conditions else ""),
+		{"party_type": party_type, "party": party}, as_dict=1):
+			row = _get_row((d.party_type, d.party, d.company, d.fiscal_year))
+			row.update({
+				"debit_in_account_currency": flt(d.debit),
+				"credit_in_account_currency": flt(d.credit)
+			})
+			row.currency = row.currency or d.currency
+
+	return expected
+
+def check_party_account_summary(party_type=None, party=None, fix=False):
+	'''Compares the maintained summary with the invoices and the general ledger.
+		Returns the mismatching rows, if `fix` is set the summary is rebuilt for those parties.'''
+	expected = get_expected_summary(party_type, party)
+
+	conditions = []
+	if party_type:
+		conditions.append("party_type=%(party_type)s")
+	if party:
+		conditions.append("party=%(party)s")
+
+	actual = {}
+	for d in frappe.db.sql("""select * from `tabParty Account Summary` {0}""".format(
+		"where " + " and ".join(conditions) if conditions else ""),
+		{"party_type": party_type, "party": party}, as_dict=1):
+			actual[(d.party_type, d.party, d.company, d.fiscal_year)] = d
+
+	fields = ("billing_amount", "base_billing_amount",
+		"debit_in_account_currency", "credit_in_account_currency")
+	mismatches = []
+	for key in set(expected) | set(actual):
+		expected_row = expected.get(key) or {}
+		actual_row = actual.get(key) or {}
+		for fieldname in fields:
+			if abs(flt(expected_row.get(fieldname)) - flt(actual_row.get(fieldname))) >= 0.01:
+				mismatches.append(frappe._dict(party_type=key[0], party=key[1], company=key[2],
+					fiscal_year=key[3], fieldname=fieldname,
+					expected=flt(expected_row.get(fieldname)), actual=flt(actual_row.get(fieldname))))
+
+	if fix and mismatches:
+		for key in set((d.party_type, d.party, d.company, d.fiscal_year) for d in mismatches):
+			row = expected.get(key)
+			name = actual[key].name if key in actual else None
+			if not row:
+				frappe.db.sql("delete from `tabParty Account Summary` where name=%s", name)
+				continue
+
+			if not name:
+				add_to_summary(*key, currency=row.currency, billing_amount=row.billing_amount,
+					base_billing_amount=row.base_billing_amount,
+					debit_in_account_currency=row.debit_in_account_currency,
+					credit_in_account_currency=row.credit_in_account_currency)
+				continue
+
+			frappe.db.sql("""update `tabParty Account Summary`
+				set billing_amount=%s, base_billing_amount=%s,
+					debit_in_account_currency=%s, credit_in_account_currency=%s, modified=now()
+				where name=%s""", (row.billing_amount, row.base_billing_amount,
+					row.debit_in_account_currency, row.credit_in_account_currency, name))
+
+	return mismatches
+
+def rebuild_party_account_summary():
+	'''Rebuilds the summary of all parties from invoices and the general ledger'''
+	frappe.db.sql("delete from `tabParty Account Summary`")
+	for key, row in iteritems(get_expected_summary()):
+		summary = frappe.get_doc(dict(row, doctype="Party Account Summary",
+			party_type=key[0], party=key[1], company=key[2], fiscal_year=key[3]))
+		summary.flags.ignore_permissions = 1
+		summary.db_insert()
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from frappe.utils import nowdate
+from erpnext.accounts.utils import get_fiscal_year
+from erpnext.accounts.doctype.sales_invoice.test_sales_invoice import create_sales_invoice
+from erpnext.accounts.doctype.party_account_summary.party_account_summary import get_party_summary, \
+	check_party_account_summary
+
+class TestPartyAccountSummary(unittest.TestCase):
+	def test_summary_on_submit_and_cancel(self):
+		fiscal_year = get_fiscal_year(nowdate(), company="_Test Company")[0]
+		before = get_party_summary("Customer", "_Test Customer", fiscal_year)
+
+		si = create_sales_invoice(rate=500)
+		after_submit = get_party_summary("Customer", "_Test Customer", fiscal_year)
+		self.assertEqual(after_submit.base_billing_amount - before.base_billing_amount, si.base_grand_total)
+		self.assertEqual(after_submit.balance - before.balance, si.grand_total)
+
+		si.cancel()
+		after_cancel = get_party_summary("Customer", "_Test Customer", fiscal_year)
+		self.assertEqual(after_cancel.base_billing_amount, before.base_billing_amount)
+		self.assertEqual(after_cancel.balance, before.balance)
+
+	def test_consistency_check(self):
+		create_sales_invoice(rate=300)
+		check_party_account_summary("Customer", "_Test Customer", fix=True)
+		self.assertFalse(check_party_account_summary("Customer", "_Test Customer"))
+
+		frappe.db.sql("""update `tabParty Account Summary` set billing_amount = billing_amount + 1
+			where party_type='Customer' and party='_Test Customer'""")
+		self.assertTrue(check_party_account_summary("Customer", "_Test Customer"))
+
+		check_party_account_summary("Customer", "_Test Customer", fix=True)
+		self.assertFalse(check_party_account_summary("Customer", "_Test Customer"))
@@ -532,19 +532,26 @@ def get_outstanding_reference_documents(args):
 			.format(frappe.db.escape(args["voucher_type"]), frappe.db.escape(args["voucher_no"]))
 
 	outstanding_invoices = get_outstanding_invoices(args.get("party_type"), args.get("party"),
-		args.get("party_account"), condition=condition)
+		args.get("party_account"), condition=condition, filters=args.get("filters"),
+		limit_start=args.get("limit_start"), limit_page_length=args.get("limit_page_length"))
+
+	invoice_details = get_invoice_details(outstanding_invoices,
+		with_conversion_rate=party_account_currency != company_currency)
 
 	for d in outstanding_invoices:
+		details = invoice_details.get((d.voucher_type, d.voucher_no), {})
 		d["exchange_rate"] = 1
 		if party_account_currency != company_currency:
-			if d.voucher_type in ("Sales Invoice", "Purchase Invoice", "Expense Claim"):
+			if d.voucher_type in ("Sales Invoice", "Purchase Invoice"):
+				d["exchange_rate"] = details.get("conversion_rate")
+			elif d.voucher_type == "Expense Claim":
 				d["exchange_rate"] = frappe.db.get_value(d.voucher_type, d.voucher_no, "conversion_rate")
 			elif d.voucher_type == "Journal Entry":
 				d["exchange_rate"] = get_exchange_rate(
 					party_account_currency,	company_currency, d.posting_date
 				)
 		if d.voucher_type in ("Purchase Invoice"):
-			d["bill_no"] = frappe.db.get_value(d.voucher_type, d.voucher_no, "bill_no")
+			d["bill_no"] = details.get("bill_no")
 
 	# Get all SO / PO which are not fully billed or aginst which full advance not paid
 	orders_to_be_billed = []
@@ -555,6 +562,23 @@ def get_outstanding_reference_documents(args):
 	return negative_outstanding_invoices + outstanding_invoices + orders_to_be_billed
 
 
+def get_invoice_details(invoices, with_conversion_rate=False):
+	"""Returns {(voucher_type, voucher_no): details} with the conversion rate and bill no
+		of the Sales and Purchase Invoices, fetched with one query per voucher type"""
+	invoice_details = {}
+	for voucher_type in ("Sales Invoice", "Purchase Invoice"):
+		fields = (["conversion_rate"] if with_conversion_rate else []) \
+			+ (["bill_no"] if voucher_type == "Purchase Invoice" else [])
+		names = [d.voucher_no for d in invoices if d.voucher_type == voucher_type]
+		if not (fields and names):
+			continue
+
+		for d in frappe.get_all(voucher_type, fields=["name"] + fields,
+			filters={"name": ("in", names)}):
+			invoice_details[(voucher_type, d.name)] = d
+
+	return invoice_details
+
 def get_orders_to_be_billed(posting_date, party_type, party, party_account_currency, company_currency):
 	if party_type == "Customer":
 		voucher_type = 'Sales Order'
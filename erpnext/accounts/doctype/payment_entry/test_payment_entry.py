@@ -254,6 +254,69 @@ class TestPaymentEntry(unittest.TestCase):
 		outstanding_amount = flt(frappe.db.get_value("Sales Invoice", si1.name, "outstanding_amount"))
 		self.assertEqual(outstanding_amount, -100)
 
+	def test_reconcile_advance_against_multiple_invoices(self):
+		from erpnext.accounts.utils import reconcile_against_document
+		from erpnext.accounts.doctype.payment_entry.payment_entry import PaymentEntry
+
+		pe = frappe.get_doc({
+			"doctype": "Payment Entry",
+			"payment_type": "Receive",
+			"party_type": "Customer",
+			"party": "_Test Customer",
+			"company": "_Test Company",
+			"paid_from_account_currency": "INR",
+			"paid_to_account_currency": "INR",
+			"source_exchange_rate": 1,
+			"target_exchange_rate": 1,
+			"reference_no": "1",
+			"reference_date": nowdate(),
+			"received_amount": 300,
+			"paid_amount": 300,
+			"paid_from": "Debtors - _TC",
+			"paid_to": "_Test Cash - _TC"
+		})
+		pe.insert()
+		pe.submit()
+
+		invoices = [create_sales_invoice(qty=1, rate=100) for i in range(3)]
+		allocations = [frappe._dict({
+			"voucher_type": "Payment Entry",
+			"voucher_no": pe.name,
+			"voucher_detail_no": None,
+			"against_voucher_type": "Sales Invoice",
+			"against_voucher": si.name,
+			"account": "Debtors - _TC",
+			"party_type": "Customer",
+			"party": "_Test Customer",
+			"dr_or_cr": "credit_in_account_currency",
+			"unadjusted_amount": 300,
+			"allocated_amount": 100,
+			"grand_total": si.grand_total,
+			"outstanding_amount": si.outstanding_amount,
+			"exchange_rate": 1
+		}) for si in invoices]
+
+		reposts = []
+		make_gl_entries = PaymentEntry.make_gl_entries
+		def _make_gl_entries(doc, cancel=0, adv_adj=0):
+			reposts.append(cancel)
+			return make_gl_entries(doc, cancel=cancel, adv_adj=adv_adj)
+
+		PaymentEntry.make_gl_entries = _make_gl_entries
+		try:
+			reconcile_against_document(allocations)
+		finally:
+			PaymentEntry.make_gl_entries = make_gl_entries
+
+		# cancelled and reposted once for all the invoices
+		self.assertEqual(reposts, [1, 0])
+
+		pe.load_from_db()
+		self.assertEqual(len(pe.references), 3)
+		self.assertEqual(pe.unallocated_amount, 0)
+		for si in invoices:
+			self.assertEqual(flt(frappe.db.get_value("Sales Invoice", si.name, "outstanding_amount")), 0)
+
 	def validate_gl_entries(self, voucher_no, expected_gle):
 		gl_entries = self.get_gle(voucher_no)
 
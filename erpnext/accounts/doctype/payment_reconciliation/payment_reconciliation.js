@@ -100,6 +100,18 @@ erpnext.accounts.PaymentReconciliationController = frappe.ui.form.Controller.ext
 
 	},
 
+	auto_match: function() {
+		var me = this;
+		return this.frm.call({
+			doc: me.frm.doc,
+			method: 'auto_match',
+			callback: function(r, rt) {
+				me.set_invoice_options();
+				me.toggle_primary_action();
+			}
+		});
+	},
+
 	reconcile: function() {
 		var me = this;
 		return this.frm.call({
@@ -2,8 +2,9 @@
 # For license information, please see license.txt
 
 from __future__ import unicode_literals
-import frappe
-from frappe.utils import flt
+import frappe, re
+from collections import deque
+from frappe.utils import flt, cstr, getdate, nowdate
 from frappe import msgprint, _
 from frappe.model.document import Document
 from erpnext.accounts.utils import get_outstanding_invoices
@@ -68,11 +69,34 @@ class PaymentReconciliation(Document):
 
 		return list(journal_entries)
 
-	def add_payment_entries(self, entries):
+	def add_payment_entries(self, entries, allocations=None):
 		self.set('payments', [])
-		for e in entries:
-			row = self.append('payments', {})
-			row.update(e)
+		for i, e in enumerate(entries):
+			# a payment allocated against multiple invoices is added once for every invoice
+			for invoice, allocated_amount in (allocations[i] if allocations else None) or [(None, None)]:
+				row = self.append('payments', {})
+				row.update(e)
+				if invoice:
+					row.invoice_number = "{0} | {1}".format(invoice.voucher_type, invoice.voucher_no)
+					row.allocated_amount = allocated_amount
+
+	def auto_match(self):
+		"""Fetches the unreconciled entries and proposes the allocation of the payments
+			against the invoices, to be reviewed and posted via Reconcile"""
+		self.check_mandatory_to_fetch()
+
+		payments = self.get_payment_entries() + self.get_jv_entries()
+		invoices = get_outstanding_invoices(self.party_type, self.party,
+			self.receivable_payable_account, condition=self.check_condition())
+
+		allocations = get_auto_matches(payments, invoices, get_payment_references(payments),
+			precision=self.precision("allocated_amount", "payments") or 2)
+
+		self.add_payment_entries(payments, allocations)
+		self.add_invoice_entries(invoices)
+
+		msgprint(_("{0} allocations proposed, please review and Reconcile").format(
+			sum(len(d) for d in allocations)))
 
 	def get_invoice_entries(self):
 		#Fetch JVs, Sales and Purchase Invoices for 'invoices' to reconcile against
@@ -150,9 +174,12 @@ class PaymentReconciliation(Document):
 			unreconciled_invoices.setdefault(d.invoice_type, {}).setdefault(d.invoice_number, d.outstanding_amount)
 
 		invoices_to_reconcile = []
+		invoice_allocations = {}
 		for p in self.get("payments"):
 			if p.invoice_type and p.invoice_number and p.allocated_amount:
 				invoices_to_reconcile.append(p.invoice_number)
+				invoice_allocations[(p.invoice_type, p.invoice_number)] = \
+					invoice_allocations.get((p.invoice_type, p.invoice_number), 0) + flt(p.allocated_amount)
 
 				if p.invoice_number not in unreconciled_invoices.get(p.invoice_type, {}):
 					frappe.throw(_("{0}: {1} not found in Invoice Details table")
@@ -167,6 +194,13 @@ class PaymentReconciliation(Document):
 					frappe.throw(_("Row {0}: Allocated amount {1} must be less than or equals to invoice outstanding amount {2}")
 						.format(p.idx, p.allocated_amount, invoice_outstanding))
 
+		# an invoice can be allocated against multiple payments
+		for (invoice_type, invoice_number), allocated_amount in invoice_allocations.items():
+			invoice_outstanding = unreconciled_invoices.get(invoice_type, {}).get(invoice_number)
+			if allocated_amount - invoice_outstanding > 0.009:
+				frappe.throw(_("Total allocated amount {0} against {1} {2} must be less than or equals to its outstanding amount {3}")
+					.format(allocated_amount, invoice_type, invoice_number, invoice_outstanding))
+
 		if not invoices_to_reconcile:
 			frappe.throw(_("Please select Allocated Amount, Invoice Type and Invoice Number in atleast one row"))
 
@@ -185,3 +219,71 @@ class PaymentReconciliation(Document):
 			cond += " and `{0}` <= {1}".format(dr_or_cr, flt(self.maximum_amount))
 
 		return cond
+
+def get_payment_references(payments):
+	"""Returns {(reference_type, reference_name): text} of the reference nos and remarks of the payments"""
+	references = {}
+	for doctype, fields in (("Payment Entry", "reference_no, remarks"), ("Journal Entry", "cheque_no, user_remark")):
+		names = list(set(p.reference_name for p in payments if p.reference_type == doctype))
+		if not names:
+			continue
+
+		for d in frappe.db.sql("""select name, {0} from `tab{1}` where name in ({2})""".format(
+			fields, doctype, ", ".join(["%s"] * len(names))), tuple(names)):
+				references[(doctype, d[0])] = " ".join(cstr(value) for value in d[1:])
+
+	return references
+
+def get_auto_matches(payments, invoices, references=None, precision=2):
+	"""Proposes the allocation of the payments against the outstanding invoices.
+		Returns [(invoice, allocated amount)] for every payment.
+
+		Invoices quoted in the reference no or remarks of a payment are matched first, then payments
+		with an invoice of exactly the same outstanding amount. The balance is allocated in a single
+		sweep over the payments by posting date and the invoices by due date (first in first out)."""
+	payment_balances = [flt(p.amount, precision) for p in payments]
+	invoice_balances = [flt(d.outstanding_amount, precision) for d in invoices]
+	allocations = [[] for p in payments]
+
+	def allocate(i, j):
+		amount = flt(min(payment_balances[i], invoice_balances[j]), precision)
+		if amount > 0:
+			payment_balances[i] = flt(payment_balances[i] - amount, precision)
+			invoice_balances[j] = flt(invoice_balances[j] - amount, precision)
+			allocations[i].append((invoices[j], amount))
+
+	# invoice numbers in the references
+	invoice_index = dict((d.voucher_no, j) for j, d in enumerate(invoices))
+	for i, p in enumerate(payments):
+		reference = cstr((references or {}).get((p.reference_type, p.reference_name)))
+		for token in re.split(r"[\s,;:()]+", reference):
+			j = invoice_index.get(token)
+			if j is not None and payment_balances[i] > 0:
+				allocate(i, j)
+
+	# exact amounts, the invoice due first is matched first
+	invoice_order = sorted(range(len(invoices)),
+		key=lambda j: getdate(invoices[j].get("due_date") or invoices[j].get("posting_date") or nowdate()))
+
+	invoices_by_amount = {}
+	for j in invoice_order:
+		if invoice_balances[j] > 0:
+			invoices_by_amount.setdefault(invoice_balances[j], deque()).append(j)
+
+	for i in range(len(payments)):
+		if payment_balances[i] > 0 and invoices_by_amount.get(payment_balances[i]):
+			allocate(i, invoices_by_amount[payment_balances[i]].popleft())
+
+	# first in first out
+	payment_order = sorted(range(len(payments)),
+		key=lambda i: getdate(payments[i].get("posting_date") or nowdate()))
+
+	j = 0
+	for i in payment_order:
+		while payment_balances[i] > 0 and j < len(invoice_order):
+			if invoice_balances[invoice_order[j]] > 0:
+				allocate(i, invoice_order[j])
+			else:
+				j += 1
+
+	return allocations
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from erpnext.accounts.doctype.payment_reconciliation.payment_reconciliation import get_auto_matches
+
+class TestPaymentReconciliation(unittest.TestCase):
+	def test_auto_matches(self):
+		payments = [frappe._dict(d) for d in (
+			{"reference_type": "Payment Entry", "reference_name": "PE-1", "amount": 100, "posting_date": "2018-01-05"},
+			{"reference_type": "Payment Entry", "reference_name": "PE-2", "amount": 250, "posting_date": "2018-01-01"},
+			{"reference_type": "Journal Entry", "reference_name": "JV-1", "amount": 80, "posting_date": "2018-01-03"}
+		)]
+		invoices = [frappe._dict(d) for d in (
+			{"voucher_type": "Sales Invoice", "voucher_no": "SINV-1", "outstanding_amount": 150, "due_date": "2018-01-10"},
+			{"voucher_type": "Sales Invoice", "voucher_no": "SINV-2", "outstanding_amount": 100, "due_date": "2018-01-20"},
+			{"voucher_type": "Sales Invoice", "voucher_no": "SINV-3", "outstanding_amount": 120, "due_date": "2018-01-15"}
+		)]
+
+		allocations = get_auto_matches(payments, invoices, {("Journal Entry", "JV-1"): "against SINV-3"})
+		allocations = [[(invoice.voucher_no, amount) for invoice, amount in d] for d in allocations]
+
+		# exact amount, FIFO by due date and the invoice quoted in the reference
+		self.assertEqual(allocations, [
+			[("SINV-2", 100)],
+			[("SINV-1", 150), ("SINV-3", 40)],
+			[("SINV-3", 80)]
+		])
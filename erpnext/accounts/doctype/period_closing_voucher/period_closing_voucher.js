@@ -4,8 +4,31 @@
 frappe.ui.form.on('Period Closing Voucher', {
 	onload: function(frm) {
 		if (!frm.doc.transaction_date) frm.doc.transaction_date = frappe.datetime.obj_to_str(new Date());
+
+		// closing entries of a large number of balances are posted in the background
+		frappe.realtime.on("period_closing_progress", function(data) {
+			if (data.voucher_no === frm.doc.name) {
+				if (data.failed) {
+					frappe.hide_msgprint(true);
+					frm.reload_doc();
+					return;
+				}
+
+				frappe.show_progress(__("Posting Closing Entries"), data.progress[0], data.progress[1]);
+				if (data.progress[0] === data.progress[1]) {
+					frm.reload_doc();
+				}
+			}
+		});
 	},
 	
+	on_submit: function(frm) {
+		// closing entries of a large number of balances are posted once the submit is committed
+		if (frm.doc.closing_entries_status === "Queued") {
+			frm.call("enqueue_closing_gl_entries").then(() => frm.reload_doc());
+		}
+	},
+
 	setup: function(frm) {
 		frm.set_query("closing_account_head", function() {
 			return {
@@ -20,6 +43,7 @@ frappe.ui.form.on('Period Closing Voucher', {
 	},
 	
 	refresh: function(frm) {
+		frm.set_intro("");
 		if(frm.doc.docstatus==1) {
 			frm.add_custom_button(__('Ledger'), function() {
 				frappe.route_options = {
@@ -31,6 +55,15 @@ frappe.ui.form.on('Period Closing Voucher', {
 				};
 				frappe.set_route("query-report", "General Ledger");
 			}, "fa fa-table");
+
+			if (frm.doc.closing_entries_status === "Queued") {
+				frm.set_intro(__("Closing entries are being posted in the background"));
+			} else if (frm.doc.closing_entries_status === "Failed") {
+				frm.set_intro(__("Posting of the closing entries failed, see Closing Entries Error"));
+				frm.add_custom_button(__('Retry Closing Entries'), function() {
+					frm.call("enqueue_closing_gl_entries").then(() => frm.reload_doc());
+				});
+			}
 		}
 	}
 	
@@ -2,21 +2,49 @@
 # License: GNU General Public License v3. See license.txt
 
 from __future__ import unicode_literals
-import frappe
+import frappe, erpnext
 from frappe.utils import flt
 from frappe import _
+from frappe.model.meta import get_field_precision
 from erpnext.accounts.utils import get_account_currency
 from erpnext.controllers.accounts_controller import AccountsController
 
+# closing more balances than this is posted in a background job
+BACKGROUND_POSTING_THRESHOLD = 5000
+
 class PeriodClosingVoucher(AccountsController):
 	def validate(self):
 		self.validate_account_head()
 		self.validate_posting_date()
 
 	def on_submit(self):
-		self.make_gl_entries()
+		pl_balances = self.get_pl_balances()
+		if len(pl_balances) > BACKGROUND_POSTING_THRESHOLD:
+			# the job is started by the form once the submit is committed,
+			# via `enqueue_closing_gl_entries`
+			self.db_set("closing_entries_status", "Queued")
+			frappe.msgprint(_("The closing entries of {0} balances will be posted in the background")
+				.format(len(pl_balances)))
+		else:
+			self.make_gl_entries(pl_balances)
+			self.db_set("closing_entries_status", "Completed")
+
+	@frappe.whitelist()
+	def enqueue_closing_gl_entries(self):
+		"""Posts the closing entries in a background job, called after submit for a Queued voucher
+			and to retry a failed job"""
+		if self.docstatus != 1 or self.closing_entries_status == "Completed":
+			return
+
+		self.db_set("closing_entries_status", "Queued")
+		self.db_set("closing_entries_error", None)
+		frappe.enqueue("erpnext.accounts.doctype.period_closing_voucher.period_closing_voucher.make_closing_gl_entries",
+			queue="long", timeout=3600, voucher_no=self.name)
 
 	def on_cancel(self):
+		from erpnext.accounts.doctype.budget.budget import reverse_budget_expenses
+
+		reverse_budget_expenses(self.doctype, self.name)
 		frappe.db.sql("""delete from `tabGL Entry`
 			where voucher_type = 'Period Closing Voucher' and voucher_no=%s""", self.name)
 
@@ -46,40 +74,79 @@ class PeriodClosingVoucher(AccountsController):
 			frappe.throw(_("Another Period Closing Entry {0} has been made after {1}")
 				.format(pce[0][0], self.posting_date))
 
-	def make_gl_entries(self):
+	def make_gl_entries(self, pl_balances=None, publish_progress=False):
+		"""Posts the closing entries with multi-row inserts, the entries are balanced by
+			construction so the generic merge, round off and budget checks are not required"""
+		from erpnext.accounts.general_ledger import insert_gl_entries
+		from erpnext.accounts.doctype.gl_entry.gl_entry import check_freezing_date, validate_frozen_account
+		from erpnext.accounts.doctype.budget.budget import update_budget_expenses
+
+		check_freezing_date(self.posting_date)
+		validate_frozen_account(self.closing_account_head)
+
+		gl_entries = self.get_gl_entries(self.get_pl_balances() if pl_balances is None else pl_balances)
+
+		def _publish_progress(count):
+			if publish_progress:
+				frappe.publish_realtime("period_closing_progress", {"voucher_no": self.name,
+					"progress": [count, len(gl_entries)]}, user=self.owner)
+
+		insert_gl_entries(gl_entries, _publish_progress)
+		update_budget_expenses(gl_entries)
+
+	def get_gl_entries(self, pl_balances):
 		gl_entries = []
 		net_pl_balance = 0
-		pl_accounts = self.get_pl_balances()
-
-		for acc in pl_accounts:
-			if flt(acc.balance_in_company_currency):
-				gl_entries.append(self.get_gl_dict({
+		company_currency = erpnext.get_company_currency(self.company)
+		precision = get_field_precision(frappe.get_meta("GL Entry").get_field("debit"),
+			currency=company_currency)
+
+		def _get_gl_dict(args):
+			gl_dict = frappe._dict({
+				'company': self.company,
+				'posting_date': self.posting_date,
+				'fiscal_year': self.fiscal_year,
+				'voucher_type': self.doctype,
+				'voucher_no': self.name,
+				'remarks': self.get("remarks"),
+				'is_opening': "No",
+				'cost_center': None
+			})
+			gl_dict.update(args)
+			return gl_dict
+
+		for acc in pl_balances:
+			balance_in_account_currency = flt(acc.balance_in_account_currency, precision)
+			balance_in_company_currency = flt(acc.balance_in_company_currency, precision)
+			if balance_in_company_currency:
+				gl_entries.append(_get_gl_dict({
 					"account": acc.account,
 					"cost_center": acc.cost_center,
 					"account_currency": acc.account_currency,
-					"debit_in_account_currency": abs(flt(acc.balance_in_account_currency)) \
-						if flt(acc.balance_in_account_currency) < 0 else 0,
-					"debit": abs(flt(acc.balance_in_company_currency)) \
-						if flt(acc.balance_in_company_currency) < 0 else 0,
-					"credit_in_account_currency": abs(flt(acc.balance_in_account_currency)) \
-						if flt(acc.balance_in_account_currency) > 0 else 0,
-					"credit": abs(flt(acc.balance_in_company_currency)) \
-						if flt(acc.balance_in_company_currency) > 0 else 0
+					"debit_in_account_currency": abs(balance_in_account_currency) \
+						if balance_in_account_currency < 0 else 0,
+					"debit": abs(balance_in_company_currency) \
+						if balance_in_company_currency < 0 else 0,
+					"credit_in_account_currency": abs(balance_in_account_currency) \
+						if balance_in_account_currency > 0 else 0,
+					"credit": abs(balance_in_company_currency) \
+						if balance_in_company_currency > 0 else 0
 				}))
 
-				net_pl_balance += flt(acc.balance_in_company_currency)
+				net_pl_balance += balance_in_company_currency
 
+		net_pl_balance = flt(net_pl_balance, precision)
 		if net_pl_balance:
-			gl_entries.append(self.get_gl_dict({
+			gl_entries.append(_get_gl_dict({
 				"account": self.closing_account_head,
+				"account_currency": company_currency,
 				"debit_in_account_currency": abs(net_pl_balance) if net_pl_balance > 0 else 0,
 				"debit": abs(net_pl_balance) if net_pl_balance > 0 else 0,
 				"credit_in_account_currency": abs(net_pl_balance) if net_pl_balance < 0 else 0,
 				"credit": abs(net_pl_balance) if net_pl_balance < 0 else 0
 			}))
 
-		from erpnext.accounts.general_ledger import make_gl_entries
-		make_gl_entries(gl_entries)
+		return gl_entries
 
 	def get_pl_balances(self):
 		"""Get balance for pl accounts"""
@@ -93,4 +160,33 @@ class PeriodClosingVoucher(AccountsController):
 			and t2.docstatus < 2 and t2.company = %s
 			and t1.posting_date between %s and %s
 			group by t1.account, t1.cost_center
+			having balance_in_company_currency != 0
 		""", (self.company, self.get("year_start_date"), self.posting_date), as_dict=1)
+
+def make_closing_gl_entries(voucher_no):
+	"""Background job, posts the closing entries of a submitted Period Closing Voucher and
+		records the outcome in `closing_entries_status`"""
+	doc = frappe.get_doc("Period Closing Voucher", voucher_no)
+	if doc.docstatus != 1:
+		set_closing_entries_failed(doc, _("Closing entries not posted, the voucher is not submitted"))
+		return
+
+	if frappe.db.get_value("GL Entry", {"voucher_type": doc.doctype, "voucher_no": doc.name}):
+		doc.db_set("closing_entries_status", "Completed")
+		return
+
+	try:
+		doc.make_gl_entries(publish_progress=True)
+		doc.db_set("closing_entries_status", "Completed")
+	except Exception:
+		frappe.db.rollback()
+		set_closing_entries_failed(doc, frappe.get_traceback())
+		raise
+
+def set_closing_entries_failed(doc, error):
+	doc.db_set("closing_entries_status", "Failed")
+	doc.db_set("closing_entries_error", error)
+	frappe.db.commit()
+
+	frappe.publish_realtime("period_closing_progress", {"voucher_no": doc.name, "failed": 1},
+		user=doc.owner)
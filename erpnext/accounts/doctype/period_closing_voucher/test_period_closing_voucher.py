@@ -8,6 +8,7 @@ import frappe
 from frappe.utils import flt, today
 from erpnext.accounts.utils import get_fiscal_year, now
 from erpnext.accounts.doctype.journal_entry.test_journal_entry import make_journal_entry
+from erpnext.accounts.doctype.period_closing_voucher.period_closing_voucher import make_closing_gl_entries
 
 class TestPeriodClosingVoucher(unittest.TestCase):
 	def test_closing_entry(self):
@@ -52,6 +53,18 @@ class TestPeriodClosingVoucher(unittest.TestCase):
 
 		self.assertEqual(gle_amount_for_closing_account, profit_or_loss)
 
+		# closing entries are balanced and posted as submitted entries
+		debit, credit = frappe.db.sql("""select sum(debit), sum(credit) from `tabGL Entry`
+			where voucher_type='Period Closing Voucher' and voucher_no=%s and docstatus=1""", pcv.name)[0]
+		self.assertEqual(flt(debit), flt(credit))
+		self.assertEqual(pcv.closing_entries_status, "Completed")
+
+		# the background job does not post the entries twice
+		count = frappe.db.count("GL Entry", {"voucher_type": "Period Closing Voucher", "voucher_no": pcv.name})
+		make_closing_gl_entries(pcv.name)
+		self.assertEqual(frappe.db.count("GL Entry",
+			{"voucher_type": "Period Closing Voucher", "voucher_no": pcv.name}), count)
+
 		if random_expense_account:
 			# Check posted value for teh above random_expense_account
 			gle_for_random_expense_account = frappe.db.sql("""
@@ -65,6 +78,35 @@ class TestPeriodClosingVoucher(unittest.TestCase):
 			self.assertEqual(gle_for_random_expense_account[0].amount_in_account_currency,
 				-1*random_expense_account[0].balance_in_account_currency)
 
+	def test_closing_entries_in_background(self):
+		from erpnext.accounts.doctype.period_closing_voucher import period_closing_voucher
+
+		make_journal_entry("_Test Bank - _TC", "Sales - _TC", 400,
+			"_Test Cost Center - _TC", posting_date=now(), submit=True)
+
+		threshold = period_closing_voucher.BACKGROUND_POSTING_THRESHOLD
+		period_closing_voucher.BACKGROUND_POSTING_THRESHOLD = 0
+		try:
+			pcv = self.make_period_closing_voucher()
+		finally:
+			period_closing_voucher.BACKGROUND_POSTING_THRESHOLD = threshold
+
+		# queued on submit, nothing posted until the job runs
+		self.assertEqual(pcv.closing_entries_status, "Queued")
+		self.assertFalse(frappe.db.count("GL Entry",
+			{"voucher_type": "Period Closing Voucher", "voucher_no": pcv.name}))
+
+		make_closing_gl_entries(pcv.name)
+		self.assertEqual(frappe.db.get_value("Period Closing Voucher", pcv.name, "closing_entries_status"),
+			"Completed")
+
+		debit, credit = frappe.db.sql("""select sum(debit), sum(credit) from `tabGL Entry`
+			where voucher_type='Period Closing Voucher' and voucher_no=%s and docstatus=1""", pcv.name)[0]
+		self.assertTrue(flt(debit))
+		self.assertEqual(flt(debit), flt(credit))
+
+		pcv.cancel()
+
 	def make_period_closing_voucher(self):
 		pcv = frappe.get_doc({
 			"doctype": "Period Closing Voucher",
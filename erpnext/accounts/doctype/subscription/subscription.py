@@ -10,10 +10,16 @@ from frappe.desk.form import assign_to
 from frappe.utils.jinja import validate_template
 from dateutil.relativedelta import relativedelta
 from frappe.utils.user import get_system_managers
-from frappe.utils import cstr, getdate, split_emails, add_days, today, get_last_day, get_first_day
+from frappe.utils import cstr, getdate, split_emails, add_days, today, get_last_day, get_first_day, \
+	now_datetime, add_to_date
 from frappe.model.document import Document
 
 month_map = {'Monthly': 1, 'Quarterly': 3, 'Half-yearly': 6, 'Yearly': 12}
+SUBSCRIPTION_BATCH_SIZE = 50
+
+# a run with no queued batch and no progress for this long has lost its batch jobs
+RUN_INACTIVITY_MINUTES = 30
+
 class Subscription(Document):
 	def validate(self):
 		self.update_status()
@@ -106,16 +112,59 @@ def get_next_schedule_date(start_date, frequency, repeat_on_day):
 	return next_date
 
 def make_subscription_entry(date=None):
+	"""Hourly, splits the due subscriptions in batches which are processed
+		in parallel by background workers and records the run in a Subscription Run"""
 	date = date or today()
-	for data in get_subscription_entries(date):
-		schedule_date = getdate(data.next_schedule_date)
-		while schedule_date <= getdate(today()):
-			create_documents(data, schedule_date)
-			schedule_date = get_next_schedule_date(schedule_date,
-				data.frequency, data.repeat_on_day)
 
-			if schedule_date and not frappe.db.get_value('Subscription', data.name, 'disabled'):
-				frappe.db.set_value('Subscription', data.name, 'next_schedule_date', schedule_date)
+	# the batches of the previous run are still being processed
+	if get_pending_run():
+		return
+
+	subscriptions = [d.name for d in get_subscription_entries(date)]
+	if not subscriptions:
+		return
+
+	batches = [subscriptions[i:i + SUBSCRIPTION_BATCH_SIZE]
+		for i in range(0, len(subscriptions), SUBSCRIPTION_BATCH_SIZE)]
+
+	run = frappe.get_doc({
+		"doctype": "Subscription Run",
+		"run_date": date,
+		"status": "In Progress",
+		"started_on": now_datetime(),
+		"subscriptions": len(subscriptions),
+		"batches": len(batches)
+	})
+	run.flags.ignore_permissions = True
+	run.insert()
+	frappe.db.commit()
+
+	for batch in batches:
+		if frappe.flags.in_test:
+			make_subscription_entries(batch, date, run.name)
+		else:
+			frappe.enqueue("erpnext.accounts.doctype.subscription.subscription.make_subscription_entries",
+				queue="long", timeout=3600, subscriptions=batch, date=date, run=run.name)
+
+def get_pending_run():
+	"""Returns the Subscription Run which still has batches queued or being processed.
+		Runs whose batch jobs were lost (worker killed, job timeout) are marked Interrupted,
+		their subscriptions are still due and are picked up by the next run"""
+	queued_batches = []
+	if not frappe.flags.in_test:
+		from frappe.utils.background_jobs import get_jobs
+		queued_batches = [d for d in get_jobs(site=frappe.local.site, queue="long",
+			key="job_name").get(frappe.local.site, [])
+			if d == "erpnext.accounts.doctype.subscription.subscription.make_subscription_entries"]
+
+	for run in frappe.db.sql("""select name, modified from `tabSubscription Run`
+		where status='In Progress'""", as_dict=1):
+		if queued_batches or run.modified > add_to_date(now_datetime(), minutes=-RUN_INACTIVITY_MINUTES):
+			return run.name
+
+		frappe.db.sql("""update `tabSubscription Run` set status='Interrupted', completed_on=%s
+			where name=%s""", (now_datetime(), run.name))
+		frappe.db.commit()
 
 def get_subscription_entries(date):
 	return frappe.db.sql(""" select * from `tabSubscription`
@@ -124,22 +173,92 @@ def get_subscription_entries(date):
 			and next_schedule_date <= ifnull(end_date, '2199-12-31')
 			and ifnull(disabled, 0) = 0 and status != 'Stopped' """, (date), as_dict=1)
 
-def create_documents(data, schedule_date):
+def make_subscription_entries(subscriptions, date, run=None):
+	"""Background job, creates the documents of a batch of subscriptions
+		and adds the counts to the Subscription Run"""
+	documents_created = catch_up_documents = failed_subscriptions = 0
 	try:
-		doc = make_new_document(data, schedule_date)
+		for name in subscriptions:
+			try:
+				created, failed = make_documents(name, date)
+			except Exception:
+				# e.g. lock wait timeout or deadlock, the subscription is still due for the next run
+				frappe.db.rollback()
+				frappe.log_error(frappe.get_traceback(), _("Subscription {0} not processed").format(name))
+				created, failed = 0, True
+
+			documents_created += created
+			catch_up_documents += max(created - 1, 0)
+			failed_subscriptions += failed
+
+			if run:
+				# progress of the run, a run without progress is considered interrupted
+				frappe.db.sql("""update `tabSubscription Run` set modified=%s where name=%s""",
+					(now_datetime(), run))
+				frappe.db.commit()
+	finally:
+		if run:
+			frappe.db.sql("""update `tabSubscription Run`
+				set documents_created = documents_created + %s, catch_up_documents = catch_up_documents + %s,
+					failed_subscriptions = failed_subscriptions + %s, batches_completed = batches_completed + 1,
+					modified = %s
+				where name=%s""", (documents_created, catch_up_documents, failed_subscriptions,
+					now_datetime(), run))
+
+			frappe.db.sql("""update `tabSubscription Run` set status='Completed', completed_on=%s
+				where name=%s and status='In Progress' and batches_completed >= batches""",
+				(now_datetime(), run))
+			frappe.db.commit()
+
+def make_documents(name, date):
+	"""Creates the documents of the subscription for all the schedule dates up to the date.
+		Returns the number of documents created and whether the subscription failed"""
+	created = 0
+	while True:
+		# the subscription is locked and read again, if another worker has processed
+		# the schedule date in the meantime the next schedule date is after the date
+		data = frappe.db.sql(""" select * from `tabSubscription`
+			where name = %s and docstatus = 1 and next_schedule_date <= %s
+				and reference_document is not null and reference_document != ''
+				and next_schedule_date <= ifnull(end_date, '2199-12-31')
+				and ifnull(disabled, 0) = 0 and status != 'Stopped'
+			for update""", (name, date), as_dict=1)
+
+		if not data:
+			return created, False
+
+		data = data[0]
+		schedule_date = getdate(data.next_schedule_date)
+
+		try:
+			doc = make_new_document(data, schedule_date)
+
+			# the document and the next schedule date are committed together
+			frappe.db.set_value('Subscription', data.name, 'next_schedule_date',
+				get_next_schedule_date(schedule_date, data.frequency, data.repeat_on_day))
+			frappe.db.commit()
+		except Exception:
+			frappe.db.rollback()
+			frappe.db.begin()
+			frappe.log_error(frappe.get_traceback())
+			disable_subscription(data)
+			frappe.db.commit()
+			if data.reference_document and not frappe.flags.in_test:
+				notify_error_to_user(data)
+
+			return created, True
+
+		created += 1
 		if data.notify_by_email and data.recipients:
-			print_format = data.print_format or "Standard"
-			send_notification(doc, data, print_format=print_format)
+			if frappe.flags.in_test:
+				send_subscription_notification(data.name, doc.doctype, doc.name)
+			else:
+				frappe.enqueue("erpnext.accounts.doctype.subscription.subscription.send_subscription_notification",
+					queue="short", subscription=data.name, doctype=doc.doctype, name=doc.name)
 
-		frappe.db.commit()
-	except Exception:
-		frappe.db.rollback()
-		frappe.db.begin()
-		frappe.log_error(frappe.get_traceback())
-		disable_subscription(data)
-		frappe.db.commit()
-		if data.reference_document and not frappe.flags.in_test:
-			notify_error_to_user(data)
+def send_subscription_notification(subscription, doctype, name):
+	data = frappe.get_doc('Subscription', subscription)
+	send_notification(frappe.get_doc(doctype, name), data, print_format=data.print_format or "Standard")
 
 def disable_subscription(data):
 	subscription = frappe.get_doc('Subscription', data.name)
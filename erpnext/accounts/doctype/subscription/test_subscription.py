@@ -5,12 +5,13 @@ from __future__ import unicode_literals
 
 import frappe
 import unittest
-from frappe.utils import today, add_days, getdate
+from frappe.utils import today, add_days, getdate, now_datetime, add_to_date
 from erpnext.accounts.utils import get_fiscal_year
 from erpnext.accounts.report.financial_statements import get_months
 from erpnext.accounts.doctype.sales_invoice.test_sales_invoice import create_sales_invoice
 from erpnext.selling.doctype.sales_order.test_sales_order import make_sales_order
-from erpnext.accounts.doctype.subscription.subscription import make_subscription_entry
+from erpnext.accounts.doctype.subscription.subscription import make_subscription_entry, make_documents, \
+	get_pending_run
 
 class TestSubscription(unittest.TestCase):
 	def test_daily_subscription(self):
@@ -37,6 +38,44 @@ class TestSubscription(unittest.TestCase):
 			self.assertEqual(quotation.items[0].get(fieldname),
 				new_quotation.items[0].get(fieldname))
 
+	def test_catch_up_of_missed_schedule_dates(self):
+		qo = frappe.copy_doc(quotation_records[0])
+		qo.submit()
+
+		doc = make_subscription(reference_document=qo.name, start_date=add_days(today(), -4))
+		self.assertEqual(getdate(doc.next_schedule_date), getdate(add_days(today(), -3)))
+		make_subscription_entry()
+
+		docnames = frappe.get_all('Quotation', {'subscription': doc.name, 'name': ('!=', qo.name)})
+		self.assertEqual(len(docnames), 4)
+		self.assertEqual(getdate(frappe.db.get_value('Subscription', doc.name, 'next_schedule_date')),
+			getdate(add_days(today(), 1)))
+
+		run = frappe.get_all('Subscription Run', fields=['status', 'catch_up_documents'],
+			order_by='creation desc', limit_page_length=1)[0]
+		self.assertEqual(run.status, 'Completed')
+		self.assertTrue(run.catch_up_documents >= 3)
+
+		# processing the subscription again does not create any document
+		self.assertEqual(make_documents(doc.name, today()), (0, False))
+
+	def test_interrupted_subscription_run(self):
+		run = frappe.get_doc({
+			"doctype": "Subscription Run",
+			"run_date": today(),
+			"status": "In Progress",
+			"started_on": now_datetime(),
+			"subscriptions": 1,
+			"batches": 1
+		}).insert(ignore_permissions=True)
+		self.assertEqual(get_pending_run(), run.name)
+
+		# the batch job was lost and the run has made no progress since
+		frappe.db.sql("update `tabSubscription Run` set modified=%s where name=%s",
+			(add_to_date(now_datetime(), hours=-1), run.name))
+		self.assertFalse(get_pending_run())
+		self.assertEqual(frappe.db.get_value("Subscription Run", run.name, "status"), "Interrupted")
+
 	def test_monthly_subscription_for_so(self):
 		current_fiscal_year = get_fiscal_year(today(), as_dict=True)
 		start_date = current_fiscal_year.year_start_date
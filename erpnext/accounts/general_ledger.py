@@ -6,7 +6,13 @@ import frappe, erpnext
 from frappe.utils import flt, cstr, cint
 from frappe import _
 from frappe.model.meta import get_field_precision
-from erpnext.accounts.doctype.budget.budget import validate_expense_against_budget
+from erpnext.accounts.doctype.budget.budget import validate_gl_entries_against_budget, \
+	update_budget_expenses, reverse_budget_expenses
+from erpnext.accounts.doctype.party_account_summary.party_account_summary import update_balance_summary, \
+	reverse_balance_summary
+from erpnext.utilities.naming import get_names_from_series
+from erpnext.utilities.raw_insert import bulk_insert
+from erpnext.utilities.report_cache import update_data_version
 
 
 class StockAccountInvalidTransaction(frappe.ValidationError): pass
@@ -86,12 +92,14 @@ def save_entries(gl_map, adv_adj, update_outstanding, from_repost=False):
 		
 	round_off_debit_credit(gl_map)
 
-	for entry in gl_map:
-		make_entry(entry, adv_adj, update_outstanding, from_repost)
-		
-		# check against budget
-		if not from_repost:
-			validate_expense_against_budget(entry)
+	gl_entries = [make_entry(entry, adv_adj, update_outstanding, from_repost) for entry in gl_map]
+	update_data_version("GL Entry")
+
+	update_budget_expenses(gl_entries)
+
+	# check against budget, once for the whole voucher
+	if not from_repost:
+		validate_gl_entries_against_budget(gl_entries)
 
 def make_entry(args, adv_adj, update_outstanding, from_repost=False):
 	args.update({"doctype": "GL Entry"})
@@ -102,6 +110,33 @@ def make_entry(args, adv_adj, update_outstanding, from_repost=False):
 	gle.run_method("on_update_with_args", adv_adj, update_outstanding, from_repost)
 	gle.submit()
 
+	update_balance_summary(gle)
+
+	return gle
+
+def insert_gl_entries(gl_entries, publish_progress=None):
+	"""Inserts submitted GL Entries with multi-row inserts, for vouchers posting a large number
+		of entries which are validated and balanced by the voucher itself (Period Closing Voucher)"""
+	if not gl_entries:
+		return
+
+	fields = ("posting_date", "account", "party_type", "party", "cost_center", "debit", "credit",
+		"account_currency", "debit_in_account_currency", "credit_in_account_currency", "against",
+		"against_voucher_type", "against_voucher", "voucher_type", "voucher_no", "project", "remarks",
+		"is_opening", "is_advance", "fiscal_year", "company")
+
+	names = get_names_from_series(frappe.get_meta("GL Entry").autoname, len(gl_entries))
+
+	rows = []
+	for name, d in zip(names, gl_entries):
+		d.setdefault("is_opening", "No")
+		d.setdefault("is_advance", "No")
+		rows.append((name,) + tuple(d.get(f) for f in fields))
+
+	bulk_insert("GL Entry", ("name",) + fields, rows, docstatus=1, after_chunk=publish_progress)
+
+	update_data_version("GL Entry")
+
 def validate_account_for_perpetual_inventory(gl_map):
 	if cint(erpnext.is_perpetual_inventory_enabled(gl_map[0].company)) \
 		and gl_map[0].voucher_type=="Journal Entry":
@@ -179,7 +214,7 @@ def delete_gl_entries(gl_entries=None, voucher_type=None, voucher_no=None,
 
 	if not gl_entries:
 		gl_entries = frappe.db.sql("""
-			select account, posting_date, party_type, party, cost_center, fiscal_year,voucher_type,
+			select account, posting_date, party_type, party, cost_center, project, fiscal_year,voucher_type,
 			voucher_no, against_voucher_type, against_voucher, cost_center, company
 			from `tabGL Entry`
 			where voucher_type=%s and voucher_no=%s""", (voucher_type, voucher_no), as_dict=True)
@@ -187,15 +222,22 @@ def delete_gl_entries(gl_entries=None, voucher_type=None, voucher_no=None,
 	if gl_entries:
 		check_freezing_date(gl_entries[0]["posting_date"], adv_adj)
 
+	voucher_type = voucher_type or gl_entries[0]["voucher_type"]
+	voucher_no = voucher_no or gl_entries[0]["voucher_no"]
+
+	reverse_balance_summary(voucher_type, voucher_no)
+	reverse_budget_expenses(voucher_type, voucher_no)
 	frappe.db.sql("""delete from `tabGL Entry` where voucher_type=%s and voucher_no=%s""",
-		(voucher_type or gl_entries[0]["voucher_type"], voucher_no or gl_entries[0]["voucher_no"]))
+		(voucher_type, voucher_no))
+	update_data_version("GL Entry")
 
 	for entry in gl_entries:
 		validate_frozen_account(entry["account"], adv_adj)
 		validate_balance_type(entry["account"], adv_adj)
-		if not adv_adj:
-			validate_expense_against_budget(entry)
-		
+
 		if entry.get("against_voucher") and update_outstanding == 'Yes' and not adv_adj:
 			update_outstanding_amt(entry["account"], entry.get("party_type"), entry.get("party"), entry.get("against_voucher_type"),
 				entry.get("against_voucher"), on_cancel=True)
+
+	if not adv_adj:
+		validate_gl_entries_against_budget(gl_entries)
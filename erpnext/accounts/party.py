@@ -414,6 +414,8 @@ def get_timeline_data(doctype, name):
 	return out
 
 def get_dashboard_info(party_type, party):
+	from erpnext.accounts.doctype.party_account_summary.party_account_summary import get_party_summary
+
 	current_fiscal_year = get_fiscal_year(nowdate(), as_dict=True)
 	company = frappe.db.get_default("company") or frappe.get_all("Company")[0].name
 	party_account_currency = get_party_account_currency(party_type, party, company)
@@ -421,28 +423,16 @@ def get_dashboard_info(party_type, party):
 		or frappe.db.get_value('Company', company, 'default_currency')
 
 	if party_account_currency==company_default_currency:
-		total_field = "base_grand_total"
+		billing_field = "base_billing_amount"
 	else:
-		total_field = "grand_total"
-
-	doctype = "Sales Invoice" if party_type=="Customer" else "Purchase Invoice"
-
-	billing_this_year = frappe.db.sql("""
-		select sum({0})
-		from `tab{1}`
-		where {2}=%s and docstatus=1 and posting_date between %s and %s
-	""".format(total_field, doctype, party_type.lower()),
-	(party, current_fiscal_year.year_start_date, current_fiscal_year.year_end_date))
+		billing_field = "billing_amount"
 
-	total_unpaid = frappe.db.sql("""
-		select sum(debit_in_account_currency) - sum(credit_in_account_currency)
-		from `tabGL Entry`
-		where party_type = %s and party=%s""", (party_type, party))
+	summary = get_party_summary(party_type, party, current_fiscal_year.name)
 
 	info = {}
-	info["billing_this_year"] = flt(billing_this_year[0][0]) if billing_this_year else 0
+	info["billing_this_year"] = flt(summary.get(billing_field))
 	info["currency"] = party_account_currency
-	info["total_unpaid"] = flt(total_unpaid[0][0]) if total_unpaid else 0
+	info["total_unpaid"] = flt(summary.get("balance"))
 	if party_type == "Supplier":
 		info["total_unpaid"] = -1 * info["total_unpaid"]
 
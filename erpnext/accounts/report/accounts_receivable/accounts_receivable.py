@@ -5,6 +5,7 @@ from __future__ import unicode_literals
 import frappe
 from frappe import _, scrub
 from frappe.utils import getdate, nowdate, flt, cint
+from erpnext.utilities.report_cache import cached_report
 
 class ReceivablePayableReport(object):
 	def __init__(self, filters=None):
@@ -101,95 +102,138 @@ class ReceivablePayableReport(object):
 		currency_precision = get_currency_precision() or 2
 		dr_or_cr = "debit" if args.get("party_type") == "Customer" else "credit"
 
-		dn_details = get_dn_details(args.get("party_type"))
-		voucher_details = self.get_voucher_details(args.get("party_type"), dn_details)
+		outstanding_entries = self.get_outstanding_entries(args.get("party_type"), dr_or_cr, currency_precision)
 
-		future_vouchers = self.get_entries_after(self.filters.report_date, args.get("party_type"))
+		# invoice details are only needed for the vouchers that are outstanding
+		voucher_details = self.get_voucher_details(args.get("party_type"),
+			list(set([gle.voucher_no for gle in outstanding_entries])))
 
 		if not self.filters.get("company"):
 			self.filters["company"] = frappe.db.get_single_value('Global Defaults', 'default_company')
 
 		company_currency = frappe.db.get_value("Company", self.filters.get("company"), "default_currency")
 
-		return_entries = self.get_return_entries(args.get("party_type"))
-
 		data = []
 		pdc_details = get_pdc_details(args.get("party_type"))
 
-		for gle in self.get_entries_till(self.filters.report_date, args.get("party_type")):
-			if self.is_receivable_or_payable(gle, dr_or_cr, future_vouchers):
-				outstanding_amount, credit_note_amount = self.get_outstanding_amount(gle,
-					self.filters.report_date, dr_or_cr, return_entries, currency_precision)
-				if abs(outstanding_amount) > 0.1/10**currency_precision:
-					row = [gle.posting_date, gle.party]
-
-					# customer / supplier name
-					if party_naming_by == "Naming Series":
-						row += [self.get_party_name(gle.party_type, gle.party)]
-
-					# get due date
-					due_date = voucher_details.get(gle.voucher_no, {}).get("due_date", "")
-
-					row += [gle.voucher_type, gle.voucher_no, due_date]
-
-					# get supplier bill details
-					if args.get("party_type") == "Supplier":
-						row += [
-							voucher_details.get(gle.voucher_no, {}).get("bill_no", ""),
-							voucher_details.get(gle.voucher_no, {}).get("bill_date", "")
-						]
-
-					# invoiced and paid amounts
-					invoiced_amount = gle.get(dr_or_cr) if (gle.get(dr_or_cr) > 0) else 0
-					paid_amt = invoiced_amount - outstanding_amount - credit_note_amount
-					row += [invoiced_amount, paid_amt, credit_note_amount, outstanding_amount]
-
-					# ageing data
-					entry_date = due_date if self.filters.ageing_based_on == "Due Date" else gle.posting_date
-					row += get_ageing_data(cint(self.filters.range1), cint(self.filters.range2),
-						cint(self.filters.range3), self.age_as_on, entry_date, outstanding_amount)
-
-					# issue 6371-Ageing buckets should not have amounts if due date is not reached
-					if self.filters.ageing_based_on == "Due Date" \
-							and getdate(due_date) > getdate(self.filters.report_date):
-						row[-1]=row[-2]=row[-3]=row[-4]=0
-
-					if self.filters.get(scrub(args.get("party_type"))):
-						row.append(gle.account_currency)
-					else:
-						row.append(company_currency)
-
-					pdc = pdc_details.get((gle.voucher_no, gle.party), {})
-					remaining_balance = outstanding_amount - flt(pdc.get("pdc_amount"))
-					row += [pdc.get("pdc_date"), pdc.get("pdc_ref"),
-						flt(pdc.get("pdc_amount")), remaining_balance]
-
-					if args.get('party_type') == 'Customer':
-						# customer LPO
-						row += [voucher_details.get(gle.voucher_no, {}).get("po_no")]
-
-						# Delivery Note
-						row += [voucher_details.get(gle.voucher_no, {}).get("delivery_note")]
-
-					# customer territory / supplier type
-					if args.get("party_type") == "Customer":
-						row += [self.get_territory(gle.party), self.get_customer_group(gle.party)]
-					if args.get("party_type") == "Supplier":
-						row += [self.get_supplier_type(gle.party)]
-
-					row.append(gle.remarks)
-					data.append(row)
+		for gle in outstanding_entries:
+			outstanding_amount, credit_note_amount = gle.outstanding_amount, gle.credit_note_amount
+			row = [gle.posting_date, gle.party]
+
+			# customer / supplier name
+			if party_naming_by == "Naming Series":
+				row += [self.get_party_name(gle.party_type, gle.party)]
+
+			# get due date
+			due_date = voucher_details.get(gle.voucher_no, {}).get("due_date", "")
+
+			row += [gle.voucher_type, gle.voucher_no, due_date]
+
+			# get supplier bill details
+			if args.get("party_type") == "Supplier":
+				row += [
+					voucher_details.get(gle.voucher_no, {}).get("bill_no", ""),
+					voucher_details.get(gle.voucher_no, {}).get("bill_date", "")
+				]
+
+			# invoiced and paid amounts
+			invoiced_amount = gle.get(dr_or_cr) if (gle.get(dr_or_cr) > 0) else 0
+			paid_amt = invoiced_amount - outstanding_amount - credit_note_amount
+			row += [invoiced_amount, paid_amt, credit_note_amount, outstanding_amount]
+
+			# ageing data
+			entry_date = due_date if self.filters.ageing_based_on == "Due Date" else gle.posting_date
+			row += get_ageing_data(cint(self.filters.range1), cint(self.filters.range2),
+				cint(self.filters.range3), self.age_as_on, entry_date, outstanding_amount)
+
+			# issue 6371-Ageing buckets should not have amounts if due date is not reached
+			if self.filters.ageing_based_on == "Due Date" \
+					and getdate(due_date) > getdate(self.filters.report_date):
+				row[-1]=row[-2]=row[-3]=row[-4]=0
+
+			if self.filters.get(scrub(args.get("party_type"))):
+				row.append(gle.account_currency)
+			else:
+				row.append(company_currency)
+
+			pdc = pdc_details.get((gle.voucher_no, gle.party), {})
+			remaining_balance = outstanding_amount - flt(pdc.get("pdc_amount"))
+			row += [pdc.get("pdc_date"), pdc.get("pdc_ref"),
+				flt(pdc.get("pdc_amount")), remaining_balance]
+
+			if args.get('party_type') == 'Customer':
+				# customer LPO
+				row += [voucher_details.get(gle.voucher_no, {}).get("po_no")]
+
+				# Delivery Note
+				row += [voucher_details.get(gle.voucher_no, {}).get("delivery_note")]
+
+			# customer territory / supplier type
+			if args.get("party_type") == "Customer":
+				row += [self.get_territory(gle.party), self.get_customer_group(gle.party)]
+			if args.get("party_type") == "Supplier":
+				row += [self.get_supplier_type(gle.party)]
+
+			row.append(gle.remarks)
+			data.append(row)
 
 		return data
 
 	def get_entries_after(self, report_date, party_type):
-		# returns a distinct list
-		return list(set([(e.voucher_type, e.voucher_no) for e in self.get_gl_entries(party_type)
-			if getdate(e.posting_date) > report_date]))
+		# returns a distinct set
+		conditions, values = self.prepare_conditions(party_type)
+		return set(frappe.db.sql("""select distinct voucher_type, voucher_no
+			from `tabGL Entry`
+			where docstatus < 2 and party_type=%s and (party is not null and party != '') {0}
+				and posting_date > %s""".format(conditions), values + [report_date]))
 
 	def get_entries_till(self, report_date, party_type):
-		# returns a generator
-		return (e for e in self.get_gl_entries(party_type) if getdate(e.posting_date) <= report_date)
+		return self.get_gl_entries(party_type)
+
+	def get_outstanding_entries(self, party_type, dr_or_cr, currency_precision):
+		"""Returns the receivable / payable entries which are outstanding on the report date,
+			with `outstanding_amount` and `credit_note_amount` set.
+
+			Payments and credit notes are summed per (party, against voucher) in one pass
+			over the GL entries instead of being looked up for every invoice."""
+		reverse_dr_or_cr = "credit" if dr_or_cr=="debit" else "debit"
+
+		gl_entries = self.get_entries_till(self.filters.report_date, party_type)
+		future_vouchers = self.get_entries_after(self.filters.report_date, party_type)
+		return_entries = self.get_return_entries(party_type, gl_entries)
+
+		adjustments = {}
+		for e in gl_entries:
+			if e.against_voucher_type and e.against_voucher:
+				# [payment amount, credit note amount]
+				amounts = adjustments.setdefault((e.party, e.against_voucher_type, e.against_voucher), [0.0, 0.0])
+				amounts[1 if e.voucher_no in return_entries else 0] += \
+					flt(e.get(reverse_dr_or_cr)) - flt(e.get(dr_or_cr))
+
+		outstanding_entries = []
+		for gle in gl_entries:
+			if not self.is_receivable_or_payable(gle, dr_or_cr, future_vouchers):
+				continue
+
+			payment_amount, credit_note_amount = adjustments.get((gle.party, gle.voucher_type, gle.voucher_no),
+				(0.0, 0.0))
+
+			# the invoice itself is posted against the invoice
+			if gle.against_voucher_type == gle.voucher_type and gle.against_voucher == gle.voucher_no:
+				amount = flt(gle.get(reverse_dr_or_cr)) - flt(gle.get(dr_or_cr))
+				if gle.voucher_no in return_entries:
+					credit_note_amount -= amount
+				else:
+					payment_amount -= amount
+
+			gle.outstanding_amount = flt((flt(gle.get(dr_or_cr)) - flt(gle.get(reverse_dr_or_cr)) \
+				- payment_amount - credit_note_amount), currency_precision)
+			gle.credit_note_amount = flt(credit_note_amount, currency_precision)
+
+			if abs(gle.outstanding_amount) > 0.1/10**currency_precision:
+				outstanding_entries.append(gle)
+
+		return outstanding_entries
 
 	def is_receivable_or_payable(self, gle, dr_or_cr, future_vouchers):
 		return (
@@ -206,27 +250,18 @@ class ReceivablePayableReport(object):
 			((gle.against_voucher_type, gle.against_voucher) in future_vouchers)
 		)
 
-	def get_return_entries(self, party_type):
+	def get_return_entries(self, party_type, gl_entries):
 		doctype = "Sales Invoice" if party_type=="Customer" else "Purchase Invoice"
-		return [d.name for d in frappe.get_all(doctype, filters={"is_return": 1, "docstatus": 1})]
 
-	def get_outstanding_amount(self, gle, report_date, dr_or_cr, return_entries, currency_precision):
-		payment_amount, credit_note_amount = 0.0, 0.0
-		reverse_dr_or_cr = "credit" if dr_or_cr=="debit" else "debit"
+		# only invoices posted against another voucher can be returns adjusting it
+		invoices = list(set([e.voucher_no for e in gl_entries
+			if e.voucher_type==doctype and e.against_voucher and e.against_voucher!=e.voucher_no]))
+		if not invoices:
+			return set()
 
-		for e in self.get_gl_entries_for(gle.party, gle.party_type, gle.voucher_type, gle.voucher_no):
-			if getdate(e.posting_date) <= report_date and e.name!=gle.name:
-				amount = flt(e.get(reverse_dr_or_cr)) - flt(e.get(dr_or_cr))
-				if e.voucher_no not in return_entries:
-					payment_amount += amount
-				else:
-					credit_note_amount += amount
-
-		outstanding_amount = flt((flt(gle.get(dr_or_cr)) - flt(gle.get(reverse_dr_or_cr)) \
-			- payment_amount - credit_note_amount), currency_precision)
-		credit_note_amount = flt(credit_note_amount, currency_precision)
-
-		return outstanding_amount, credit_note_amount
+		return set(frappe.db.sql_list("""select name from `tab{0}`
+			where is_return=1 and docstatus=1 and name in ({1})"""
+			.format(doctype, ", ".join(["%s"] * len(invoices))), invoices))
 
 	def get_party_name(self, party_type, party_name):
 		return self.get_party_map(party_type).get(party_name, {}).get("customer_name" if party_type == "Customer" else "supplier_name") or ""
@@ -252,18 +287,23 @@ class ReceivablePayableReport(object):
 
 		return self.party_map
 
-	def get_voucher_details(self, party_type, dn_details):
+	def get_voucher_details(self, party_type, vouchers):
 		voucher_details = frappe._dict()
+		if not vouchers:
+			return voucher_details
+
+		condition = "name in ({0})".format(", ".join(["%s"] * len(vouchers)))
 
 		if party_type == "Customer":
+			dn_details = get_dn_details(party_type, vouchers)
 			for si in frappe.db.sql("""select name, due_date, po_no
-				from `tabSales Invoice` where docstatus=1""", as_dict=1):
+				from `tabSales Invoice` where docstatus=1 and {0}""".format(condition), vouchers, as_dict=1):
 					si['delivery_note'] = dn_details.get(si.name)
 					voucher_details.setdefault(si.name, si)
 
 		if party_type == "Supplier":
 			for pi in frappe.db.sql("""select name, due_date, bill_no, bill_date
-				from `tabPurchase Invoice` where docstatus=1""", as_dict=1):
+				from `tabPurchase Invoice` where docstatus=1 and {0}""".format(condition), vouchers, as_dict=1):
 					voucher_details.setdefault(pi.name, pi)
 
 		return voucher_details
@@ -282,9 +322,10 @@ class ReceivablePayableReport(object):
 				account_currency, remarks, {0}
 				from `tabGL Entry`
 				where docstatus < 2 and party_type=%s and (party is not null and party != '') {1}
+					and posting_date <= %s
 				group by voucher_type, voucher_no, against_voucher_type, against_voucher, party
 				order by posting_date, party"""
-				.format(select_fields, conditions), values, as_dict=True)
+				.format(select_fields, conditions), values + [self.filters.report_date], as_dict=True)
 
 		return self.gl_entries
 
@@ -333,20 +374,6 @@ class ReceivablePayableReport(object):
 				values.append(self.filters.get("sales_person"))
 		return " and ".join(conditions), values
 
-	def get_gl_entries_for(self, party, party_type, against_voucher_type, against_voucher):
-		if not hasattr(self, "gl_entries_map"):
-			self.gl_entries_map = {}
-			for gle in self.get_gl_entries(party_type):
-				if gle.against_voucher_type and gle.against_voucher:
-					self.gl_entries_map.setdefault(gle.party, {})\
-						.setdefault(gle.against_voucher_type, {})\
-						.setdefault(gle.against_voucher, [])\
-						.append(gle)
-
-		return self.gl_entries_map.get(party, {})\
-			.get(against_voucher_type, {})\
-			.get(against_voucher, [])
-
 	def get_chart_data(self, columns, data):
 		ageing_columns = columns[self.ageing_col_idx_start : self.ageing_col_idx_start+4]
 
@@ -366,6 +393,8 @@ class ReceivablePayableReport(object):
 			"type": 'percentage'
 		}
 
+@cached_report("Accounts Receivable", doctypes=("GL Entry", "Sales Invoice", "Payment Entry",
+	"Journal Entry", "Customer", "Customer Group", "Territory"))
 def execute(filters=None):
 	args = {
 		"party_type": "Customer",
@@ -435,18 +464,26 @@ def get_pdc_details(party_type):
 
 	return pdc_details
 
-def get_dn_details(party_type):
+def get_dn_details(party_type, invoices=None):
 	dn_details = frappe._dict()
 
 	if party_type == "Customer":
+		si_condition, dn_condition, values = "", "", []
+		if invoices:
+			placeholders = ", ".join(["%s"] * len(invoices))
+			si_condition = " and parent in ({0})".format(placeholders)
+			dn_condition = " and against_sales_invoice in ({0})".format(placeholders)
+			values = list(invoices) + list(invoices)
+
 		for si in frappe.db.sql("""select parent, GROUP_CONCAT(delivery_note SEPARATOR ', ') as dn
 			from `tabSales Invoice Item`
-			where docstatus=1 and delivery_note is not null and delivery_note != '' group by parent
+			where docstatus=1 and delivery_note is not null and delivery_note != '' {0} group by parent
 		Union
 			select against_sales_invoice as parent, GROUP_CONCAT(parent SEPARATOR ', ') as dn
 			from `tabDelivery Note Item`
 			where docstatus=1 and against_sales_invoice is not null
-			and against_sales_invoice != '' group by against_sales_invoice""", as_dict=1):
+			and against_sales_invoice != '' {1} group by against_sales_invoice"""
+			.format(si_condition, dn_condition), values, as_dict=1):
 				dn_details.setdefault(si.parent, si.dn)
 
 	return dn_details
@@ -84,45 +84,45 @@ def get_target_distribution_details(filters):
 
 	return target_details
 
-#Get actual details from gl entry
-def get_actual_details(name, filters):
-	cond = "1=1"
-	budget_against=filters.get("budget_against").replace(" ", "_").lower()
-
-	if filters.get("budget_against") == "Cost Center":
-		cc_lft, cc_rgt = frappe.db.get_value("Cost Center", name, ["lft", "rgt"])
-		cond = "lft>='{lft}' and rgt<='{rgt}'".format(lft = cc_lft, rgt=cc_rgt)
-	
-	ac_details = frappe.db.sql("""select gl.account, gl.debit, gl.credit,
-		MONTHNAME(gl.posting_date) as month_name, b.{budget_against} as budget_against
+#Get actual details from gl entry, grouped by budget against, account and month
+def get_actual_details(filters):
+	budget_against = filters.get("budget_against").replace(" ", "_").lower()
+
+	actual_details = {}
+	for d in frappe.db.sql("""
+		select gl.{budget_against} as budget_against, gl.account,
+			MONTHNAME(gl.posting_date) as month_name, sum(gl.debit) - sum(gl.credit) as amount
 		from `tabGL Entry` gl, `tabBudget Account` ba, `tabBudget` b
 		where
 			b.name = ba.parent
 			and b.docstatus = 1
-			and ba.account=gl.account
+			and b.fiscal_year = %(fiscal_year)s
+			and b.budget_against = %(budget_against)s
+			and b.company = %(company)s
+			and ba.account = gl.account
 			and b.{budget_against} = gl.{budget_against}
-			and gl.fiscal_year=%s 
-			and b.{budget_against}=%s
-			and exists(select name from `tab{tab}` where name=gl.{budget_against} and {cond})
-	""".format(tab = filters.budget_against, budget_against = budget_against, cond = cond),
-	(filters.fiscal_year, name), as_dict=1)
-
-	cc_actual_details = {}
-	for d in ac_details:
-		cc_actual_details.setdefault(d.account, []).append(d)
+			and gl.fiscal_year = %(fiscal_year)s
+		group by gl.{budget_against}, gl.account, MONTHNAME(gl.posting_date)
+	""".format(budget_against=budget_against), {
+		"fiscal_year": filters.fiscal_year,
+		"budget_against": filters.budget_against,
+		"company": filters.company
+	}, as_dict=1):
+		actual_details.setdefault((d.budget_against, d.account), {})[d.month_name] = flt(d.amount)
 
-	return cc_actual_details
+	return actual_details
 
 def get_cost_center_account_month_map(filters):
 	import datetime
 	cost_center_target_details = get_cost_center_target_details(filters)
 	tdd = get_target_distribution_details(filters)
+	actual_details = get_actual_details(filters)
 
 	cam_map = {}
 
 	for ccd in cost_center_target_details:
-		actual_details = get_actual_details(ccd.budget_against, filters)
-		
+		monthwise_actual = actual_details.get((ccd.budget_against, ccd.account), {})
+
 		for month_id in range(1, 13):
 			month = datetime.date(2013, month_id, 1).strftime('%B')
 
@@ -136,9 +136,6 @@ def get_cost_center_account_month_map(filters):
 				if ccd.monthly_distribution else 100.0/12
 
 			tav_dict.target = flt(ccd.budget_amount) * month_percentage / 100
-			
-			for ad in actual_details.get(ccd.account, []):
-				if ad.month_name == month:
-						tav_dict.actual += flt(ad.debit) - flt(ad.credit)
+			tav_dict.actual += monthwise_actual.get(month, 0.0)
 
 	return cam_map
@@ -4,7 +4,7 @@
 from __future__ import unicode_literals
 import frappe
 from frappe import _
-from frappe.utils import cint
+from frappe.utils import cint, flt, getdate
 from erpnext.accounts.report.financial_statements import (get_period_list, get_columns, get_data)
 from erpnext.accounts.report.profit_and_loss_statement.profit_and_loss_statement import get_net_profit_loss
 from erpnext.accounts.utils import get_fiscal_year
@@ -61,6 +61,9 @@ def execute(filters=None):
 
 	data = []
 	company_currency = frappe.db.get_value("Company", filters.company, "default_currency")
+
+	gl_sums = get_gl_sums(filters.company,
+		get_date_ranges(period_list, filters.accumulated_values, filters.company), ["account_type"])
 	
 	for cash_flow_account in cash_flow_accounts:
 		section_data = []
@@ -83,7 +86,7 @@ def execute(filters=None):
 
 		for account in cash_flow_account['account_types']:
 			account_data = get_account_type_based_data(filters.company, 
-				account['account_type'], period_list, filters.accumulated_values)
+				account['account_type'], period_list, filters.accumulated_values, gl_sums)
 			account_data.update({
 				"account_name": account['label'],
 				"account": account['label'], 
@@ -103,26 +106,17 @@ def execute(filters=None):
 	return columns, data
 
 
-def get_account_type_based_data(company, account_type, period_list, accumulated_values):
+def get_account_type_based_data(company, account_type, period_list, accumulated_values, gl_sums=None):
+	date_ranges = get_date_ranges(period_list, accumulated_values, company)
+	if gl_sums is None:
+		gl_sums = get_gl_sums(company, date_ranges, ["account_type"])
+
 	data = {}
 	total = 0
-	for period in period_list:
-		start_date = get_start_date(period, accumulated_values, company)
-		gl_sum = frappe.db.sql_list("""
-			select sum(credit) - sum(debit)
-			from `tabGL Entry`
-			where company=%s and posting_date >= %s and posting_date <= %s 
-				and voucher_type != 'Period Closing Voucher'
-				and account in ( SELECT name FROM tabAccount WHERE account_type = %s)
-		""", (company, start_date if accumulated_values else period['from_date'],
-			period['to_date'], account_type))
-
-		if gl_sum and gl_sum[0]:
-			amount = gl_sum[0]
-			if account_type == "Depreciation":
-				amount *= -1
-		else:
-			amount = 0
+	for period, date_range in zip(period_list, date_ranges):
+		amount = gl_sums.get((account_type, date_range), 0)
+		if amount and account_type == "Depreciation":
+			amount *= -1
 
 		total += amount
 		data.setdefault(period["key"], amount)
@@ -131,6 +125,51 @@ def get_account_type_based_data(company, account_type, period_list, accumulated_
 	return data
 
 
+def get_date_ranges(period_list, accumulated_values, company):
+	return [(getdate(get_start_date(period, accumulated_values, company) if accumulated_values else period['from_date']),
+		getdate(period['to_date'])) for period in period_list]
+
+
+def get_gl_sums(company, date_ranges, group_by):
+	"""Returns sum(credit) - sum(debit) of the GL Entries for every date range, grouped by the
+	`group_by` fields of the Account, as {(group_by values..., (from_date, to_date)): amount}.
+
+	All the date ranges are computed in a single query."""
+	date_ranges = list(set([(getdate(from_date), getdate(to_date)) for from_date, to_date in date_ranges]))
+	if not date_ranges:
+		return {}
+
+	values = {
+		"company": company,
+		"from_date": min([d[0] for d in date_ranges]),
+		"to_date": max([d[1] for d in date_ranges])
+	}
+
+	range_fields = []
+	for i, (from_date, to_date) in enumerate(date_ranges):
+		values["from_date_{0}".format(i)] = from_date
+		values["to_date_{0}".format(i)] = to_date
+		range_fields.append("""sum(case when gle.posting_date >= %(from_date_{0})s
+			and gle.posting_date <= %(to_date_{0})s then gle.credit - gle.debit else 0 end)""".format(i))
+
+	group_by_fields = ", ".join(["acc.{0}".format(d) for d in group_by])
+
+	gl_sums = {}
+	for d in frappe.db.sql("""
+		select {group_by_fields}, {range_fields}
+		from `tabGL Entry` gle, `tabAccount` acc
+		where gle.account = acc.name and gle.company=%(company)s
+			and gle.posting_date >= %(from_date)s and gle.posting_date <= %(to_date)s
+			and gle.voucher_type != 'Period Closing Voucher'
+		group by {group_by_fields}""".format(group_by_fields=group_by_fields,
+			range_fields=", ".join(range_fields)), values):
+			key = tuple(d[:len(group_by)])
+			for i, date_range in enumerate(date_ranges):
+				gl_sums[key + (date_range,)] = flt(d[len(group_by) + i])
+
+	return gl_sums
+
+
 def get_start_date(period, accumulated_values, company):
 	start_date = period["year_start_date"]
 	if accumulated_values:
@@ -4,9 +4,10 @@
 from __future__ import unicode_literals
 import frappe
 from frappe import _
-from frappe.utils import add_to_date
+from frappe.utils import add_to_date, getdate
 from erpnext.accounts.report.financial_statements import (get_period_list, get_columns, get_data)
 from erpnext.accounts.report.profit_and_loss_statement.profit_and_loss_statement import get_net_profit_loss
+from erpnext.accounts.report.cash_flow.cash_flow import get_gl_sums, get_start_date
 
 
 def get_mapper_for(mappers, position):
@@ -152,7 +153,7 @@ def setup_mappers(mappers):
 
 
 def add_data_for_operating_activities(
-	filters, company_currency, profit_data, period_list, light_mappers, mapper, data):
+	filters, company_currency, profit_data, period_list, light_mappers, mapper, data, gl_sums=None):
 	has_added_working_capital_header = False
 	section_data = []
 
@@ -189,7 +190,7 @@ def add_data_for_operating_activities(
 			has_added_working_capital_header = True
 
 		account_data = _get_account_type_based_data(
-			filters, account['names'], period_list, filters.accumulated_values)
+			filters, account['names'], period_list, filters.accumulated_values, gl_sums=gl_sums)
 
 		if not account['is_working_capital']:
 			for key in account_data:
@@ -218,7 +219,7 @@ def add_data_for_operating_activities(
 	for account in mapper['tax_liabilities']:
 		tax_paid = calculate_adjustment(
 			filters, mapper['tax_liabilities'], mapper['tax_expenses'],
-			filters.accumulated_values, period_list)
+			filters.accumulated_values, period_list, gl_sums)
 
 		if tax_paid:
 			tax_paid.update({
@@ -236,7 +237,7 @@ def add_data_for_operating_activities(
 	for account in mapper['finance_costs_adjustments']:
 		interest_paid = calculate_adjustment(
 			filters, mapper['finance_costs_adjustments'], mapper['finance_costs'],
-			filters.accumulated_values, period_list
+			filters.accumulated_values, period_list, gl_sums
 		)
 
 		if interest_paid:
@@ -253,18 +254,19 @@ def add_data_for_operating_activities(
 		data, section_data, mapper['section_footer'], period_list, company_currency)
 
 
-def calculate_adjustment(filters, non_expense_mapper, expense_mapper, use_accumulated_values, period_list):
+def calculate_adjustment(filters, non_expense_mapper, expense_mapper, use_accumulated_values, period_list,
+	gl_sums=None):
 	liability_accounts = [d['names'] for d in non_expense_mapper]
 	expense_accounts = [d['names'] for d in expense_mapper]
 
 	non_expense_closing = _get_account_type_based_data(
-		filters, liability_accounts, period_list, 0)
+		filters, liability_accounts, period_list, 0, gl_sums=gl_sums)
 
 	non_expense_opening = _get_account_type_based_data(
-		filters, liability_accounts, period_list, use_accumulated_values, opening_balances=1)
+		filters, liability_accounts, period_list, use_accumulated_values, opening_balances=1, gl_sums=gl_sums)
 
 	expense_data = _get_account_type_based_data(
-		filters, expense_accounts, period_list, use_accumulated_values)
+		filters, expense_accounts, period_list, use_accumulated_values, gl_sums=gl_sums)
 
 	data = _calculate_adjustment(non_expense_closing, non_expense_opening, expense_data)
 	return data
@@ -282,7 +284,7 @@ def _calculate_adjustment(non_expense_closing, non_expense_opening, expense_data
 
 
 def add_data_for_other_activities(
-	filters, company_currency, profit_data, period_list, light_mappers, mapper_list, data):
+	filters, company_currency, profit_data, period_list, light_mappers, mapper_list, data, gl_sums=None):
 	for mapper in mapper_list:
 		section_data = []
 		data.append({
@@ -294,7 +296,7 @@ def add_data_for_other_activities(
 
 		for account in mapper['account_types']:
 			account_data = _get_account_type_based_data(filters,
-				account['names'], period_list, filters.accumulated_values)
+				account['names'], period_list, filters.accumulated_values, gl_sums=gl_sums)
 			if account_data['total'] != 0:
 				account_data.update({
 					"account_name": account['label'],
@@ -310,7 +312,7 @@ def add_data_for_other_activities(
 			period_list, company_currency)
 
 
-def compute_data(filters, company_currency, profit_data, period_list, light_mappers, full_mapper):
+def compute_data(filters, company_currency, profit_data, period_list, light_mappers, full_mapper, gl_sums=None):
 	data = []
 
 	operating_activities_mapper = get_mapper_for(light_mappers, position=0)
@@ -322,12 +324,12 @@ def compute_data(filters, company_currency, profit_data, period_list, light_mapp
 	if operating_activities_mapper:
 		add_data_for_operating_activities(
 			filters, company_currency, profit_data, period_list, light_mappers,
-			operating_activities_mapper, data
+			operating_activities_mapper, data, gl_sums
 		)
 
 	if all(other_mappers):
 		add_data_for_other_activities(
-			filters, company_currency, profit_data, period_list, light_mappers, other_mappers, data
+			filters, company_currency, profit_data, period_list, light_mappers, other_mappers, data, gl_sums
 		)
 
 	return data
@@ -360,7 +362,17 @@ def execute(filters=None):
 
 	company_currency = frappe.db.get_value("Company", filters.company, "default_currency")
 
-	data = compute_data(filters, company_currency, net_profit_loss, period_list, mappers, cash_flow_accounts)
+	# all the balances used by the mappers, fetched in one query
+	date_ranges = []
+	for accumulated_values, opening_balances in ((filters.accumulated_values, 0), (0, 0),
+		(filters.accumulated_values, 1)):
+		date_ranges += [get_date_range(filters, period, accumulated_values, opening_balances)
+			for period in period_list]
+
+	gl_sums = get_gl_sums(filters.company, date_ranges, ["name", "parent_account"])
+
+	data = compute_data(filters, company_currency, net_profit_loss, period_list, mappers, cash_flow_accounts,
+		gl_sums)
 
 	_add_total_row_account(data, data, _("Net Change in Cash"), period_list, company_currency)
 	columns = get_columns(filters.periodicity, period_list, filters.accumulated_values, filters.company)
@@ -368,53 +380,46 @@ def execute(filters=None):
 	return columns, data
 
 
-def _get_account_type_based_data(filters, account_names, period_list, accumulated_values, opening_balances=0):
-	from erpnext.accounts.report.cash_flow.cash_flow import get_start_date
+def get_date_range(filters, period, accumulated_values, opening_balances=0):
+	start_date = get_start_date(period, accumulated_values, filters.company)
 
-	company = filters.company
-	data = {}
-	total = 0
-	for period in period_list:
-		start_date = get_start_date(period, accumulated_values, company)
-
-		if opening_balances:
-			date_info = dict(date=start_date)
-			months_map = {'Monthly': -1, 'Quarterly': -3, 'Half-Yearly': -6}
-			years_map = {'Yearly': -1}
-
-			if months_map.get(filters.periodicity):
-				date_info.update(months=months_map[filters.periodicity])
-			else:
-				date_info.update(years=years_map[filters.periodicity])
-
-			if accumulated_values:
-				start, end = add_to_date(start_date, years=-1), add_to_date(period['to_date'], years=-1)
-			else:
-				start, end = add_to_date(**date_info), add_to_date(**date_info)
-
-			gl_sum = frappe.db.sql_list("""
-				select sum(credit) - sum(debit)
-				from `tabGL Entry`
-				where company=%s and posting_date >= %s and posting_date <= %s 
-					and voucher_type != 'Period Closing Voucher'
-					and account in ( SELECT name FROM tabAccount WHERE name IN %s
-					OR parent_account IN %s)
-			""", (company, start, end, account_names, account_names))
+	if opening_balances:
+		date_info = dict(date=start_date)
+		months_map = {'Monthly': -1, 'Quarterly': -3, 'Half-Yearly': -6}
+		years_map = {'Yearly': -1}
+
+		if months_map.get(filters.periodicity):
+			date_info.update(months=months_map[filters.periodicity])
 		else:
-			gl_sum = frappe.db.sql_list("""
-				select sum(credit) - sum(debit)
-				from `tabGL Entry`
-				where company=%s and posting_date >= %s and posting_date <= %s 
-					and voucher_type != 'Period Closing Voucher'
-					and account in ( SELECT name FROM tabAccount WHERE name IN %s
-					OR parent_account IN %s)
-			""", (company, start_date if accumulated_values else period['from_date'],
-				period['to_date'], account_names, account_names))
-
-		if gl_sum and gl_sum[0]:
-			amount = gl_sum[0]
+			date_info.update(years=years_map[filters.periodicity])
+
+		if accumulated_values:
+			start, end = add_to_date(start_date, years=-1), add_to_date(period['to_date'], years=-1)
 		else:
-			amount = 0
+			start, end = add_to_date(**date_info), add_to_date(**date_info)
+	else:
+		start, end = start_date if accumulated_values else period['from_date'], period['to_date']
+
+	return getdate(start), getdate(end)
+
+
+def _get_account_type_based_data(filters, account_names, period_list, accumulated_values, opening_balances=0,
+	gl_sums=None):
+	date_ranges = [get_date_range(filters, period, accumulated_values, opening_balances)
+		for period in period_list]
+
+	if gl_sums is None:
+		gl_sums = get_gl_sums(filters.company, date_ranges, ["name", "parent_account"])
+
+	account_names = get_flat_list(account_names)
+	accounts = set([(account, parent_account) for account, parent_account, date_range in gl_sums
+		if account in account_names or parent_account in account_names])
+
+	data = {}
+	total = 0
+	for period, date_range in zip(period_list, date_ranges):
+		amount = sum([gl_sums.get((account, parent_account, date_range), 0)
+			for account, parent_account in accounts])
 
 		total += amount
 		data.setdefault(period["key"], amount)
@@ -423,6 +428,17 @@ def _get_account_type_based_data(filters, account_names, period_list, accumulate
 	return data
 
 
+def get_flat_list(names):
+	flat_list = []
+	for name in names:
+		if isinstance(name, (list, tuple)):
+			flat_list += get_flat_list(name)
+		else:
+			flat_list.append(name)
+
+	return flat_list
+
+
 def _add_total_row_account(out, data, label, period_list, currency, indent=0.0):
 	total_row = {
 		"indent": indent,
@@ -8,7 +8,8 @@ from past.builtins import cmp
 import functools
 
 import frappe
-from erpnext.accounts.report.utils import get_currency, convert_to_presentation_currency
+from erpnext.accounts.report.utils import get_currency, convert_to_presentation_currency, \
+	split_debit_and_credit
 from erpnext.accounts.utils import get_fiscal_year
 from frappe import _
 from frappe.utils import (flt, getdate, get_first_day, add_months, add_days, formatdate)
@@ -133,20 +134,21 @@ def get_data(
 
 	company_currency = get_appropriate_currency(company, filters)
 
-	gl_entries_by_account = {}
+	balances_by_account = {}
 	for root in frappe.db.sql("""select lft, rgt from tabAccount
 			where root_type=%s and ifnull(parent_account, '') = ''""", root_type, as_dict=1):
 
-		set_gl_entries_by_account(
-			company,
+		for d in get_period_balances(
+			company, period_list,
 			period_list[0]["year_start_date"] if only_current_fiscal_year else None,
-			period_list[-1]["to_date"],
-			root.lft, root.rgt, filters,
-			gl_entries_by_account, ignore_closing_entries=ignore_closing_entries
-		)
+			root.lft, root.rgt, filters, ignore_closing_entries=ignore_closing_entries
+		):
+			buckets = balances_by_account.setdefault(d.account, {})\
+				.setdefault(d.fiscal_year, [0.0] * (len(period_list) + 1))
+			buckets[d.period_index] += flt(d.debit) - flt(d.credit)
 
 	calculate_values(
-		accounts_by_name, gl_entries_by_account, period_list, accumulated_values, ignore_accumulated_values_for_fy)
+		accounts_by_name, balances_by_account, period_list, accumulated_values, ignore_accumulated_values_for_fy)
 	accumulate_values_into_parents(accounts, accounts_by_name, period_list, accumulated_values)
 	out = prepare_data(accounts, balance_must_be, period_list, company_currency)
 	out = filter_out_zero_value_rows(out, parent_children_map)
@@ -165,26 +167,26 @@ def get_appropriate_currency(company, filters=None):
 
 
 def calculate_values(
-		accounts_by_name, gl_entries_by_account, period_list, accumulated_values, ignore_accumulated_values_for_fy):
-	for entries in gl_entries_by_account.values():
-		for entry in entries:
-			d = accounts_by_name.get(entry.account)
-			if not d:
-				frappe.msgprint(
-					_("Could not retrieve information for {0}.".format(entry.account)), title="Error",
-					raise_exception=1
-				)
-			for period in period_list:
-				# check if posting date is within the period
+		accounts_by_name, balances_by_account, period_list, accumulated_values, ignore_accumulated_values_for_fy):
+	"""Sets the value of each period from the period-wise balances of the account.
+		The first bucket holds the balance before the first period."""
+	for account, balances_by_fiscal_year in balances_by_account.items():
+		d = accounts_by_name.get(account)
+		if not d:
+			frappe.msgprint(
+				_("Could not retrieve information for {0}.".format(account)), title="Error",
+				raise_exception=1
+			)
+
+		for fiscal_year, buckets in balances_by_fiscal_year.items():
+			d["opening_balance"] = d.get("opening_balance", 0.0) + buckets[0]
 
-				if entry.posting_date <= period.to_date:
-					if (accumulated_values or entry.posting_date >= period.from_date) and \
-						(not ignore_accumulated_values_for_fy or
-							entry.fiscal_year == period.to_date_fiscal_year):
-						d[period.key] = d.get(period.key, 0.0) + flt(entry.debit) - flt(entry.credit)
+			balance = buckets[0] if accumulated_values else 0.0
+			for i, period in enumerate(period_list):
+				balance = (balance + buckets[i + 1]) if accumulated_values else buckets[i + 1]
 
-			if entry.posting_date < period_list[0].year_start_date:
-				d["opening_balance"] = d.get("opening_balance", 0.0) + flt(entry.debit) - flt(entry.credit)
+				if not ignore_accumulated_values_for_fy or fiscal_year == period.to_date_fiscal_year:
+					d[period.key] = d.get(period.key, 0.0) + balance
 
 
 def accumulate_values_into_parents(accounts, accounts_by_name, period_list, accumulated_values):
@@ -330,35 +332,67 @@ def sort_root_accounts(roots):
 	roots.sort(key = functools.cmp_to_key(compare_roots))
 
 
-def set_gl_entries_by_account(
-		company, from_date, to_date, root_lft, root_rgt, filters, gl_entries_by_account, ignore_closing_entries=False):
-	"""Returns a dict like { "account": [gl entries], ... }"""
+def get_period_balances(company, period_list, from_date, root_lft, root_rgt, filters,
+		ignore_closing_entries=False, group_by_fields=("account",), condition=None):
+	"""Returns debit and credit summed in the database, for every account (or `group_by_fields`),
+	fiscal year, opening flag and period of `period_list`.
+
+	`period_index` of each row is the 1-based index of its period in `period_list`,
+	0 for entries posted before the first period."""
 
 	additional_conditions = get_additional_conditions(from_date, ignore_closing_entries, filters)
+	if condition:
+		additional_conditions += " and " + condition
+
+	values = {
+		"company": company,
+		"from_date": from_date,
+		"to_date": period_list[-1]["to_date"],
+		"lft": root_lft,
+		"rgt": root_rgt,
+		"first_period_from_date": period_list[0]["from_date"]
+	}
 
-	gl_entries = frappe.db.sql("""select posting_date, account, debit, credit, is_opening, fiscal_year, debit_in_account_currency, credit_in_account_currency, account_currency from `tabGL Entry`
+	period_index_conditions = ["when posting_date < %(first_period_from_date)s then 0"]
+	for i, period in enumerate(period_list):
+		values["period_to_date_{0}".format(i)] = period["to_date"]
+		period_index_conditions.append("when posting_date <= %(period_to_date_{0})s then {1}".format(i, i + 1))
+
+	group_by_fields = list(group_by_fields) + ["fiscal_year", "is_opening"]
+
+	presentation_currency = filters and filters.get('presentation_currency')
+	if presentation_currency:
+		# profit and loss accounts are converted at the rate of the posting date
+		group_by_fields += ["account_currency", "posting_date"]
+
+	account_condition = ""
+	if root_lft and root_rgt:
+		account_condition = """and account in (select name from `tabAccount`
+			where lft >= %(lft)s and rgt <= %(rgt)s)"""
+
+	balances = frappe.db.sql("""
+		select
+			{group_by_fields},
+			case {period_index_conditions} end as period_index,
+			sum(debit) as debit, sum(credit) as credit,
+			sum(debit_in_account_currency) as debit_in_account_currency,
+			sum(credit_in_account_currency) as credit_in_account_currency
+		from `tabGL Entry`
 		where company=%(company)s
 		{additional_conditions}
 		and posting_date <= %(to_date)s
-		and account in (select name from `tabAccount`
-			where lft >= %(lft)s and rgt <= %(rgt)s)
-		order by account, posting_date""".format(additional_conditions=additional_conditions),
-		{
-			"company": company,
-			"from_date": from_date,
-			"to_date": to_date,
-			"lft": root_lft,
-			"rgt": root_rgt
-		},
-		as_dict=True)
-
-	if filters and filters.get('presentation_currency'):
-		convert_to_presentation_currency(gl_entries, get_currency(filters))
-
-	for entry in gl_entries:
-		gl_entries_by_account.setdefault(entry.account, []).append(entry)
-
-	return gl_entries_by_account
+		{account_condition}
+		group by {group_by_fields}, period_index""".format(
+			group_by_fields=", ".join(group_by_fields),
+			period_index_conditions=" ".join(period_index_conditions),
+			additional_conditions=additional_conditions,
+			account_condition=account_condition),
+		values, as_dict=True)
+
+	if presentation_currency:
+		balances = convert_to_presentation_currency(split_debit_and_credit(balances), get_currency(filters))
+
+	return balances
 
 
 def get_additional_conditions(from_date, ignore_closing_entries, filters):
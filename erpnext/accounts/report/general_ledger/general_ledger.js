@@ -111,6 +111,18 @@ frappe.query_reports["General Ledger"] = {
 			"label": __("Currency"),
 			"fieldtype": "Select",
 			"options": erpnext.get_presentation_currency_list()
+		},
+		{
+			"fieldname": "page_length",
+			"label": __("Rows per Page"),
+			"fieldtype": "Int",
+			"description": __("Leave blank to show all entries")
+		},
+		{
+			"fieldname": "page",
+			"label": __("Page"),
+			"fieldtype": "Int",
+			"default": 1
 		}
 	]
 }
@@ -4,12 +4,15 @@
 from __future__ import unicode_literals
 import frappe
 from erpnext import get_company_currency, get_default_company
-from erpnext.accounts.report.utils import get_currency, convert_to_presentation_currency
-from frappe.utils import getdate, cstr, flt, fmt_money
+from erpnext.accounts.report.utils import get_currency, convert_to_presentation_currency, \
+	split_debit_and_credit
+from frappe.utils import flt, cint
 from frappe import _, _dict
 from erpnext.accounts.utils import get_account_currency
+from erpnext.utilities.report_cache import cached_report
 
 
+@cached_report("General Ledger", doctypes=("GL Entry",))
 def execute(filters=None):
 	account_details = {}
 
@@ -94,7 +97,9 @@ def set_account_currency(filters):
 def get_result(filters, account_details):
 	gl_entries = get_gl_entries(filters)
 
-	data = get_data_with_opening_closing(filters, account_details, gl_entries)
+	opening_entries = get_opening_entries(filters)
+
+	data = get_data_with_opening_closing(filters, account_details, gl_entries, opening_entries)
 
 	result = get_result_as_list(data, filters)
 
@@ -107,8 +112,11 @@ def get_gl_entries(filters):
 		sum(credit_in_account_currency) as credit_in_account_currency""" \
 
 
-	group_by_condition = "group by voucher_type, voucher_no, account, cost_center" \
-		if filters.get("group_by_voucher") else "group by name"
+	group_by_condition = get_group_by_condition(filters)
+
+	limit_condition = ""
+	if cint(filters.get("page_length")):
+		limit_condition = "limit {0}, {1}".format(get_start(filters), cint(filters.page_length))
 
 	gl_entries = frappe.db.sql(
 		"""
@@ -121,10 +129,11 @@ def get_gl_entries(filters):
 		from `tabGL Entry`
 		where company=%(company)s {conditions}
 		{group_by_condition}
-		order by posting_date, account
+		order by posting_date, account, name
+		{limit_condition}
 		""".format(
 			select_fields=select_fields, conditions=get_conditions(filters),
-			group_by_condition=group_by_condition
+			group_by_condition=group_by_condition, limit_condition=limit_condition
 		),
 		filters, as_dict=1)
 
@@ -134,7 +143,73 @@ def get_gl_entries(filters):
 		return gl_entries
 
 
-def get_conditions(filters):
+def get_opening_entries(filters):
+	"""Returns the opening balance of each account, summed in the database.
+
+	When the report is paginated, the entries of the previous pages are carried
+	into the opening so that the running balance continues on every page."""
+	group_by_fields = "account, account_currency"
+	if filters.get('presentation_currency'):
+		# profit and loss accounts are converted at the rate of the posting date
+		group_by_fields += ", posting_date"
+
+	opening_entries = frappe.db.sql("""
+		select
+			account, account_currency, max(posting_date) as posting_date,
+			sum(debit) as debit, sum(credit) as credit,
+			sum(debit_in_account_currency) as debit_in_account_currency,
+			sum(credit_in_account_currency) as credit_in_account_currency
+		from `tabGL Entry`
+		where company=%(company)s {conditions}
+		group by {group_by_fields}
+		""".format(conditions=get_conditions(filters, opening=True), group_by_fields=group_by_fields),
+		filters, as_dict=1)
+
+	start = get_start(filters)
+	if start:
+		opening_entries += frappe.db.sql("""
+			select
+				account, account_currency, max(posting_date) as posting_date,
+				sum(debit) as debit, sum(credit) as credit,
+				sum(debit_in_account_currency) as debit_in_account_currency,
+				sum(credit_in_account_currency) as credit_in_account_currency
+			from (
+				select
+					account, account_currency, posting_date,
+					sum(debit) as debit, sum(credit) as credit,
+					sum(debit_in_account_currency) as debit_in_account_currency,
+					sum(credit_in_account_currency) as credit_in_account_currency
+				from `tabGL Entry`
+				where company=%(company)s {conditions}
+				{group_by_condition}
+				order by posting_date, account, name
+				limit {start}
+			) previous_entries
+			group by {group_by_fields}
+			""".format(conditions=get_conditions(filters), group_by_condition=get_group_by_condition(filters),
+				start=start, group_by_fields=group_by_fields),
+			filters, as_dict=1)
+
+	if filters.get('presentation_currency'):
+		return convert_to_presentation_currency(split_debit_and_credit(opening_entries),
+			get_currency(filters))
+	else:
+		return opening_entries
+
+
+def get_group_by_condition(filters):
+	return "group by voucher_type, voucher_no, account, cost_center" \
+		if filters.get("group_by_voucher") else "group by name"
+
+
+def get_start(filters):
+	if not cint(filters.get("page_length")):
+		return 0
+
+	return (max(cint(filters.get("page")), 1) - 1) * cint(filters.page_length)
+
+
+def get_conditions(filters, opening=False):
 	conditions = []
 	if filters.get("account"):
 		lft, rgt = frappe.db.get_value("Account", filters["account"], ["lft", "rgt"])
@@ -150,9 +225,17 @@ def get_conditions(filters):
 	if filters.get("party"):
 		conditions.append("party=%(party)s")
 
-	if not (filters.get("account") or filters.get("party") or filters.get("group_by_account")):
+	if opening:
+		conditions.append("(posting_date < %(from_date)s or is_opening = 'Yes')")
+
+		# without an account or party, only opening entries within the period are considered
+		if not (filters.get("account") or filters.get("party") or filters.get("group_by_account")):
+			conditions.append("posting_date >=%(from_date)s")
+			conditions.append("posting_date <=%(to_date)s")
+	else:
 		conditions.append("posting_date >=%(from_date)s")
 		conditions.append("posting_date <=%(to_date)s")
+		conditions.append("ifnull(is_opening, 'No') != 'Yes'")
 
 	if filters.get("project"):
 		conditions.append("project=%(project)s")
@@ -166,11 +249,11 @@ def get_conditions(filters):
 	return "and {}".format(" and ".join(conditions)) if conditions else ""
 
 
-def get_data_with_opening_closing(filters, account_details, gl_entries):
+def get_data_with_opening_closing(filters, account_details, gl_entries, opening_entries):
 	data = []
-	gle_map = initialize_gle_map(gl_entries)
+	gle_map = initialize_gle_map(opening_entries + gl_entries)
 
-	totals, entries = get_accountwise_gle(filters, gl_entries, gle_map)
+	totals, entries = get_accountwise_gle(filters, gl_entries, opening_entries, gle_map)
 
 	# Opening for filtered account
 	data.append(totals.opening)
@@ -226,7 +309,7 @@ def initialize_gle_map(gl_entries):
 	return gle_map
 
 
-def get_accountwise_gle(filters, gl_entries, gle_map):
+def get_accountwise_gle(filters, gl_entries, opening_entries, gle_map):
 	totals = get_totals_dict()
 	entries = []
 
@@ -237,32 +320,31 @@ def get_accountwise_gle(filters, gl_entries, gle_map):
 		data[key].debit_in_account_currency += flt(gle.debit_in_account_currency)
 		data[key].credit_in_account_currency += flt(gle.credit_in_account_currency)
 
-	from_date, to_date = getdate(filters.from_date), getdate(filters.to_date)
+	for gle in opening_entries:
+		update_value_in_dict(gle_map[gle.account].totals, 'opening', gle)
+		update_value_in_dict(totals, 'opening', gle)
+
+		update_value_in_dict(gle_map[gle.account].totals, 'closing', gle)
+		update_value_in_dict(totals, 'closing', gle)
+
 	for gle in gl_entries:
-		if gle.posting_date < from_date or cstr(gle.is_opening) == "Yes":
-			update_value_in_dict(gle_map[gle.account].totals, 'opening', gle)
-			update_value_in_dict(totals, 'opening', gle)
-
-			update_value_in_dict(gle_map[gle.account].totals, 'closing', gle)
-			update_value_in_dict(totals, 'closing', gle)
-
-		elif gle.posting_date <= to_date:
-			update_value_in_dict(gle_map[gle.account].totals, 'total', gle)
-			update_value_in_dict(totals, 'total', gle)
-			if filters.get("group_by_account"):
-				gle_map[gle.account].entries.append(gle)
-			else:
-				entries.append(gle)
+		update_value_in_dict(gle_map[gle.account].totals, 'total', gle)
+		update_value_in_dict(totals, 'total', gle)
+		if filters.get("group_by_account"):
+			gle_map[gle.account].entries.append(gle)
+		else:
+			entries.append(gle)
 
-			update_value_in_dict(gle_map[gle.account].totals, 'closing', gle)
-			update_value_in_dict(totals, 'closing', gle)
+		update_value_in_dict(gle_map[gle.account].totals, 'closing', gle)
+		update_value_in_dict(totals, 'closing', gle)
 
 	return totals, entries
 
 
 def get_result_as_list(data, filters):
 	balance, balance_in_account_currency = 0, 0
-	inv_details = get_supplier_invoice_details()
+	inv_details = get_supplier_invoice_details(list(set([d.get('against_voucher')
+		for d in data if d.get('against_voucher_type') == "Purchase Invoice"])))
 
 	for d in data:
 		if not d.get('posting_date'):
@@ -285,10 +367,14 @@ def get_result_as_list(data, filters):
 
 	return data
 
-def get_supplier_invoice_details():
+def get_supplier_invoice_details(invoices):
 	inv_details = {}
+	if not invoices:
+		return inv_details
+
 	for d in frappe.db.sql(""" select name, bill_no from `tabPurchase Invoice`
-		where docstatus = 1 and bill_no is not null and bill_no != '' """, as_dict=1):
+		where docstatus = 1 and bill_no is not null and bill_no != ''
+		and name in ({0}) """.format(", ".join(["%s"] * len(invoices))), invoices, as_dict=1):
 		inv_details[d.name] = d.bill_no
 
 	return inv_details
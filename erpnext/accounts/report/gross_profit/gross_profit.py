@@ -7,8 +7,11 @@ from frappe import _, scrub
 from erpnext.stock.utils import get_incoming_rate
 from erpnext.controllers.queries import get_match_cond
 from frappe.utils import flt
+from erpnext.utilities.report_cache import cached_report
 
 
+@cached_report("Gross Profit", doctypes=("Sales Invoice", "Stock Ledger Entry", "Purchase Invoice",
+	"Delivery Note", "Product Bundle", "Item"))
 def execute(filters=None):
 	if not filters: filters = frappe._dict()
 	filters.currency = frappe.db.get_value("Company", filters.company, "default_currency")
@@ -101,6 +104,7 @@ class GrossProfitGenerator(object):
 		self.load_stock_ledger_entries()
 		self.load_product_bundle()
 		self.load_non_stock_items()
+		self.load_last_purchase_rates()
 		self.get_returned_invoice_items()
 		self.process()
 
@@ -184,6 +188,12 @@ class GrossProfitGenerator(object):
 		return new_row
 
 	def get_returned_invoice_items(self):
+		self.returned_invoices = frappe._dict()
+
+		invoices = list(set([d.parent for d in self.si_list]))
+		if not invoices:
+			return
+
 		returned_invoices = frappe.db.sql("""
 			select
 				si.name, si_item.item_code, si_item.qty, si_item.base_amount, si.return_against
@@ -193,9 +203,9 @@ class GrossProfitGenerator(object):
 				si.name = si_item.parent
 				and si.docstatus = 1
 				and si.is_return = 1
-		""", as_dict=1)
+				and si.return_against in ({0})
+		""".format(", ".join(["%s"] * len(invoices))), tuple(invoices), as_dict=1)
 
-		self.returned_invoices = frappe._dict()
 		for inv in returned_invoices:
 			self.returned_invoices.setdefault(inv.return_against, frappe._dict())\
 				.setdefault(inv.item_code, []).append(inv)
@@ -216,35 +226,22 @@ class GrossProfitGenerator(object):
 		return buying_amount
 
 	def get_buying_amount(self, row, item_code):
-		# IMP NOTE
-		# stock_ledger_entries should already be filtered by item_code and warehouse and
-		# sorted by posting_date desc, posting_time desc
 		if item_code in self.non_stock_items:
 			#Issue 6089-Get last purchasing rate for non-stock item
 			item_rate = self.get_last_purchase_rate(item_code)
 			return flt(row.qty) * item_rate
 
-		else:
-			my_sle = self.sle.get((item_code, row.warehouse))
-			if (row.update_stock or row.dn_detail) and my_sle:
-				parenttype, parent = row.parenttype, row.parent
-				if row.dn_detail:
-					parenttype, parent = "Delivery Note", row.delivery_note
-
-				for i, sle in enumerate(my_sle):
-					# find the stock valution rate from stock ledger entry
-					if sle.voucher_type == parenttype and parent == sle.voucher_no and \
-						sle.voucher_detail_no == row.item_row:
-							previous_stock_value = len(my_sle) > i+1 and \
-								flt(my_sle[i+1].stock_value) or 0.0
-							if previous_stock_value:
-								return previous_stock_value - flt(sle.stock_value)
-							else:
-								return flt(row.qty) * self.get_average_buying_rate(row, item_code)
-			else:
-				return flt(row.qty) * self.get_average_buying_rate(row, item_code)
+		elif row.update_stock or row.dn_detail:
+			parenttype, parent = row.parenttype, row.parent
+			if row.dn_detail:
+				parenttype, parent = "Delivery Note", row.delivery_note
+
+			# find the stock valuation from the stock ledger entry of the row
+			sle = self.sle.get((parenttype, parent, row.item_row, item_code, row.warehouse))
+			if sle and sle.previous_stock_value:
+				return sle.previous_stock_value - flt(sle.stock_value)
 
-		return 0.0
+		return flt(row.qty) * self.get_average_buying_rate(row, item_code)
 
 	def get_average_buying_rate(self, row, item_code):
 		args = row
@@ -268,20 +265,38 @@ class GrossProfitGenerator(object):
 		return self.average_buying_rate[item_code]
 
 	def get_last_purchase_rate(self, item_code):
-		if self.filters.to_date:
-			last_purchase_rate = frappe.db.sql("""
-			select (a.base_rate / a.conversion_factor)
-			from `tabPurchase Invoice Item` a
-			where a.item_code = %s and a.docstatus=1
-			and modified <= %s
-			order by a.modified desc limit 1""", (item_code,self.filters.to_date))
-		else:
-			last_purchase_rate = frappe.db.sql("""
-			select (a.base_rate / a.conversion_factor)
-			from `tabPurchase Invoice Item` a
-			where a.item_code = %s and a.docstatus=1
-			order by a.modified desc limit 1""", item_code)
-		return flt(last_purchase_rate[0][0]) if last_purchase_rate else 0
+		return flt(self.last_purchase_rates.get(item_code))
+
+	def load_last_purchase_rates(self):
+		"""Loads the last purchase rate of all the non-stock items invoiced, directly or packed
+			in a product bundle"""
+		self.last_purchase_rates = {}
+
+		items = set([d.item_code for d in self.si_list])
+		for bundles in self.product_bundles.values():
+			for packed_items in bundles.values():
+				for rows in packed_items.values():
+					items.update([d.item_code for d in rows])
+
+		items = [item_code for item_code in items if item_code in self.non_stock_items]
+		if not items:
+			return
+
+		condition = " and modified <= %s" if self.filters.to_date else ""
+		values = items + ([self.filters.to_date] if self.filters.to_date else [])
+
+		for item_code, rate in frappe.db.sql("""
+			select a.item_code, (a.base_rate / a.conversion_factor)
+			from `tabPurchase Invoice Item` a, (
+				select item_code, max(modified) as modified
+				from `tabPurchase Invoice Item`
+				where item_code in ({items}) and docstatus=1 {condition}
+				group by item_code
+			) last
+			where a.item_code = last.item_code and a.modified = last.modified and a.docstatus=1
+			order by a.name desc""".format(items=", ".join(["%s"] * len(items)), condition=condition),
+			tuple(values)):
+				self.last_purchase_rates.setdefault(item_code, rate)
 
 	def load_invoice_items(self):
 		conditions = ""
@@ -325,19 +340,30 @@ class GrossProfitGenerator(object):
 				sales_team_table=sales_team_table, match_cond = get_match_cond('Sales Invoice')), self.filters, as_dict=1)
 
 	def load_stock_ledger_entries(self):
-		res = frappe.db.sql("""select item_code, voucher_type, voucher_no,
-				voucher_detail_no, stock_value, warehouse, actual_qty as qty
-			from `tabStock Ledger Entry`
-			where company=%(company)s
-			order by
-				item_code desc, warehouse desc, posting_date desc,
-				posting_time desc, name desc""", self.filters, as_dict=True)
+		"""Loads the stock ledger entries of the invoiced rows, indexed by voucher, voucher detail,
+			item and warehouse, with the stock value before the entry"""
 		self.sle = {}
-		for r in res:
-			if (r.item_code, r.warehouse) not in self.sle:
-				self.sle[(r.item_code, r.warehouse)] = []
 
-			self.sle[(r.item_code, r.warehouse)].append(r)
+		vouchers = set()
+		for d in self.si_list:
+			if d.update_stock:
+				vouchers.add(d.parent)
+			elif d.dn_detail and d.delivery_note:
+				vouchers.add(d.delivery_note)
+
+		if not vouchers:
+			return
+
+		for d in frappe.db.sql("""select item_code, voucher_type, voucher_no,
+				voucher_detail_no, stock_value, stock_value_difference, warehouse, actual_qty as qty
+			from `tabStock Ledger Entry`
+			where company=%s and voucher_type in ('Sales Invoice', 'Delivery Note')
+				and voucher_no in ({0})
+			order by posting_date desc, posting_time desc, name desc"""
+			.format(", ".join(["%s"] * len(vouchers))), tuple([self.filters.company] + list(vouchers)), as_dict=True):
+				d.previous_stock_value = flt(flt(d.stock_value) - flt(d.stock_value_difference), 9)
+				self.sle.setdefault((d.voucher_type, d.voucher_no, d.voucher_detail_no,
+					d.item_code, d.warehouse), d)
 
 	def load_product_bundle(self):
 		self.product_bundles = {}
@@ -349,5 +375,5 @@ class GrossProfitGenerator(object):
 				frappe._dict()).setdefault(d.parent_item, []).append(d)
 
 	def load_non_stock_items(self):
-		self.non_stock_items = frappe.db.sql_list("""select name from tabItem
-			where is_stock_item=0""")
+		self.non_stock_items = set(frappe.db.sql_list("""select name from tabItem
+			where is_stock_item=0"""))
@@ -5,7 +5,8 @@ from __future__ import unicode_literals
 import frappe
 from frappe import _
 from frappe.utils import flt, getdate, formatdate, cstr
-from erpnext.accounts.report.financial_statements import filter_accounts, filter_out_zero_value_rows
+from erpnext.accounts.report.financial_statements import filter_accounts, filter_out_zero_value_rows, \
+	get_period_balances
 from erpnext.accounts.report.trial_balance.trial_balance import validate_filters
 
 value_fields = ("income", "expense", "gross_profit_loss")
@@ -33,12 +34,10 @@ def get_data(accounts, filters, based_on):
 
 	accounts, accounts_by_name, parent_children_map = filter_accounts(accounts)
 
-	gl_entries_by_account = {}
+	balances_by_account = get_balances_by_account(filters.get("company"), filters.get("from_date"),
+		filters.get("to_date"), based_on, ignore_closing_entries=not flt(filters.get("with_period_closing_entry")))
 
-	set_gl_entries_by_account(filters.get("company"), filters.get("from_date"),
-		filters.get("to_date"), based_on, gl_entries_by_account, ignore_closing_entries=not flt(filters.get("with_period_closing_entry")))
-
-	total_row = calculate_values(accounts, gl_entries_by_account, filters)
+	total_row = calculate_values(accounts, balances_by_account, filters)
 	accumulate_values_into_parents(accounts, accounts_by_name)
 
 	data = prepare_data(accounts, filters, total_row, parent_children_map, based_on)
@@ -47,7 +46,7 @@ def get_data(accounts, filters, based_on):
 
 	return data
 
-def calculate_values(accounts, gl_entries_by_account, filters):
+def calculate_values(accounts, balances_by_account, filters):
 	init = {
 		"income": 0.0,
 		"expense": 0.0,
@@ -70,16 +69,10 @@ def calculate_values(accounts, gl_entries_by_account, filters):
 	for d in accounts:
 		d.update(init.copy())
 
-		# add opening
-
-		for entry in gl_entries_by_account.get(d.name, []):
-			if cstr(entry.is_opening) != "Yes":
-				if entry.type == 'Income':
-					d["income"] += flt(entry.credit) - flt(entry.debit)
-				if entry.type == 'Expense':
-					d["expense"] += flt(entry.debit) - flt(entry.credit)
+		for key in ("income", "expense"):
+			d[key] = balances_by_account.get(d.name, {}).get(key, 0.0)
 
-				d["gross_profit_loss"] = d.get("income") - d.get("expense")
+		d["gross_profit_loss"] = d.get("income") - d.get("expense")
 
 		total_row["income"] += d["income"]
 		total_row["expense"] += d["expense"]
@@ -163,32 +156,25 @@ def get_columns(filters):
 		}
 	]
 
-def set_gl_entries_by_account(company, from_date, to_date, based_on, gl_entries_by_account,
-		ignore_closing_entries=False):
-	"""Returns a dict like { "account": [gl entries], ... }"""
-	additional_conditions = []
-
-	if ignore_closing_entries:
-		additional_conditions.append("and ifnull(voucher_type, '')!='Period Closing Voucher'")
+def get_balances_by_account(company, from_date, to_date, based_on, ignore_closing_entries=False):
+	"""Returns a dict like { "cost center / project": {"income": 0.0, "expense": 0.0}, ... }"""
+	root_types = dict(frappe.db.sql("""select name, root_type from `tabAccount`
+		where company=%s and root_type in ('Income', 'Expense')""", company))
 
-	if from_date:
-		additional_conditions.append("and posting_date >= %(from_date)s")
+	period_list = [frappe._dict(from_date=from_date, to_date=to_date)]
 
-	gl_entries = frappe.db.sql("""select posting_date, {based_on} as based_on, debit, credit, 
-		is_opening, (select root_type from `tabAccount` where name = account) as type
-		from `tabGL Entry` where company=%(company)s
-		{additional_conditions}
-		and posting_date <= %(to_date)s
-		and {based_on} is not null
-		order by {based_on}, posting_date""".format(additional_conditions="\n".join(additional_conditions), based_on= based_on),
-		{
-			"company": company,
-			"from_date": from_date,
-			"to_date": to_date
-		},
-		as_dict=True)
+	balances_by_account = {}
+	for d in get_period_balances(company, period_list, from_date, None, None, None,
+		ignore_closing_entries=ignore_closing_entries, group_by_fields=(based_on, "account"),
+		condition="{0} is not null".format(based_on)):
+			root_type = root_types.get(d.account)
+			if cstr(d.is_opening) == "Yes" or not root_type:
+				continue
 
-	for entry in gl_entries:
-		gl_entries_by_account.setdefault(entry.based_on, []).append(entry)
+			balance = balances_by_account.setdefault(d[based_on], frappe._dict(income=0.0, expense=0.0))
+			if root_type == 'Income':
+				balance.income += flt(d.credit) - flt(d.debit)
+			else:
+				balance.expense += flt(d.debit) - flt(d.credit)
 
-	return gl_entries_by_account
\ No newline at end of file
+	return balances_by_account
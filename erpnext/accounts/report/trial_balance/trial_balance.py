@@ -6,7 +6,7 @@ import frappe, erpnext
 from frappe import _
 from frappe.utils import flt, getdate, formatdate, cstr
 from erpnext.accounts.report.financial_statements \
-	import filter_accounts, set_gl_entries_by_account, filter_out_zero_value_rows
+	import filter_accounts, get_period_balances, filter_out_zero_value_rows
 
 value_fields = ("opening_debit", "opening_credit", "debit", "credit", "closing_debit", "closing_credit")
 
@@ -63,14 +63,19 @@ def get_data(filters):
 	min_lft, max_rgt = frappe.db.sql("""select min(lft), max(rgt) from `tabAccount`
 		where company=%s""", (filters.company,))[0]
 
-	gl_entries_by_account = {}
+	period_list = [frappe._dict(from_date=filters.from_date, to_date=filters.to_date)]
 
-	set_gl_entries_by_account(filters.company, filters.from_date,
-		filters.to_date, min_lft, max_rgt, filters, gl_entries_by_account, ignore_closing_entries=not flt(filters.with_period_closing_entry))
+	balances_by_account = {}
+	for d in get_period_balances(filters.company, period_list, filters.from_date, min_lft, max_rgt,
+		filters, ignore_closing_entries=not flt(filters.with_period_closing_entry)):
+			if cstr(d.is_opening) != "Yes":
+				balance = balances_by_account.setdefault(d.account, frappe._dict(debit=0.0, credit=0.0))
+				balance.debit += flt(d.debit)
+				balance.credit += flt(d.credit)
 
 	opening_balances = get_opening_balances(filters)
 
-	total_row = calculate_values(accounts, gl_entries_by_account, opening_balances, filters, company_currency)
+	total_row = calculate_values(accounts, balances_by_account, opening_balances, filters, company_currency)
 	accumulate_values_into_parents(accounts, accounts_by_name)
 
 	data = prepare_data(accounts, filters, total_row, parent_children_map, company_currency)
@@ -120,7 +125,7 @@ def get_rootwise_opening_balances(filters, report_type):
 
 	return opening
 
-def calculate_values(accounts, gl_entries_by_account, opening_balances, filters, company_currency):
+def calculate_values(accounts, balances_by_account, opening_balances, filters, company_currency):
 	init = {
 		"opening_debit": 0.0,
 		"opening_credit": 0.0,
@@ -153,10 +158,8 @@ def calculate_values(accounts, gl_entries_by_account, opening_balances, filters,
 		d["opening_debit"] = opening_balances.get(d.name, {}).get("opening_debit", 0)
 		d["opening_credit"] = opening_balances.get(d.name, {}).get("opening_credit", 0)
 
-		for entry in gl_entries_by_account.get(d.name, []):
-			if cstr(entry.is_opening) != "Yes":
-				d["debit"] += flt(entry.debit)
-				d["credit"] += flt(entry.credit)
+		d["debit"] = balances_by_account.get(d.name, {}).get("debit", 0.0)
+		d["credit"] = balances_by_account.get(d.name, {}).get("credit", 0.0)
 
 		total_row["debit"] += d["debit"]
 		total_row["credit"] += d["credit"]
@@ -1,7 +1,7 @@
 import frappe
 from erpnext import get_company_currency, get_default_company
 from erpnext.setup.utils import get_exchange_rate
-from frappe.utils import cint
+from frappe.utils import cint, flt
 
 __exchange_rates = {}
 P_OR_L_ACCOUNTS = list(
@@ -119,6 +119,25 @@ def convert_to_presentation_currency(gl_entries, currency_info):
 	return converted_gl_list
 
 
+def split_debit_and_credit(entries):
+	"""
+	Split summed entries having both a debit and a credit into a debit entry and a
+	credit entry, `convert_to_presentation_currency` treats every entry as either one.
+	:param entries: List of entries with debit and credit values
+	:return: List of entries
+	"""
+	split_entries = []
+	for d in entries:
+		for fieldname, other_fieldname in (("debit", "credit"), ("credit", "debit")):
+			if flt(d.get(fieldname)):
+				entry = frappe._dict(d)
+				entry[other_fieldname] = 0.0
+				entry[other_fieldname + "_in_account_currency"] = 0.0
+				split_entries.append(entry)
+
+	return split_entries
+
+
 def get_appropriate_company(filters):
 	if filters.get('company'):
 		company = filters['company']
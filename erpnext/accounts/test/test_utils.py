@@ -1,5 +1,7 @@
 import unittest
+from frappe.utils import add_days, nowdate
 from erpnext.accounts.party import get_party_shipping_address
+from erpnext.accounts.utils import get_outstanding_invoices
 from frappe.test_runner import make_test_objects
 
 
@@ -17,6 +19,35 @@ class TestUtils(unittest.TestCase):
 		address = get_party_shipping_address('Customer', '_Test Customer 2')
 		self.assertEqual(address, '_Test Shipping Address 2 Title-Shipping')
 
+	def test_get_outstanding_invoices(self):
+		from erpnext.accounts.doctype.sales_invoice.test_sales_invoice import create_sales_invoice
+		from erpnext.accounts.doctype.payment_entry.payment_entry import get_payment_entry
+
+		invoices = [create_sales_invoice(customer="_Test Customer 2", rate=100,
+			posting_date=add_days(nowdate(), -2)), create_sales_invoice(customer="_Test Customer 2", rate=200)]
+
+		pe = get_payment_entry("Sales Invoice", invoices[0].name, bank_account="_Test Cash - _TC")
+		pe.reference_no = "1"
+		pe.reference_date = nowdate()
+		pe.paid_amount = pe.received_amount = 40
+		pe.references[0].allocated_amount = 40
+		pe.insert()
+		pe.submit()
+
+		condition = " and voucher_no in ('{0}', '{1}')".format(invoices[0].name, invoices[1].name)
+		outstanding = get_outstanding_invoices("Customer", "_Test Customer 2", "Debtors - _TC",
+			condition=condition)
+		self.assertEqual([(d.voucher_no, d.invoice_amount, d.payment_amount, d.outstanding_amount)
+			for d in outstanding], [(invoices[0].name, 100, 40, 60), (invoices[1].name, 200, 0, 200)])
+
+		outstanding = get_outstanding_invoices("Customer", "_Test Customer 2", "Debtors - _TC",
+			condition=condition, filters={"min_outstanding_amount": 100})
+		self.assertEqual([d.voucher_no for d in outstanding], [invoices[1].name])
+
+		outstanding = get_outstanding_invoices("Customer", "_Test Customer 2", "Debtors - _TC",
+			condition=condition, limit_start=1, limit_page_length=1)
+		self.assertEqual([d.voucher_no for d in outstanding], [invoices[1].name])
+
 
 ADDRESS_RECORDS = [
 	{
@@ -289,27 +289,66 @@ def add_cc(args=None):
 
 def reconcile_against_document(args):
 	"""
-		Cancel JV, Update aginst document, split if required and resubmit jv
+		Cancel JV, Update aginst document, split if required and resubmit jv.
+		Allocations are grouped by voucher, the references of a voucher are updated together
+		and its GL Entries are reposted once.
 	"""
+	vouchers = {}
+	allocated_amounts = {}
 	for d in args:
-
 		check_if_advance_entry_modified(d)
 		validate_allocated_amount(d)
 
-		# cancel advance entry
-		doc = frappe.get_doc(d.voucher_type, d.voucher_no)
+		# a payment row can be allocated against multiple invoices
+		key = (d.voucher_type, d.voucher_no, d.voucher_detail_no)
+		allocated_amounts[key] = allocated_amounts.get(key, 0) + flt(d.allocated_amount)
+		if flt(allocated_amounts[key], 2) > flt(d.unadjusted_amount, 2):
+			throw(_("Allocated amount can not greater than unadjusted amount"))
 
-		doc.make_gl_entries(cancel=1, adv_adj=1)
+		if (d.voucher_type, d.voucher_no) not in vouchers:
+			vouchers[(d.voucher_type, d.voucher_no)] = []
+		vouchers[(d.voucher_type, d.voucher_no)].append(d)
 
-		# update ref in advance entry
-		if d.voucher_type == "Journal Entry":
-			update_reference_in_journal_entry(d, doc)
+	for d in args:
+		entries = vouchers.pop((d.voucher_type, d.voucher_no), None)
+		if entries:
+			reconcile_voucher(d.voucher_type, d.voucher_no, entries)
+
+def reconcile_voucher(voucher_type, voucher_no, entries):
+	# cancel advance entry
+	doc = frappe.get_doc(voucher_type, voucher_no)
+	doc.make_gl_entries(cancel=1, adv_adj=1)
+
+	# update refs in advance entry, the balance of a split row is allocated further
+	balance_rows = {}
+	for d in entries:
+		row = balance_rows.get(d.voucher_detail_no)
+		if row:
+			d = d.copy()
+			d.unadjusted_amount = flt(row.get(d.dr_or_cr) if voucher_type == "Journal Entry"
+				else row.allocated_amount)
+
+		if voucher_type == "Journal Entry":
+			balance_rows[d.voucher_detail_no] = update_reference_in_journal_entry(d, doc,
+				row=row, do_not_save=True)
 		else:
-			update_reference_in_payment_entry(d, doc)
+			balance_rows[d.voucher_detail_no] = update_reference_in_payment_entry(d, doc,
+				row=row, do_not_save=True)
+
+	save_reconciled_voucher(doc)
 
-		# re-submit advance entry
-		doc = frappe.get_doc(d.voucher_type, d.voucher_no)
-		doc.make_gl_entries(cancel = 0, adv_adj =1)
+	# re-submit advance entry
+	doc = frappe.get_doc(voucher_type, voucher_no)
+	doc.make_gl_entries(cancel = 0, adv_adj =1)
+
+def save_reconciled_voucher(doc):
+	# will work as update after submit
+	doc.flags.ignore_validate_update_after_submit = True
+	if doc.doctype == "Payment Entry":
+		doc.setup_party_account_field()
+		doc.set_missing_values()
+		doc.set_amounts()
+	doc.save(ignore_permissions=True)
 
 def check_if_advance_entry_modified(args):
 	"""
@@ -355,11 +394,12 @@ def validate_allocated_amount(args):
 	elif args.get("allocated_amount") > args.get("unadjusted_amount"):
 		throw(_("Allocated amount can not greater than unadjusted amount"))
 
-def update_reference_in_journal_entry(d, jv_obj):
+def update_reference_in_journal_entry(d, jv_obj, row=None, do_not_save=False):
 	"""
-		Updates against document, if partial amount splits into rows
+		Updates against document, if partial amount splits into rows.
+		Returns the row with the balance amount, if split.
 	"""
-	jv_detail = jv_obj.get("accounts", {"name": d["voucher_detail_no"]})[0]
+	jv_detail = row or jv_obj.get("accounts", {"name": d["voucher_detail_no"]})[0]
 	jv_detail.set(d["dr_or_cr"], d["allocated_amount"])
 	jv_detail.set('debit' if d['dr_or_cr']=='debit_in_account_currency' else 'credit',
 		d["allocated_amount"]*flt(jv_detail.exchange_rate))
@@ -370,26 +410,21 @@ def update_reference_in_journal_entry(d, jv_obj):
 	jv_detail.set("reference_type", d["against_voucher_type"])
 	jv_detail.set("reference_name", d["against_voucher"])
 
+	ch = None
 	if d['allocated_amount'] < d['unadjusted_amount']:
-		jvd = frappe.db.sql("""
-			select cost_center, balance, against_account, is_advance,
-				account_type, exchange_rate, account_currency
-			from `tabJournal Entry Account` where name = %s
-		""", d['voucher_detail_no'], as_dict=True)
-
 		amount_in_account_currency = flt(d['unadjusted_amount']) - flt(d['allocated_amount'])
-		amount_in_company_currency = amount_in_account_currency * flt(jvd[0]['exchange_rate'])
+		amount_in_company_currency = amount_in_account_currency * flt(jv_detail.exchange_rate)
 
 		# new entry with balance amount
 		ch = jv_obj.append("accounts")
 		ch.account = d['account']
-		ch.account_type = jvd[0]['account_type']
-		ch.account_currency = jvd[0]['account_currency']
-		ch.exchange_rate = jvd[0]['exchange_rate']
+		ch.account_type = jv_detail.account_type
+		ch.account_currency = jv_detail.account_currency
+		ch.exchange_rate = jv_detail.exchange_rate
 		ch.party_type = d["party_type"]
 		ch.party = d["party"]
-		ch.cost_center = cstr(jvd[0]["cost_center"])
-		ch.balance = flt(jvd[0]["balance"])
+		ch.cost_center = cstr(jv_detail.cost_center)
+		ch.balance = flt(jv_detail.balance)
 
 		ch.set(d['dr_or_cr'], amount_in_account_currency)
 		ch.set('debit' if d['dr_or_cr']=='debit_in_account_currency' else 'credit', amount_in_company_currency)
@@ -398,17 +433,22 @@ def update_reference_in_journal_entry(d, jv_obj):
 			else 'debit_in_account_currency', 0)
 		ch.set('credit' if d['dr_or_cr']== 'debit_in_account_currency' else 'debit', 0)
 
-		ch.against_account = cstr(jvd[0]["against_account"])
+		ch.against_account = cstr(jv_detail.against_account)
 		ch.reference_type = original_reference_type
 		ch.reference_name = original_reference_name
-		ch.is_advance = cstr(jvd[0]["is_advance"])
+		ch.is_advance = cstr(jv_detail.is_advance)
 		ch.docstatus = 1
 
-	# will work as update after submit
-	jv_obj.flags.ignore_validate_update_after_submit = True
-	jv_obj.save(ignore_permissions=True)
+	if not do_not_save:
+		save_reconciled_voucher(jv_obj)
+
+	return ch
 
-def update_reference_in_payment_entry(d, payment_entry):
+def update_reference_in_payment_entry(d, payment_entry, row=None, do_not_save=False):
+	"""
+		Updates the reference of the payment entry, if partial amount splits into rows.
+		Returns the row with the balance amount, if split.
+	"""
 	reference_details = {
 		"reference_doctype": d.against_voucher_type,
 		"reference_name": d.against_voucher,
@@ -418,8 +458,9 @@ def update_reference_in_payment_entry(d, payment_entry):
 		"exchange_rate": d.exchange_rate
 	}
 
+	new_row = None
 	if d.voucher_detail_no:
-		existing_row = payment_entry.get("references", {"name": d["voucher_detail_no"]})[0]
+		existing_row = row or payment_entry.get("references", {"name": d["voucher_detail_no"]})[0]
 		original_row = existing_row.as_dict().copy()
 		existing_row.update(reference_details)
 
@@ -431,15 +472,12 @@ def update_reference_in_payment_entry(d, payment_entry):
 
 			new_row.allocated_amount = original_row.allocated_amount - d.allocated_amount
 	else:
-		new_row = payment_entry.append("references")
-		new_row.docstatus = 1
-		new_row.update(reference_details)
+		payment_entry.append("references", dict(reference_details, docstatus=1))
+
+	if not do_not_save:
+		save_reconciled_voucher(payment_entry)
 
-	payment_entry.flags.ignore_validate_update_after_submit = True
-	payment_entry.setup_party_account_field()
-	payment_entry.set_missing_values()
-	payment_entry.set_amounts()
-	payment_entry.save(ignore_permissions=True)
+	return new_row
 
 def unlink_ref_doc_from_payment_entries(ref_doc):
 	remove_ref_doc_link_from_jv(ref_doc.doctype, ref_doc.name)
@@ -575,74 +613,115 @@ def get_stock_rbnb_difference(posting_date, company):
 	return flt(stock_rbnb) + flt(sys_bal)
 
 
-def get_outstanding_invoices(party_type, party, account, condition=None):
-	outstanding_invoices = []
+def get_outstanding_invoices(party_type, party, account, condition=None, filters=None,
+	limit_start=0, limit_page_length=None):
+	"""Returns the invoices of the party with an outstanding amount, ordered by due date.
+
+	The invoice amounts and the payments made against them are aggregated in one pass each and
+	joined with the due dates of the invoices in a single query.
+
+	:param condition: condition on the GL Entries of the invoices
+	:param filters: optional `from_date` and `to_date` (posting date of the invoice),
+		`min_outstanding_amount` and `max_outstanding_amount`
+	:param limit_start: start of the page
+	:param limit_page_length: length of the page, all the invoices are returned if not set"""
+	filters = frappe._dict(filters or {})
 	precision = frappe.get_precision("Sales Invoice", "outstanding_amount")
 
 	if party_type in ("Customer", "Student"):
 		dr_or_cr = "debit_in_account_currency - credit_in_account_currency"
-		payment_dr_or_cr = "payment_gl_entry.credit_in_account_currency - payment_gl_entry.debit_in_account_currency"
 	else:
 		dr_or_cr = "credit_in_account_currency - debit_in_account_currency"
-		payment_dr_or_cr = "payment_gl_entry.debit_in_account_currency - payment_gl_entry.credit_in_account_currency"
+	payment_dr_or_cr = "-({0})".format(dr_or_cr)
+
+	invoice_conditions, conditions = [], []
+	if filters.from_date:
+		invoice_conditions.append("posting_date >= %(from_date)s")
+	if filters.to_date:
+		invoice_conditions.append("posting_date <= %(to_date)s")
+	if filters.min_outstanding_amount is not None:
+		conditions.append("invoice.invoice_amount - ifnull(payment.payment_amount, 0) >= %(min_outstanding_amount)s")
+	if filters.max_outstanding_amount is not None:
+		conditions.append("invoice.invoice_amount - ifnull(payment.payment_amount, 0) <= %(max_outstanding_amount)s")
+
+	if party_type == "Employee":
+		due_date, join = "invoice.posting_date", ""
+	else:
+		invoice = {"Customer": "Sales Invoice", "Supplier": "Purchase Invoice", "Student": "Fees"}.get(party_type)
+		due_date = "journal_entry.due_date"
+		join = """left join `tabJournal Entry` journal_entry
+			on invoice.voucher_type = 'Journal Entry' and journal_entry.name = invoice.voucher_no"""
+
+		if invoice:
+			due_date = "ifnull(invoice_doc.due_date, journal_entry.due_date)"
+			join += """ left join `tab{0}` invoice_doc
+				on invoice.voucher_type = '{0}' and invoice_doc.name = invoice.voucher_no""".format(invoice)
+
+	limit = "limit %(limit_start)s, %(limit_page_length)s" if limit_page_length else ""
 
-	invoice = 'Sales Invoice' if party_type == 'Customer' else 'Purchase Invoice'
 	invoice_list = frappe.db.sql("""
 		select
-			voucher_no, voucher_type, posting_date, ifnull(sum({dr_or_cr}), 0) as invoice_amount,
-			(
-				select ifnull(sum({payment_dr_or_cr}), 0)
-				from `tabGL Entry` payment_gl_entry
-				where payment_gl_entry.against_voucher_type = invoice_gl_entry.voucher_type
-					and if(invoice_gl_entry.voucher_type='Journal Entry',
-						payment_gl_entry.against_voucher = invoice_gl_entry.voucher_no,
-						payment_gl_entry.against_voucher = invoice_gl_entry.against_voucher)
-					and payment_gl_entry.party_type = invoice_gl_entry.party_type
-					and payment_gl_entry.party = invoice_gl_entry.party
-					and payment_gl_entry.account = invoice_gl_entry.account
-					and {payment_dr_or_cr} > 0
-			) as payment_amount
+			invoice.voucher_no, invoice.voucher_type, invoice.posting_date, invoice.invoice_amount,
+			ifnull(payment.payment_amount, 0) as payment_amount, {due_date} as due_date
 		from
-			`tabGL Entry` invoice_gl_entry
+			(
+				select
+					voucher_type, voucher_no, posting_date, ifnull(sum({dr_or_cr}), 0) as invoice_amount,
+					if(voucher_type = 'Journal Entry', voucher_no, against_voucher) as against_voucher
+				from `tabGL Entry`
+				where
+					party_type = %(party_type)s and party = %(party)s
+					and account = %(account)s and {dr_or_cr} > 0
+					{condition} {invoice_conditions}
+					and ((voucher_type = 'Journal Entry'
+							and (against_voucher = '' or against_voucher is null))
+						or (voucher_type not in ('Journal Entry', 'Payment Entry')))
+				group by voucher_type, voucher_no
+			) invoice
+			left join (
+				select against_voucher_type, against_voucher, sum({payment_dr_or_cr}) as payment_amount
+				from `tabGL Entry`
+				where
+					party_type = %(party_type)s and party = %(party)s
+					and account = %(account)s and {payment_dr_or_cr} > 0
+					and ifnull(against_voucher, '') != ''
+				group by against_voucher_type, against_voucher
+			) payment
+				on payment.against_voucher_type = invoice.voucher_type
+					and payment.against_voucher = invoice.against_voucher
+			{join}
 		where
-			party_type = %(party_type)s and party = %(party)s
-			and account = %(account)s and {dr_or_cr} > 0
-			{condition}
-			and ((voucher_type = 'Journal Entry'
-					and (against_voucher = '' or against_voucher is null))
-				or (voucher_type not in ('Journal Entry', 'Payment Entry')))
-		group by voucher_type, voucher_no
-		having (invoice_amount - payment_amount) > 0.005
-		order by posting_date, name""".format(
+			invoice.invoice_amount - ifnull(payment.payment_amount, 0) > 0.005
+			{conditions}
+		order by ifnull({due_date}, %(today)s), invoice.posting_date, invoice.voucher_no
+		{limit}""".format(
 			dr_or_cr=dr_or_cr,
-			invoice = invoice,
 			payment_dr_or_cr=payment_dr_or_cr,
-			condition=condition or ""
+			condition=condition or "",
+			invoice_conditions="".join(" and " + c for c in invoice_conditions),
+			conditions="".join(" and " + c for c in conditions),
+			due_date=due_date,
+			join=join,
+			limit=limit
 		), {
 			"party_type": party_type,
 			"party": party,
 			"account": account,
+			"today": nowdate(),
+			"from_date": filters.from_date,
+			"to_date": filters.to_date,
+			"min_outstanding_amount": flt(filters.min_outstanding_amount),
+			"max_outstanding_amount": flt(filters.max_outstanding_amount),
+			"limit_start": cint(limit_start),
+			"limit_page_length": cint(limit_page_length)
 		}, as_dict=True)
 
 	for d in invoice_list:
-		due_date = frappe.db.get_value(d.voucher_type, d.voucher_no,
-			"posting_date" if party_type == "Employee" else "due_date")
-
-		outstanding_invoices.append(
-			frappe._dict({
-				'voucher_no': d.voucher_no,
-				'voucher_type': d.voucher_type,
-				'posting_date': d.posting_date,
-				'invoice_amount': flt(d.invoice_amount),
-				'payment_amount': flt(d.payment_amount),
-				'outstanding_amount': flt(d.invoice_amount - d.payment_amount, precision),
-				'due_date': due_date
-			})
-		)
-
-	outstanding_invoices = sorted(outstanding_invoices, key=lambda k: k['due_date'] or getdate(nowdate()))
-
-	return outstanding_invoices
+		d.invoice_amount = flt(d.invoice_amount)
+		d.payment_amount = flt(d.payment_amount)
+		d.outstanding_amount = flt(d.invoice_amount - d.payment_amount, precision)
+
+	return invoice_list
 
 
 def get_account_name(account_type=None, root_type=None, is_group=None, account_currency=None, company=None):
@@ -5,7 +5,7 @@
 from __future__ import unicode_literals
 import frappe
 from frappe import _
-from frappe.utils import flt, add_months, cint, nowdate, getdate, today, date_diff
+from frappe.utils import flt, add_months, cint, nowdate, getdate, today, date_diff, now
 from frappe.model.document import Document
 from erpnext.accounts.doctype.purchase_invoice.purchase_invoice import get_fixed_asset_account
 from erpnext.assets.doctype.asset.depreciation \
@@ -251,14 +251,21 @@ class Asset(Document):
 		return status
 
 def update_maintenance_status():
-	assets = frappe.get_all('Asset', filters = {'docstatus': 1, 'maintenance_required': 1})
-
-	for asset in assets:
-		asset = frappe.get_doc("Asset", asset.name)
-		if frappe.db.exists('Asset Maintenance Task', {'parent': asset.name, 'next_due_date': today()}):
-			asset.set_status('In Maintenance')
-		if frappe.db.exists('Asset Repair', {'asset_name': asset.name, 'repair_status': 'Pending'}):
-			asset.set_status('Out of Order')
+	'''Daily job, sets the assets with a pending repair as Out of Order and the ones with a
+		maintenance task due today as In Maintenance, only rows whose status changes are written'''
+	pending_repair = """exists(select name from `tabAsset Repair`
+		where asset_name = `tabAsset`.name and repair_status = 'Pending')"""
+
+	frappe.db.sql("""update `tabAsset` set status = 'Out of Order', modified = %(now)s
+		where docstatus = 1 and maintenance_required = 1 and status != 'Out of Order'
+			and {pending_repair}""".format(pending_repair=pending_repair), {"now": now()})
+
+	frappe.db.sql("""update `tabAsset` set status = 'In Maintenance', modified = %(now)s
+		where docstatus = 1 and maintenance_required = 1 and status != 'In Maintenance'
+			and exists(select name from `tabAsset Maintenance Task`
+				where parent = `tabAsset`.name and next_due_date = %(today)s)
+			and not {pending_repair}""".format(pending_repair=pending_repair),
+		{"today": today(), "now": now()})
 
 @frappe.whitelist()
 def make_purchase_invoice(asset, item_code, gross_purchase_amount, company, posting_date):
@@ -44,6 +44,31 @@ def make_demo(context, site, domain='Manufacturing', days=100,
 			from erpnext.demo import demo
 			demo.make(domain, days)
 
+@click.command('check-party-account-summary')
+@click.option('--party-type', help='Customer or Supplier')
+@click.option('--party', help='Check only this party')
+@click.option('--fix', default=False, is_flag=True,
+	help='Rebuild the summary rows that do not match the ledger')
+@pass_context
+def check_party_account_summary(context, party_type=None, party=None, fix=False):
+	"Compare the Party Account Summary with invoices and the General Ledger"
+	from erpnext.accounts.doctype.party_account_summary.party_account_summary \
+		import check_party_account_summary
+
+	site = get_site(context)
+	with frappe.init_site(site):
+		frappe.connect()
+		mismatches = check_party_account_summary(party_type, party, fix=fix)
+		for d in mismatches:
+			print("{0} {1} ({2}, {3}): {4} expected {5}, found {6}".format(d.party_type, d.party,
+				d.company, d.fiscal_year, d.fieldname, d.expected, d.actual))
+
+		if fix:
+			frappe.db.commit()
+
+		print("{0} mismatch(es) found{1}".format(len(mismatches), " and fixed" if fix and mismatches else ""))
+
 commands = [
-	make_demo
+	make_demo,
+	check_party_account_summary
 ]
\ No newline at end of file
@@ -4,10 +4,39 @@
 from __future__ import unicode_literals
 import frappe
 from frappe.desk.reportview import get_match_cond, get_filters_cond
-from frappe.utils import nowdate
+from frappe.utils import nowdate, cint
 from collections import defaultdict
+from erpnext.utilities.doctype.link_search_token.link_search_token import get_search_index_join
 
 
+def search_with_index(doctype, txt, searchfields, start, page_len, get_results, like_condition,
+	as_dict=False):
+	'''Returns `get_results(join, scond, values, start, page_len)` restricted by the search index,
+		followed by the `LIKE` matches not found by the index. The index only matches the start of
+		words, so text from the middle of a word (e.g. `123` for `ITM-00123`) is still found.
+		Pages are sliced from the merged results, so that no match is skipped or repeated'''
+	search_index = get_search_index_join(doctype, txt, searchfields)
+	if not search_index:
+		return get_results("", like_condition, {}, start, page_len)
+
+	start, page_len = cint(start), cint(page_len)
+	join, values = search_index
+	results = list(get_results(join, "", values, start, page_len))
+	if len(results) >= page_len:
+		# the index has at least a page from start, it comes first in the merged results
+		return results
+
+	if start:
+		results = list(get_results(join, "", values, 0, start + page_len))
+
+	key = (lambda d: d.name) if as_dict else (lambda d: d[0])
+	found = set(key(d) for d in results)
+	for d in get_results("", like_condition, {}, 0, start + page_len + len(results)):
+		if key(d) not in found:
+			results.append(d)
+
+	return results[start:start + page_len]
+
  # searches for active employees
 def employee_query(doctype, txt, searchfield, start, page_len, filters):
 	conditions = []
@@ -75,29 +104,36 @@ def customer_query(doctype, txt, searchfield, start, page_len, filters):
 	fields = fields + [f for f in searchfields if not f in fields]
 
 	fields = ", ".join(fields)
-	searchfields = " or ".join([field + " like %(txt)s" for field in searchfields])
+	fcond = get_filters_cond(doctype, filters, conditions).replace('%', '%%')
 
-	return frappe.db.sql("""select {fields} from `tabCustomer`
-		where docstatus < 2
-			and ({scond}) and disabled=0
-			{fcond} {mcond}
-		order by
-			if(locate(%(_txt)s, name), locate(%(_txt)s, name), 99999),
-			if(locate(%(_txt)s, customer_name), locate(%(_txt)s, customer_name), 99999),
-			idx desc,
-			name, customer_name
-		limit %(start)s, %(page_len)s""".format(**{
-			"fields": fields,
-			"scond": searchfields,
-			"mcond": get_match_cond(doctype),
-			"fcond": get_filters_cond(doctype, filters, conditions).replace('%', '%%'),
-		}), {
+	def get_results(join, scond, values, start, page_len):
+		values.update({
 			'txt': "%%%s%%" % txt,
 			'_txt': txt.replace("%", ""),
 			'start': start,
 			'page_len': page_len
 		})
 
+		return frappe.db.sql("""select {fields} from `tabCustomer` {join}
+			where docstatus < 2
+				{scond} and disabled=0
+				{fcond} {mcond}
+			order by
+				if(locate(%(_txt)s, name), locate(%(_txt)s, name), 99999),
+				if(locate(%(_txt)s, customer_name), locate(%(_txt)s, customer_name), 99999),
+				idx desc,
+				name, customer_name
+			limit %(start)s, %(page_len)s""".format(**{
+				"fields": fields,
+				"join": join,
+				"scond": scond,
+				"mcond": get_match_cond(doctype),
+				"fcond": fcond,
+			}), values)
+
+	return search_with_index("Customer", txt, searchfields, start, page_len, get_results,
+		"and ({0})".format(" or ".join([field + " like %(txt)s" for field in searchfields])))
+
 # searches for supplier
 def supplier_query(doctype, txt, searchfield, start, page_len, filters):
 	supp_master_name = frappe.defaults.get_user_default("supp_master_name")
@@ -107,27 +143,33 @@ def supplier_query(doctype, txt, searchfield, start, page_len, filters):
 		fields = ["name", "supplier_name", "supplier_type"]
 	fields = ", ".join(fields)
 
-	return frappe.db.sql("""select {field} from `tabSupplier`
-		where docstatus < 2
-			and ({key} like %(txt)s
-				or supplier_name like %(txt)s) and disabled=0
-			{mcond}
-		order by
-			if(locate(%(_txt)s, name), locate(%(_txt)s, name), 99999),
-			if(locate(%(_txt)s, supplier_name), locate(%(_txt)s, supplier_name), 99999),
-			idx desc,
-			name, supplier_name
-		limit %(start)s, %(page_len)s """.format(**{
-			'field': fields,
-			'key': searchfield,
-			'mcond':get_match_cond(doctype)
-		}), {
+	def get_results(join, scond, values, start, page_len):
+		values.update({
 			'txt': "%%%s%%" % txt,
 			'_txt': txt.replace("%", ""),
 			'start': start,
 			'page_len': page_len
 		})
 
+		return frappe.db.sql("""select {field} from `tabSupplier` {join}
+			where docstatus < 2
+				{scond} and disabled=0
+				{mcond}
+			order by
+				if(locate(%(_txt)s, name), locate(%(_txt)s, name), 99999),
+				if(locate(%(_txt)s, supplier_name), locate(%(_txt)s, supplier_name), 99999),
+				idx desc,
+				name, supplier_name
+			limit %(start)s, %(page_len)s """.format(**{
+				'field': fields,
+				'join': join,
+				'scond': scond,
+				'mcond':get_match_cond(doctype)
+			}), values)
+
+	return search_with_index("Supplier", txt, [searchfield, "supplier_name"], start, page_len,
+		get_results, "and ({0} like %(txt)s or supplier_name like %(txt)s)".format(searchfield))
+
 def tax_account_query(doctype, txt, searchfield, start, page_len, filters):
 	tax_accounts = frappe.db.sql("""select name, parent_account	from tabAccount
 		where tabAccount.docstatus!=2
@@ -151,39 +193,48 @@ def tax_account_query(doctype, txt, searchfield, start, page_len, filters):
 
 def item_query(doctype, txt, searchfield, start, page_len, filters, as_dict=False):
 	conditions = []
+	fcond = get_filters_cond(doctype, filters, conditions).replace('%', '%%')
+
+	def get_results(join, scond, values, start, page_len):
+		values.update({
+			"today": nowdate(),
+			"txt": "%%%s%%" % txt,
+			"_txt": txt.replace("%", ""),
+			"start": start,
+			"page_len": page_len
+		})
 
-	return frappe.db.sql("""select tabItem.name, tabItem.item_group,
-		if(length(tabItem.item_name) > 40,
-			concat(substr(tabItem.item_name, 1, 40), "..."), item_name) as item_name,
-		if(length(tabItem.description) > 40, \
-			concat(substr(tabItem.description, 1, 40), "..."), description) as decription
-		from tabItem
-		where tabItem.docstatus < 2
-			and tabItem.has_variants=0
-			and tabItem.disabled=0
-			and (tabItem.end_of_life > %(today)s or ifnull(tabItem.end_of_life, '0000-00-00')='0000-00-00')
-			and (tabItem.`{key}` LIKE %(txt)s
-				or tabItem.item_group LIKE %(txt)s
-				or tabItem.item_name LIKE %(txt)s
-				or tabItem.description LIKE %(txt)s)
-                or tabItem.item_code IN (select parent from `tabItem Barcode` where barcode LIKE %(txt)s)
-			{fcond} {mcond}
-		order by
-			if(locate(%(_txt)s, name), locate(%(_txt)s, name), 99999),
-			if(locate(%(_txt)s, item_name), locate(%(_txt)s, item_name), 99999),
-			idx desc,
-			name, item_name
-		limit %(start)s, %(page_len)s """.format(
-			key=searchfield,
-			fcond=get_filters_cond(doctype, filters, conditions).replace('%', '%%'),
-			mcond=get_match_cond(doctype).replace('%', '%%')),
-			{
-				"today": nowdate(),
-				"txt": "%%%s%%" % txt,
-				"_txt": txt.replace("%", ""),
-				"start": start,
-				"page_len": page_len
-			}, as_dict=as_dict)
+		return frappe.db.sql("""select tabItem.name, tabItem.item_group,
+			if(length(tabItem.item_name) > 40,
+				concat(substr(tabItem.item_name, 1, 40), "..."), item_name) as item_name,
+			if(length(tabItem.description) > 40, \
+				concat(substr(tabItem.description, 1, 40), "..."), description) as decription
+			from tabItem {join}
+			where tabItem.docstatus < 2
+				and tabItem.has_variants=0
+				and tabItem.disabled=0
+				and (tabItem.end_of_life > %(today)s or ifnull(tabItem.end_of_life, '0000-00-00')='0000-00-00')
+				{scond}
+				{fcond} {mcond}
+			order by
+				if(locate(%(_txt)s, name), locate(%(_txt)s, name), 99999),
+				if(locate(%(_txt)s, item_name), locate(%(_txt)s, item_name), 99999),
+				idx desc,
+				name, item_name
+			limit %(start)s, %(page_len)s """.format(
+				join=join,
+				scond=scond,
+				fcond=fcond,
+				mcond=get_match_cond(doctype).replace('%', '%%')),
+				values, as_dict=as_dict)
+
+	return search_with_index("Item", txt, [searchfield], start, page_len, get_results,
+		"""and (tabItem.`{key}` LIKE %(txt)s
+			or tabItem.item_group LIKE %(txt)s
+			or tabItem.item_name LIKE %(txt)s
+			or tabItem.description LIKE %(txt)s)
+			or tabItem.item_code IN (select parent from `tabItem Barcode` where barcode LIKE %(txt)s)""" \
+			.format(key=searchfield), as_dict=as_dict)
 
 def bom(doctype, txt, searchfield, start, page_len, filters):
 	conditions = []
@@ -3,7 +3,7 @@
 
 from __future__ import unicode_literals
 import frappe
-from frappe.utils import getdate
+from frappe.utils import getdate, flt
 from frappe import _
 
 def get_columns(filters, trans):
@@ -41,7 +41,7 @@ def validate_filters(filters):
 def get_data(filters, conditions):
 	
 	data = []
-	inc, cond= '',''
+	cond = ''
 	query_details =  conditions["based_on_select"] + conditions["period_wise_select"]
 
 	posting_date = 't1.transaction_date'
@@ -68,53 +68,34 @@ def get_data(filters, conditions):
 		elif filters.get("group_by") == 'Supplier':
 			sel_col = 't1.supplier'
 
-		if filters.get('based_on') in ['Item','Customer','Supplier']:
-			inc = 2
-		else :
-			inc = 1
-		data1 = frappe.db.sql(""" select %s from `tab%s` t1, `tab%s Item` t2 %s
+		# based on x group by x period in one query, the based on rows are summed up from
+		# their group by rows
+		rows = frappe.db.sql(""" select %s, %s, %s from `tab%s` t1, `tab%s Item` t2 %s
 					where t2.parent = t1.name and t1.company = %s and %s between %s and %s and
 					t1.docstatus = 1 %s %s
-					group by %s
-				""" % (query_details,  conditions["trans"],  conditions["trans"], conditions["addl_tables"], "%s",
-					posting_date, "%s", "%s", conditions.get("addl_tables_relational_cond"), cond, conditions["group_by"]), (filters.get("company"),
-					year_start_date, year_end_date),as_list=1)
-
-		for d in range(len(data1)):
-			#to add blanck column
-			dt = data1[d]
-			dt.insert(ind,'')
-			data.append(dt)
-
-			#to get distinct value of col specified by group_by in filter
-			row = frappe.db.sql("""select DISTINCT(%s) from `tab%s` t1, `tab%s Item` t2 %s
-						where t2.parent = t1.name and t1.company = %s and %s between %s and %s
-						and t1.docstatus = 1 and %s = %s %s %s
-					""" %
-					(sel_col,  conditions["trans"],  conditions["trans"], conditions["addl_tables"],
-						"%s", posting_date, "%s", "%s", conditions["group_by"], "%s", conditions.get("addl_tables_relational_cond"), cond),
-					(filters.get("company"), year_start_date, year_end_date, data1[d][0]), as_list=1)
-
-			for i in range(len(row)):
-				des = ['' for q in range(len(conditions["columns"]))]
-
-				#get data for group_by filter
-				row1 = frappe.db.sql(""" select %s , %s from `tab%s` t1, `tab%s Item` t2 %s
-							where t2.parent = t1.name and t1.company = %s and %s between %s and %s
-							and t1.docstatus = 1 and %s = %s and %s = %s %s %s
-						""" %
-						(sel_col, conditions["period_wise_select"], conditions["trans"],
-							conditions["trans"], conditions["addl_tables"], "%s", posting_date, "%s","%s", sel_col,
-							"%s", conditions["group_by"], "%s", conditions.get("addl_tables_relational_cond"), cond),
-						(filters.get("company"), year_start_date, year_end_date, row[i][0],
-							data1[d][0]), as_list=1)
-
-				des[ind] = row[i][0]
-
-				for j in range(1,len(conditions["columns"])-inc):
-					des[j+inc] = row1[0][j]
-
-				data.append(des)
+					group by %s, %s
+					order by %s, %s
+				""" % (conditions["group_by"], sel_col, query_details, conditions["trans"], conditions["trans"],
+					conditions["addl_tables"], "%s", posting_date, "%s", "%s",
+					conditions.get("addl_tables_relational_cond"), cond, conditions["group_by"], sel_col,
+					conditions["group_by"], sel_col), (filters.get("company"), year_start_date, year_end_date),
+				as_list=1)
+
+		based_on_rows = {}
+		for d in rows:
+			based_on, group_by_value, based_on_values, period_values = d[0], d[1], d[2:ind+2], d[ind+2:]
+
+			if based_on not in based_on_rows:
+				#to add blank column
+				based_on_rows[based_on] = list(based_on_values) + [''] + [None] * len(period_values)
+				data.append(based_on_rows[based_on])
+
+			based_on_row = based_on_rows[based_on]
+			for i, value in enumerate(period_values):
+				if value is not None:
+					based_on_row[ind + 1 + i] = flt(based_on_row[ind + 1 + i]) + flt(value)
+
+			data.append([''] * ind + [group_by_value] + list(period_values))
 	else:
 		data = frappe.db.sql(""" select %s from `tab%s` t1, `tab%s Item` t2 %s
 					where t2.parent = t1.name and t1.company = %s and %s between %s and %s and
@@ -181,6 +181,13 @@ standard_queries = {
 }
 
 doc_events = {
+	"*": {
+		"on_update": "erpnext.utilities.report_cache.update_doc_data_version",
+		"on_submit": "erpnext.utilities.report_cache.update_doc_data_version",
+		"on_cancel": "erpnext.utilities.report_cache.update_doc_data_version",
+		"on_update_after_submit": "erpnext.utilities.report_cache.update_doc_data_version",
+		"on_trash": "erpnext.utilities.report_cache.update_doc_data_version"
+	},
 	"Stock Entry": {
 		"on_submit": "erpnext.stock.doctype.material_request.material_request.update_completed_and_requested_qty",
 		"on_cancel": "erpnext.stock.doctype.material_request.material_request.update_completed_and_requested_qty"
@@ -191,6 +198,11 @@ doc_events = {
 		"on_update": ["erpnext.hr.doctype.employee.employee.update_user_permissions",
 			"erpnext.portal.utils.set_default_role"]
 	},
+	("Item", "Customer", "Supplier"): {
+		"on_update": "erpnext.utilities.doctype.link_search_token.link_search_token.update_search_index",
+		"after_rename": "erpnext.utilities.doctype.link_search_token.link_search_token.update_search_index_after_rename",
+		"on_trash": "erpnext.utilities.doctype.link_search_token.link_search_token.delete_search_index"
+	},
 	("Sales Taxes and Charges Template", 'Price List'): {
 		"on_update": "erpnext.shopping_cart.doctype.shopping_cart_settings.shopping_cart_settings.validate_cart_settings"
 	},
@@ -200,7 +212,9 @@ doc_events = {
 	},
 	"Sales Invoice": {
 		'validate': 'erpnext.regional.india.utils.set_place_of_supply',
-		"on_submit": "erpnext.regional.france.utils.create_transaction_log",
+		"on_submit": ["erpnext.regional.france.utils.create_transaction_log",
+			"erpnext.accounts.doctype.party_account_summary.party_account_summary.update_billing_summary"],
+		"on_cancel": "erpnext.accounts.doctype.party_account_summary.party_account_summary.update_billing_summary",
 		"on_trash": "erpnext.regional.check_deletion_permission"
 	},
 	"Payment Entry": {
@@ -211,7 +225,9 @@ doc_events = {
 		'validate': 'erpnext.regional.india.utils.validate_gstin_for_india'
 	},
 	'Purchase Invoice': {
-		'validate': 'erpnext.regional.india.utils.set_place_of_supply'
+		'validate': 'erpnext.regional.india.utils.set_place_of_supply',
+		"on_submit": "erpnext.accounts.doctype.party_account_summary.party_account_summary.update_billing_summary",
+		"on_cancel": "erpnext.accounts.doctype.party_account_summary.party_account_summary.update_billing_summary"
 	}
 }
 
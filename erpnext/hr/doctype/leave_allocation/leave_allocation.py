@@ -8,6 +8,8 @@ from frappe import _
 from frappe.model.document import Document
 from erpnext.hr.utils import set_employee_name
 from erpnext.hr.doctype.leave_application.leave_application import get_approved_leaves_for_period
+from erpnext.hr.doctype.leave_ledger_entry.leave_ledger_entry import make_leave_ledger_entries, \
+	delete_leave_ledger_entries
 
 class OverlapError(frappe.ValidationError): pass
 class BackDatedAllocationError(frappe.ValidationError): pass
@@ -26,6 +28,12 @@ class LeaveAllocation(Document):
 		self.validate_lwp()
 		set_employee_name(self)
 
+	def on_submit(self):
+		make_leave_ledger_entries(self)
+
+	def on_cancel(self):
+		delete_leave_ledger_entries(self)
+
 	def on_update_after_submit(self):
 		self.validate_new_leaves_allocated_value()
 		self.set_total_leaves_allocated()
@@ -34,6 +42,7 @@ class LeaveAllocation(Document):
 		frappe.db.set(self,'total_leaves_allocated',flt(self.total_leaves_allocated))
 		
 		self.validate_against_leave_applications()
+		make_leave_ledger_entries(self)
 
 	def validate_period(self):
 		if date_diff(self.to_date, self.from_date) <= 0:
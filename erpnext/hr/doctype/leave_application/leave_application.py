@@ -10,6 +10,8 @@ from erpnext.hr.utils import set_employee_name
 from erpnext.hr.doctype.leave_block_list.leave_block_list import get_applicable_block_dates
 from erpnext.hr.doctype.employee.employee import get_holiday_list_for_employee
 from erpnext.hr.doctype.employee_leave_approver.employee_leave_approver import get_approver_list
+from erpnext.hr.doctype.leave_ledger_entry.leave_ledger_entry import make_leave_ledger_entries, \
+	delete_leave_ledger_entries, get_leaves_taken, get_leave_balances
 
 
 class LeaveDayBlockedError(frappe.ValidationError): pass
@@ -40,6 +42,10 @@ class LeaveApplication(Document):
 
 	def on_submit(self):
 		self.validate_back_dated_application()
+		make_leave_ledger_entries(self)
+
+	def on_cancel(self):
+		delete_leave_ledger_entries(self)
 
 	def validate_dates(self):
 		if self.from_date and self.to_date and (getdate(self.to_date) < getdate(self.from_date)):
@@ -299,7 +305,8 @@ def get_number_of_leave_days(employee, leave_type, from_date, to_date, half_day
 def get_leave_balance_on(employee, leave_type, date, allocation_records=None,
 		consider_all_leaves_in_the_allocation_period=False):
 	if allocation_records == None:
-		allocation_records = get_leave_allocation_records(date, employee).get(employee, frappe._dict())
+		return flt(get_leave_balances(date, [employee], consider_all_leaves_in_the_allocation_period)
+			.get(employee, frappe._dict()).get(leave_type))
 
 	allocation = allocation_records.get(leave_type, frappe._dict())
 
@@ -310,35 +317,7 @@ def get_leave_balance_on(employee, leave_type, date, allocation_records=None,
 	return flt(allocation.total_leaves_allocated) - flt(leaves_taken)
 
 def get_approved_leaves_for_period(employee, leave_type, from_date, to_date):
-	leave_applications = frappe.db.sql("""
-		select employee, leave_type, from_date, to_date, total_leave_days
-		from `tabLeave Application`
-		where employee=%(employee)s and leave_type=%(leave_type)s
-			and docstatus=1
-			and (from_date between %(from_date)s and %(to_date)s
-				or to_date between %(from_date)s and %(to_date)s
-				or (from_date < %(from_date)s and to_date > %(to_date)s))
-	""", {
-		"from_date": from_date,
-		"to_date": to_date,
-		"employee": employee,
-		"leave_type": leave_type
-	}, as_dict=1)
-
-	leave_days = 0
-	for leave_app in leave_applications:
-		if leave_app.from_date >= getdate(from_date) and leave_app.to_date <= getdate(to_date):
-			leave_days += leave_app.total_leave_days
-		else:
-			if leave_app.from_date < getdate(from_date):
-				leave_app.from_date = from_date
-			if leave_app.to_date > getdate(to_date):
-				leave_app.to_date = to_date
-
-			leave_days += get_number_of_leave_days(employee, leave_type,
-				leave_app.from_date, leave_app.to_date)
-
-	return leave_days
+	return get_leaves_taken(employee, leave_type, from_date, to_date)
 
 def get_leave_allocation_records(date, employee=None):
 	conditions = (" and employee='%s'" % employee) if employee else ""
@@ -5,7 +5,8 @@ from __future__ import unicode_literals
 import frappe
 import unittest
 
-from erpnext.hr.doctype.leave_application.leave_application import LeaveDayBlockedError, OverlapError
+from erpnext.hr.doctype.leave_application.leave_application import LeaveDayBlockedError, OverlapError, \
+	get_leave_balance_on, get_approved_leaves_for_period
 from frappe.permissions import clear_user_permissions_for_doctype
 
 test_dependencies = ["Leave Allocation", "Leave Block List"]
@@ -43,7 +44,7 @@ _test_records = [
 
 class TestLeaveApplication(unittest.TestCase):
 	def setUp(self):
-		for dt in ["Leave Application", "Leave Allocation", "Salary Slip"]:
+		for dt in ["Leave Application", "Leave Allocation", "Leave Ledger Entry", "Salary Slip"]:
 			frappe.db.sql("delete from `tab%s`" % dt)
 
 	def tearDown(self):
@@ -250,8 +251,31 @@ class TestLeaveApplication(unittest.TestCase):
 		frappe.db.set_value("Leave Block List", "_Test Leave Block List",
 			"applies_to_all_departments", 0)
 
+	def test_leave_balance_from_ledger(self):
+		make_allocation_record()
+		self.assertEqual(get_leave_balance_on("_T-Employee-00001", "_Test Leave Type", "2014-01-01"), 30)
+
+		application = self.get_application(_test_records[0])
+		application.from_date = "2014-02-03"
+		application.to_date = "2014-02-07"
+		application.half_day = 1
+		application.half_day_date = "2014-02-05"
+		application.insert()
+		application.submit()
+
+		self.assertEqual(frappe.db.count("Leave Ledger Entry",
+			{"transaction_type": "Leave Application", "transaction_name": application.name}), 5)
+		self.assertEqual(get_approved_leaves_for_period("_T-Employee-00001", "_Test Leave Type",
+			"2014-02-01", "2014-02-05"), 2.5)
+		self.assertEqual(get_leave_balance_on("_T-Employee-00001", "_Test Leave Type", "2014-02-04"), 28)
+		self.assertEqual(get_leave_balance_on("_T-Employee-00001", "_Test Leave Type", "2014-12-31"), 25.5)
+
+		application.cancel()
+		self.assertEqual(get_leave_balance_on("_T-Employee-00001", "_Test Leave Type", "2014-12-31"), 30)
+
 def make_allocation_record(employee=None, leave_type=None):
 	frappe.db.sql("delete from `tabLeave Allocation`")
+	frappe.db.sql("delete from `tabLeave Ledger Entry` where transaction_type='Leave Allocation'")
 
 	allocation = frappe.get_doc({
 		"doctype": "Leave Allocation",
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe.utils import add_days, cint, date_diff, flt, getdate
+from frappe.model.document import Document
+from erpnext.hr.doctype.employee.employee import get_holiday_list_for_employee
+
+class LeaveLedgerEntry(Document):
+	pass
+
+def on_doctype_update():
+	frappe.db.add_index("Leave Ledger Entry", ["employee", "leave_type", "date"])
+	frappe.db.add_index("Leave Ledger Entry", ["transaction_type", "transaction_name"])
+
+def make_leave_ledger_entries(doc):
+	'''Posts the signed entries of a submitted Leave Allocation or Leave Application'''
+	delete_leave_ledger_entries(doc)
+
+	if doc.doctype == "Leave Allocation":
+		entries = [frappe._dict({
+			"date": doc.from_date,
+			"leaves": flt(doc.total_leaves_allocated),
+			"from_date": doc.from_date,
+			"to_date": doc.to_date
+		})]
+	else:
+		entries = [frappe._dict({"date": date, "leaves": -1 * leaves})
+			for date, leaves in get_leave_days(doc.employee, doc.leave_type,
+				doc.from_date, doc.to_date, doc.half_day, doc.half_day_date)]
+
+	for d in entries:
+		d.update({
+			"doctype": "Leave Ledger Entry",
+			"employee": doc.employee,
+			"employee_name": doc.employee_name,
+			"leave_type": doc.leave_type,
+			"transaction_type": doc.doctype,
+			"transaction_name": doc.name,
+			"company": doc.get("company")
+		})
+		frappe.get_doc(d).db_insert()
+
+def delete_leave_ledger_entries(doc):
+	frappe.db.sql("""delete from `tabLeave Ledger Entry`
+		where transaction_type=%s and transaction_name=%s""", (doc.doctype, doc.name))
+
+def get_leave_days(employee, leave_type, from_date, to_date, half_day=None, half_day_date=None):
+	'''Returns (date, leaves) for every day counted by a leave application,
+		consistent with `get_number_of_leave_days`'''
+	from_date, to_date = getdate(from_date), getdate(to_date)
+
+	holidays = []
+	if not frappe.db.get_value("Leave Type", leave_type, "include_holiday"):
+		holidays = get_holiday_dates(employee, from_date, to_date)
+
+	leave_days = []
+	for i in range(date_diff(to_date, from_date) + 1):
+		date = add_days(from_date, i)
+		if date not in holidays:
+			leave_days.append([date, 1])
+
+	if cint(half_day) and leave_days:
+		# the half day is always deducted from the total, as in `get_number_of_leave_days`,
+		# from the first leave day when the half day date is a holiday or out of the period
+		half_day_date = getdate(half_day_date) if half_day_date else None
+		half_day = ([d for d in leave_days if d[0] == half_day_date] or leave_days)[0]
+		half_day[1] = 0.5
+
+	return [tuple(d) for d in leave_days]
+
+def get_holiday_dates(employee, from_date, to_date):
+	holiday_list = get_holiday_list_for_employee(employee)
+	return [getdate(d) for d in frappe.db.sql_list("""select distinct holiday_date from `tabHoliday`
+		where parent=%s and holiday_date between %s and %s""", (holiday_list, from_date, to_date))]
+
+def get_leaves_taken(employee, leave_type, from_date, to_date):
+	'''Returns leaves taken in the period as a range sum over the ledger'''
+	leaves = frappe.db.sql("""select sum(leaves) from `tabLeave Ledger Entry`
+		where employee=%s and leave_type=%s and transaction_type='Leave Application'
+		and date between %s and %s""", (employee, leave_type, from_date, to_date))
+
+	return -1 * flt(leaves[0][0]) if leaves else 0
+
+def get_leave_balances(date, employees=None, consider_all_leaves_in_the_allocation_period=False):
+	'''Returns {employee: {leave_type: balance}} on the date, for the allocation covering the date'''
+	conditions = ""
+	if employees:
+		conditions = " and alloc.employee in %(employees)s"
+
+	balances = frappe._dict()
+	for d in frappe.db.sql("""
+		select alloc.employee, alloc.leave_type, sum(ledger.leaves) as balance
+		from `tabLeave Ledger Entry` alloc, `tabLeave Ledger Entry` ledger
+		where alloc.transaction_type = 'Leave Allocation'
+			and %(date)s between alloc.from_date and alloc.to_date
+			and ledger.employee = alloc.employee and ledger.leave_type = alloc.leave_type
+			and ledger.date >= alloc.from_date
+			and ledger.date <= {upto_date} {conditions}
+		group by alloc.employee, alloc.leave_type""".format(conditions=conditions,
+			upto_date="alloc.to_date" if consider_all_leaves_in_the_allocation_period else "%(date)s"),
+		{"date": date, "employees": employees}, as_dict=1):
+			balances.setdefault(d.employee, frappe._dict())[d.leave_type] = flt(d.balance)
+
+	return balances
+
+def get_leaves_taken_for_period(from_date, to_date, employees=None):
+	'''Returns {employee: {leave_type: leaves taken}} in the period'''
+	conditions = ""
+	if employees:
+		conditions = " and employee in %(employees)s"
+
+	leaves_taken = frappe._dict()
+	for d in frappe.db.sql("""
+		select employee, leave_type, sum(leaves) as leaves
+		from `tabLeave Ledger Entry`
+		where transaction_type = 'Leave Application'
+			and date between %(from_date)s and %(to_date)s {0}
+		group by employee, leave_type""".format(conditions),
+		{"from_date": from_date, "to_date": to_date, "employees": employees}, as_dict=1):
+			leaves_taken.setdefault(d.employee, frappe._dict())[d.leave_type] = -1 * flt(d.leaves)
+
+	return leaves_taken
+
+def rebuild_leave_ledger():
+	'''Reposts the ledger from all submitted Leave Allocations and Leave Applications'''
+	frappe.db.sql("delete from `tabLeave Ledger Entry`")
+	for doctype in ("Leave Allocation", "Leave Application"):
+		for name in frappe.db.sql_list("""select name from `tab{0}` where docstatus=1""".format(doctype)):
+			make_leave_ledger_entries(frappe.get_doc(doctype, name))
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from erpnext.hr.doctype.leave_ledger_entry.leave_ledger_entry import get_leave_days
+from erpnext.hr.doctype.leave_application.leave_application import get_number_of_leave_days
+
+test_dependencies = ["Employee", "Holiday List"]
+
+class TestLeaveLedgerEntry(unittest.TestCase):
+	def test_half_day_on_holiday(self):
+		if not frappe.db.exists("Leave Type", "_Test Leave Type Excluding Holidays"):
+			frappe.get_doc({
+				"doctype": "Leave Type",
+				"leave_type_name": "_Test Leave Type Excluding Holidays",
+				"include_holiday": 0
+			}).insert()
+
+		employee = frappe.db.get_value("Employee", {"employee_name": "_Test Employee"})
+		frappe.db.set_value("Employee", employee, "holiday_list", "_Test Holiday List")
+
+		# 2013-01-26 is a holiday in _Test Holiday List
+		for half_day_date in ("2013-01-26", "2013-01-30", None):
+			leave_days = get_leave_days(employee, "_Test Leave Type Excluding Holidays",
+				"2013-01-25", "2013-01-28", 1, half_day_date)
+
+			self.assertFalse([d for d in leave_days if str(d[0]) == "2013-01-26"])
+			self.assertEqual(sum(d[1] for d in leave_days), get_number_of_leave_days(employee,
+				"_Test Leave Type Excluding Holidays", "2013-01-25", "2013-01-28", 1, half_day_date))
+			self.assertEqual(sum(d[1] for d in leave_days), 2.5)
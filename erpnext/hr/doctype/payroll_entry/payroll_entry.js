@@ -9,6 +9,19 @@ frappe.ui.form.on('Payroll Entry', {
 			frm.doc.posting_date = frappe.datetime.nowdate();
 		}
 		frm.toggle_reqd(['payroll_frequency'], !frm.doc.salary_slip_based_on_timesheet);
+
+		frappe.realtime.on("payroll_entry_progress", function(data) {
+			if (data.reload && data.reload === 1) {
+				frm.reload_doc();
+			}
+			if (data.progress) {
+				let progress_bar = $(frm.dashboard.progress_area).find(".progress-bar");
+				if (progress_bar) {
+					$(progress_bar).removeClass("progress-bar-danger").addClass("progress-bar-success progress-bar-striped");
+					$(progress_bar).css("width", data.progress+"%");
+				}
+			}
+		});
 	},
 
 	refresh: function(frm) {
@@ -16,6 +29,33 @@ frappe.ui.form.on('Payroll Entry', {
 			if (frm.custom_buttons) frm.clear_custom_buttons();
 			frm.events.add_context_buttons(frm);
 		}
+		if (in_list(["Queued", "In Process"], frm.doc.salary_slip_creation_status)) {
+			frm.dashboard.add_progress(__("Salary Slip Creation Status"), "0");
+		}
+		if (frm.doc.docstatus == 1 && frm.doc.salary_slip_creation_status == "Failed") {
+			frm.add_custom_button(__("Create Salary Slips"), function() {
+				frappe.call({
+					method: "create_salary_slips",
+					doc: frm.doc,
+					callback: function() {
+						frm.reload_doc();
+					}
+				});
+			}).addClass("btn-primary");
+		}
+	},
+
+	on_submit: function(frm) {
+		// large runs are queued on submit, the jobs are started once the submit is committed
+		if (frm.doc.salary_slip_creation_status == "Queued") {
+			frappe.call({
+				method: "create_salary_slips",
+				doc: frm.doc,
+				callback: function() {
+					frm.reload_doc();
+				}
+			});
+		}
 	},
 
 	add_context_buttons: function(frm) {
@@ -8,13 +8,17 @@ from frappe.model.document import Document
 from dateutil.relativedelta import relativedelta
 from frappe.utils import cint, flt, nowdate, add_days, getdate, fmt_money, add_to_date, DATE_FORMAT
 from frappe import _
+from frappe.utils.background_jobs import enqueue
 from erpnext.accounts.utils import get_fiscal_year
 
+# employees per background job when creating salary slips in bulk
+SALARY_SLIP_CHUNK_SIZE = 100
+
 
 class PayrollEntry(Document):
 
 	def on_submit(self):
-		self.create_salary_slips()
+		self.create_salary_slips(enqueue=False)
 
 	def get_emp_list(self):
 		"""
@@ -83,43 +87,46 @@ class PayrollEntry(Document):
 			if not self.get(fieldname):
 				frappe.throw(_("Please set {0}").format(self.meta.get_label(fieldname)))
 
-	def create_salary_slips(self):
+	@frappe.whitelist()
+	def create_salary_slips(self, enqueue=True):
 		"""
-			Creates salary slip for selected employees if already not created
+			Creates salary slip for selected employees if already not created.
+			Large runs are created in background jobs, on submit they are only marked as
+			Queued and the jobs are started by the form once the submit is committed
 		"""
 		self.check_permission('write')
 		self.created = 1;
 		emp_list = self.get_emp_list()
-		ss_list = []
-		if emp_list:
-			for emp in emp_list:
-				if not frappe.db.sql("""select
-						name from `tabSalary Slip`
-					where
-						docstatus!= 2 and
-						employee = %s and
-						start_date >= %s and
-						end_date <= %s and
-						company = %s
-						""", (emp['employee'], self.start_date, self.end_date, self.company)):
-					ss = frappe.get_doc({
-						"doctype": "Salary Slip",
-						"salary_slip_based_on_timesheet": self.salary_slip_based_on_timesheet,
-						"payroll_frequency": self.payroll_frequency,
-						"start_date": self.start_date,
-						"end_date": self.end_date,
-						"employee": emp['employee'],
-						"employee_name": frappe.get_value("Employee", {"name":emp['employee']}, "employee_name"),
-						"company": self.company,
-						"posting_date": self.posting_date
-					})
-					ss.insert()
-					ss_dict = {}
-					ss_dict["Employee Name"] = ss.employee_name
-					ss_dict["Total Pay"] = fmt_money(ss.rounded_total,currency = frappe.defaults.get_global_default("currency"))
-					ss_dict["Salary Slip"] = format_as_links(ss.name)[0]
-					ss_list.append(ss_dict)
-		return create_log(ss_list)
+		if not emp_list:
+			return create_log([])
+
+		existing_salary_slips = set(get_existing_salary_slips([d.employee for d in emp_list],
+			self.start_date, self.end_date, self.company))
+		employees = []
+		for d in emp_list:
+			if d.employee not in existing_salary_slips:
+				existing_salary_slips.add(d.employee)
+				employees.append(d)
+
+		if len(employees) > SALARY_SLIP_CHUNK_SIZE and not self.is_new():
+			self.db_set("salary_slip_creation_status", "Queued")
+			self.db_set("error_log", None)
+			if not enqueue:
+				return
+
+			expected_count = len(employees) + frappe.db.count("Salary Slip",
+				{"payroll_entry": self.name, "docstatus": ("!=", 2)})
+
+			for i in range(0, len(employees), SALARY_SLIP_CHUNK_SIZE):
+				enqueue(create_salary_slips_for_employees, queue='long', timeout=3000,
+					event='create_salary_slips', payroll_entry=self.name,
+					employees=employees[i:i + SALARY_SLIP_CHUNK_SIZE], expected_count=expected_count)
+
+			frappe.msgprint(_("Salary Slips for {0} employees will be created in the background.")
+				.format(len(employees)))
+		else:
+			ss_list = create_salary_slips_for_employees(self.name, employees, payroll_entry_doc=self)
+			return create_log(ss_list)
 
 	def get_sal_slip_list(self, ss_status, as_dict=False):
 		"""
@@ -443,6 +450,93 @@ def get_month_details(year, month):
 		frappe.throw(_("Fiscal Year {0} not found").format(year))
 
 
+def get_existing_salary_slips(employees, start_date, end_date, company):
+	if not employees:
+		return []
+
+	return frappe.db.sql_list("""select distinct employee from `tabSalary Slip`
+		where
+			docstatus!= 2 and
+			employee in %(employees)s and
+			start_date >= %(start_date)s and
+			end_date <= %(end_date)s and
+			company = %(company)s
+		""", {"employees": employees, "start_date": start_date, "end_date": end_date, "company": company})
+
+def create_salary_slips_for_employees(payroll_entry, employees, expected_count=None, payroll_entry_doc=None):
+	'''Creates Salary Slips for a chunk of employees of the Payroll Entry.
+		Masters for the whole chunk are preloaded once and shared by all slips.'''
+	from erpnext.hr.doctype.salary_slip.salary_slip import get_payroll_data
+
+	doc = payroll_entry_doc or frappe.get_doc("Payroll Entry", payroll_entry)
+	background = not payroll_entry_doc
+	if background and doc.salary_slip_creation_status == "Queued":
+		doc.db_set("salary_slip_creation_status", "In Process")
+		frappe.db.commit()
+
+	ss_list = []
+	try:
+		payroll_data = get_payroll_data([d.employee for d in employees], doc.start_date, doc.end_date)
+		currency = frappe.defaults.get_global_default("currency")
+
+		for emp in employees:
+			ss = frappe.get_doc({
+				"doctype": "Salary Slip",
+				"salary_slip_based_on_timesheet": doc.salary_slip_based_on_timesheet,
+				"payroll_frequency": doc.payroll_frequency,
+				"start_date": doc.start_date,
+				"end_date": doc.end_date,
+				"employee": emp.employee,
+				"employee_name": emp.employee_name,
+				"company": doc.company,
+				"posting_date": doc.posting_date,
+				"payroll_entry": doc.name
+			})
+			ss._payroll_data = payroll_data
+			ss.insert()
+
+			ss_list.append({
+				"Employee Name": ss.employee_name,
+				"Total Pay": fmt_money(ss.rounded_total, currency=currency),
+				"Salary Slip": format_as_links(ss.name)[0]
+			})
+
+	except Exception:
+		if not background:
+			raise
+
+		frappe.db.rollback()
+		error_log = frappe.local.message_log and "\n\n".join(frappe.local.message_log) \
+			or frappe.get_traceback()
+		doc.db_set("salary_slip_creation_status", "Failed")
+		doc.db_set("error_log", error_log)
+		frappe.db.commit()
+		publish_salary_slip_progress(doc.name, 100)
+		return
+
+	if background:
+		update_salary_slip_creation_status(doc, expected_count)
+	elif not doc.is_new():
+		doc.db_set("salary_slip_creation_status", "Successful")
+
+	return ss_list
+
+def update_salary_slip_creation_status(doc, expected_count):
+	created_count = frappe.db.count("Salary Slip", {"payroll_entry": doc.name, "docstatus": ("!=", 2)})
+	progress = min(100, int(created_count * 100 / expected_count)) if expected_count else 100
+
+	if progress >= 100 and frappe.db.get_value("Payroll Entry", doc.name,
+		"salary_slip_creation_status") != "Failed":
+		doc.db_set("salary_slip_creation_status", "Successful")
+
+	frappe.db.commit()
+	publish_salary_slip_progress(doc.name, progress)
+
+def publish_salary_slip_progress(payroll_entry, progress):
+	frappe.publish_realtime("payroll_entry_progress",
+		{"progress": str(progress), "reload": 1 if progress >= 100 else 0},
+		doctype="Payroll Entry", docname=payroll_entry)
+
 @frappe.whitelist()
 def create_log(ss_list):
 	if not ss_list:
@@ -6,10 +6,12 @@ import frappe, erpnext
 
 from frappe.utils import add_days, cint, cstr, flt, getdate, rounded, date_diff, money_in_words
 from frappe.model.naming import make_autoname
+from frappe.model import default_fields
 
 from frappe import msgprint, _
 from erpnext.hr.doctype.payroll_entry.payroll_entry import get_start_end_dates
 from erpnext.hr.doctype.employee.employee import get_holiday_list_for_employee
+from erpnext.hr.doctype.salary_structure.salary_structure import get_compiled_formulas, eval_expression
 from erpnext.utilities.transaction_base import TransactionBase
 from frappe.utils.background_jobs import enqueue
 
@@ -48,15 +50,25 @@ class SalarySlip(TransactionBase):
 
 	def calculate_component_amounts(self):
 		if not getattr(self, '_salary_structure_doc', None):
-			self._salary_structure_doc = frappe.get_doc('Salary Structure', self.salary_structure)
+			self._salary_structure_doc = self.get_salary_structure_doc(self.salary_structure)
 
-		data = self.get_data_for_eval()
+		compiled_formulas = self.get_compiled_formulas()
+		data = self.get_data_for_eval(compiled_formulas.names)
 
-		for key in ('earnings', 'deductions'):
-			for struct_row in self._salary_structure_doc.get(key):
-				amount = self.eval_condition_and_formula(struct_row, data)
-				if amount and struct_row.statistical_component == 0:
-					self.update_component_row(struct_row, amount, key)
+		amounts = {}
+		for d in compiled_formulas.eval_order:
+			amounts[d.position] = self.eval_condition_and_formula(d, data)
+
+		for d in compiled_formulas.rows:
+			amount = amounts[d.position]
+			if amount and d.component.statistical_component == 0:
+				self.update_component_row(d.component, amount, d.parentfield)
+
+	def get_compiled_formulas(self):
+		try:
+			return get_compiled_formulas(self._salary_structure_doc)
+		except SyntaxError as err:
+			frappe.throw(_("Syntax error in formula or condition: {0}".format(err)))
 
 	def update_component_row(self, struct_row, amount, key):
 		component_row = None
@@ -77,16 +89,14 @@ class SalarySlip(TransactionBase):
 			component_row.amount = amount
 
 	def eval_condition_and_formula(self, d, data):
+		'''Evaluates a row compiled by `get_compiled_formulas`'''
 		try:
-			condition = d.condition.strip() if d.condition else None
-			if condition:
-				if not frappe.safe_eval(condition, None, data):
+			if d.condition:
+				if not eval_expression(d.condition, data):
 					return None
 			amount = d.amount
-			if d.amount_based_on_formula:
-				formula = d.formula.strip() if d.formula else None
-				if formula:
-					amount = frappe.safe_eval(formula, None, data)
+			if d.formula:
+				amount = eval_expression(d.formula, data)
 			if amount:
 				data[d.abbr] = amount
 
@@ -100,20 +110,32 @@ class SalarySlip(TransactionBase):
 			frappe.throw(_("Error in formula or condition: {0}".format(e)))
 			raise
 
-	def get_data_for_eval(self):
-		'''Returns data for evaluating formula'''
+	def get_data_for_eval(self, names):
+		'''Returns data for evaluating formula, only the given names are looked up'''
 		data = frappe._dict()
+		payroll_data = self.get_payroll_data()
 
-		data.update(frappe.get_doc("Salary Structure Employee",
-			{"employee": self.employee, "parent": self.salary_structure}).as_dict())
-
-		data.update(frappe.get_doc("Employee", self.employee).as_dict())
-		data.update(self.as_dict())
+		salary_structure_employee = [d for d in payroll_data.salary_structure_employees.get(self.employee, [])
+			if d.parent == self.salary_structure]
+		if salary_structure_employee:
+			salary_structure_employee = salary_structure_employee[0]
+		else:
+			salary_structure_employee = frappe.get_doc("Salary Structure Employee",
+				{"employee": self.employee, "parent": self.salary_structure}).as_dict()
+
+		employee = self.get_employee_details()
+		for name in names:
+			if self.meta.has_field(name) or name in default_fields:
+				data[name] = self.get(name)
+			elif name in employee:
+				data[name] = employee[name]
+			elif name in salary_structure_employee:
+				data[name] = salary_structure_employee[name]
 
 		# set values for components
-		salary_components = frappe.get_all("Salary Component", fields=["salary_component_abbr"])
-		for sc in salary_components:
-			data.setdefault(sc.salary_component_abbr, 0)
+		for abbr in payroll_data.salary_component_abbrs:
+			if abbr in names:
+				data.setdefault(abbr, 0)
 
 		for key in ('earnings', 'deductions'):
 			for d in self.get(key):
@@ -131,14 +153,13 @@ class SalarySlip(TransactionBase):
 			if not self.salary_slip_based_on_timesheet:
 				self.get_date_details()
 			self.validate_dates()
-			joining_date, relieving_date = frappe.db.get_value("Employee", self.employee,
-				["date_of_joining", "relieving_date"])
+			joining_date, relieving_date = self.get_joining_relieving_date()
 
 			self.get_leave_details(joining_date, relieving_date)
 			struct = self.check_sal_struct(joining_date, relieving_date)
 
 			if struct:
-				self._salary_structure_doc = frappe.get_doc('Salary Structure', struct)
+				self._salary_structure_doc = self.get_salary_structure_doc(struct)
 				self.salary_slip_based_on_timesheet = self._salary_structure_doc.salary_slip_based_on_timesheet or 0
 				self.set_time_sheet()
 				self.pull_sal_struct()
@@ -162,16 +183,24 @@ class SalarySlip(TransactionBase):
 			self.end_date = date_details.end_date
 
 	def check_sal_struct(self, joining_date, relieving_date):
-		cond = ''
-		if self.payroll_frequency:
-			cond = """and payroll_frequency = '%(payroll_frequency)s'""" % {"payroll_frequency": self.payroll_frequency}
+		payroll_data = getattr(self, '_payroll_data', None)
+		if payroll_data and self.employee in payroll_data.employees:
+			st_name = [[d.parent] for d in payroll_data.salary_structure_employees.get(self.employee, [])
+				if (not self.payroll_frequency or d.payroll_frequency == self.payroll_frequency)
+				and (is_on_or_before(d.from_date, self.start_date) or is_on_or_before(d.from_date, joining_date))
+				and (not d.to_date or is_on_or_before(self.end_date, d.to_date)
+					or is_on_or_before(relieving_date, d.to_date))]
+		else:
+			cond = ''
+			if self.payroll_frequency:
+				cond = """and payroll_frequency = '%(payroll_frequency)s'""" % {"payroll_frequency": self.payroll_frequency}
 
-		st_name = frappe.db.sql("""select parent from `tabSalary Structure Employee`
-			where employee=%s and (from_date <= %s or from_date <= %s)
-			and (to_date is null or to_date >= %s or to_date >= %s)
-			and parent in (select name from `tabSalary Structure`
-				where is_active = 'Yes'%s)
-			"""% ('%s', '%s', '%s','%s','%s', cond),(self.employee, self.start_date, joining_date, self.end_date, relieving_date))
+			st_name = frappe.db.sql("""select parent from `tabSalary Structure Employee`
+				where employee=%s and (from_date <= %s or from_date <= %s)
+				and (to_date is null or to_date >= %s or to_date >= %s)
+				and parent in (select name from `tabSalary Structure`
+					where is_active = 'Yes'%s)
+				"""% ('%s', '%s', '%s','%s','%s', cond),(self.employee, self.start_date, joining_date, self.end_date, relieving_date))
 
 		if st_name:
 			if len(st_name) > 1:
@@ -221,7 +250,7 @@ class SalarySlip(TransactionBase):
 			doc.append('earnings', wages_row)
 
 	def pull_emp_details(self):
-		emp = frappe.db.get_value("Employee", self.employee, ["bank_name", "bank_ac_no"], as_dict=1)
+		emp = self.get_employee_details()
 		if emp:
 			self.bank_name = emp.bank_name
 			self.bank_account_no = emp.bank_ac_no
@@ -229,13 +258,12 @@ class SalarySlip(TransactionBase):
 
 	def get_leave_details(self, joining_date=None, relieving_date=None, lwp=None):
 		if not joining_date:
-			joining_date, relieving_date = frappe.db.get_value("Employee", self.employee,
-				["date_of_joining", "relieving_date"])
+			joining_date, relieving_date = self.get_joining_relieving_date()
 
 		holidays = self.get_holidays_for_employee(self.start_date, self.end_date)
 		working_days = date_diff(self.end_date, self.start_date) + 1
 		actual_lwp = self.calculate_lwp(holidays, working_days)
-		if not cint(frappe.db.get_value("HR Settings", None, "include_holidays_in_total_working_days")):
+		if not self.get_payroll_data().include_holidays_in_total_working_days:
 			working_days -= len(holidays)
 			if working_days < 0:
 				frappe.throw(_("There are more holidays than working days this month."))
@@ -269,12 +297,19 @@ class SalarySlip(TransactionBase):
 
 		payment_days = date_diff(end_date, start_date) + 1
 
-		if not cint(frappe.db.get_value("HR Settings", None, "include_holidays_in_total_working_days")):
+		if not self.get_payroll_data().include_holidays_in_total_working_days:
 			holidays = self.get_holidays_for_employee(start_date, end_date)
 			payment_days -= len(holidays)
 		return payment_days
 
 	def get_holidays_for_employee(self, start_date, end_date):
+		payroll_data = getattr(self, '_payroll_data', None)
+		if payroll_data and self.employee in payroll_data.employees \
+			and payroll_data.start_date <= getdate(start_date) and getdate(end_date) <= payroll_data.end_date:
+			holiday_list = payroll_data.holiday_lists[self.employee]
+			return [d for d in payroll_data.holidays.get(holiday_list, [])
+				if cstr(getdate(start_date)) <= d <= cstr(getdate(end_date))]
+
 		holiday_list = get_holiday_list_for_employee(self.employee)
 		holidays = frappe.db.sql_list('''select holiday_date from `tabHoliday`
 			where
@@ -291,23 +326,22 @@ class SalarySlip(TransactionBase):
 		return holidays
 
 	def calculate_lwp(self, holidays, working_days):
+		payroll_data = getattr(self, '_payroll_data', None)
+		if payroll_data and self.employee in payroll_data.employees \
+			and (payroll_data.start_date, payroll_data.end_date) == (getdate(self.start_date), getdate(self.end_date)):
+			leaves = payroll_data.lwp_leaves.get(self.employee, [])
+		else:
+			leaves = get_lwp_leave_applications([self.employee], self.start_date, self.end_date) \
+				.get(self.employee, [])
+
 		lwp = 0
-		holidays = "','".join(holidays)
 		for d in range(working_days):
-			dt = add_days(cstr(getdate(self.start_date)), d)
-			leave = frappe.db.sql("""
-				select t1.name, t1.half_day
-				from `tabLeave Application` t1, `tabLeave Type` t2
-				where t2.name = t1.leave_type
-				and t2.is_lwp = 1
-				and t1.docstatus = 1
-				and t1.employee = %(employee)s
-				and CASE WHEN t2.include_holiday != 1 THEN %(dt)s not in ('{0}') and %(dt)s between from_date and to_date
-				WHEN t2.include_holiday THEN %(dt)s between from_date and to_date
-				END
-				""".format(holidays), {"employee": self.employee, "dt": dt})
-			if leave:
-				lwp = cint(leave[0][1]) and (lwp + 0.5) or (lwp + 1)
+			dt = getdate(add_days(cstr(getdate(self.start_date)), d))
+			for leave in leaves:
+				if leave.from_date <= dt <= leave.to_date \
+					and (cint(leave.include_holiday) or cstr(dt) not in holidays):
+					lwp = cint(leave.half_day) and (lwp + 0.5) or (lwp + 1)
+					break
 		return lwp
 
 	def check_existing(self):
@@ -325,8 +359,7 @@ class SalarySlip(TransactionBase):
 					frappe.throw(_("Salary Slip of employee {0} already created for time sheet {1}").format(self.employee, data.time_sheet))
 
 	def sum_components(self, component_type, total_field):
-		joining_date, relieving_date = frappe.db.get_value("Employee", self.employee,
-			["date_of_joining", "relieving_date"])
+		joining_date, relieving_date = self.get_joining_relieving_date()
 		
 		if not relieving_date:
 			relieving_date = getdate(self.end_date)
@@ -360,7 +393,7 @@ class SalarySlip(TransactionBase):
 		if self.salary_structure:
 			self.calculate_component_amounts()
 
-		disable_rounded_total = cint(frappe.db.get_value("Global Defaults", None, "disable_rounded_total"))
+		disable_rounded_total = self.get_payroll_data().disable_rounded_total
 
 		self.total_deduction = 0
 		self.gross_pay = 0
@@ -395,14 +428,39 @@ class SalarySlip(TransactionBase):
 			self.total_principal_amount += loan.principal_amount
 
 	def get_employee_loan_details(self):
-		return frappe.db.sql("""select rps.principal_amount, rps.interest_amount, el.name,
-				rps.total_payment, el.employee_loan_account, el.interest_income_account
-			from
-				`tabRepayment Schedule` as rps, `tabEmployee Loan` as el
-			where
-				el.name = rps.parent and rps.payment_date between %s and %s and
-				el.repay_from_salary = 1 and el.docstatus = 1 and el.employee = %s""",
-			(self.start_date, self.end_date, self.employee), as_dict=True) or []
+		payroll_data = getattr(self, '_payroll_data', None)
+		if payroll_data and self.employee in payroll_data.employees \
+			and (payroll_data.start_date, payroll_data.end_date) == (getdate(self.start_date), getdate(self.end_date)):
+			return payroll_data.employee_loans.get(self.employee, [])
+
+		return get_employee_loan_repayments([self.employee], self.start_date, self.end_date) \
+			.get(self.employee, [])
+
+	def get_payroll_data(self):
+		'''Returns masters preloaded by Payroll Entry for all employees of the payroll,
+			or loads the settings needed by this slip alone'''
+		if not getattr(self, '_payroll_data', None):
+			self._payroll_data = get_payroll_data([], self.start_date, self.end_date)
+		return self._payroll_data
+
+	def get_employee_details(self):
+		payroll_data = self.get_payroll_data()
+		if self.employee in payroll_data.employees:
+			return payroll_data.employees[self.employee]
+
+		if getattr(self, '_employee_details', None) is None or self._employee_details.name != self.employee:
+			self._employee_details = frappe.get_doc("Employee", self.employee).as_dict()
+		return self._employee_details
+
+	def get_joining_relieving_date(self):
+		employee = self.get_employee_details()
+		return employee.date_of_joining, employee.relieving_date
+
+	def get_salary_structure_doc(self, salary_structure):
+		payroll_data = self.get_payroll_data()
+		if salary_structure not in payroll_data.salary_structures:
+			payroll_data.salary_structures[salary_structure] = frappe.get_doc('Salary Structure', salary_structure)
+		return payroll_data.salary_structures[salary_structure]
 
 	def on_submit(self):
 		if self.net_pay < 0:
@@ -463,4 +521,88 @@ def unlink_ref_doc_from_salary_slip(ref_no):
 	if linked_ss:
 		for ss in linked_ss:
 			ss_doc = frappe.get_doc("Salary Slip", ss)
-			frappe.db.set_value("Salary Slip", ss_doc.name, "journal_entry", "")
\ No newline at end of file
+			frappe.db.set_value("Salary Slip", ss_doc.name, "journal_entry", "")
+
+def is_on_or_before(date, other_date):
+	return bool(date and other_date and getdate(date) <= getdate(other_date))
+
+def get_payroll_data(employees, start_date, end_date):
+	'''Returns the masters needed to compute Salary Slips of the given employees for the period,
+		loaded in a few queries for all employees instead of per Salary Slip'''
+	payroll_data = frappe._dict({
+		"start_date": getdate(start_date) if start_date else None,
+		"end_date": getdate(end_date) if end_date else None,
+		"employees": {},
+		"salary_structures": {},
+		"salary_structure_employees": {},
+		"holiday_lists": {},
+		"holidays": {},
+		"lwp_leaves": {},
+		"employee_loans": {},
+		"include_holidays_in_total_working_days": cint(frappe.db.get_value("HR Settings", None,
+			"include_holidays_in_total_working_days")),
+		"disable_rounded_total": cint(frappe.db.get_value("Global Defaults", None, "disable_rounded_total")),
+		"salary_component_abbrs": [d.salary_component_abbr for d in
+			frappe.get_all("Salary Component", fields=["salary_component_abbr"])]
+	})
+
+	if not employees:
+		return payroll_data
+
+	for d in frappe.db.sql("""select * from `tabEmployee` where name in %(employees)s""",
+		{"employees": employees}, as_dict=True):
+			payroll_data.employees[d.name] = d
+
+	for d in frappe.db.sql("""select sse.*, ss.payroll_frequency
+		from `tabSalary Structure Employee` sse, `tabSalary Structure` ss
+		where sse.parent = ss.name and ss.is_active = 'Yes' and sse.employee in %(employees)s""",
+		{"employees": employees}, as_dict=True):
+			payroll_data.salary_structure_employees.setdefault(d.employee, []).append(d)
+
+	default_holiday_lists = {}
+	for employee in payroll_data.employees.values():
+		if not employee.holiday_list and employee.company not in default_holiday_lists:
+			default_holiday_lists[employee.company] = get_holiday_list_for_employee(employee.name)
+		payroll_data.holiday_lists[employee.name] = employee.holiday_list or default_holiday_lists[employee.company]
+
+	for d in frappe.db.sql("""select parent, holiday_date from `tabHoliday`
+		where parent in %(holiday_lists)s and holiday_date between %(start_date)s and %(end_date)s""",
+		{"holiday_lists": list(set(payroll_data.holiday_lists.values())),
+			"start_date": start_date, "end_date": end_date}, as_dict=True):
+			payroll_data.holidays.setdefault(d.parent, []).append(cstr(d.holiday_date))
+
+	payroll_data.lwp_leaves = get_lwp_leave_applications(employees, start_date, end_date)
+	payroll_data.employee_loans = get_employee_loan_repayments(employees, start_date, end_date)
+
+	return payroll_data
+
+def get_lwp_leave_applications(employees, start_date, end_date):
+	'''Returns submitted Leave Without Pay applications overlapping the period, grouped by employee'''
+	leaves = {}
+	for d in frappe.db.sql("""
+		select t1.employee, t1.from_date, t1.to_date, t1.half_day, t2.include_holiday
+		from `tabLeave Application` t1, `tabLeave Type` t2
+		where t2.name = t1.leave_type
+		and t2.is_lwp = 1
+		and t1.docstatus = 1
+		and t1.employee in %(employees)s
+		and t1.from_date <= %(end_date)s and t1.to_date >= %(start_date)s
+		""", {"employees": employees, "start_date": start_date, "end_date": end_date}, as_dict=True):
+			leaves.setdefault(d.employee, []).append(d)
+
+	return leaves
+
+def get_employee_loan_repayments(employees, start_date, end_date):
+	'''Returns loan repayments due in the period, grouped by employee'''
+	loans = {}
+	for d in frappe.db.sql("""select el.employee, rps.principal_amount, rps.interest_amount, el.name,
+			rps.total_payment, el.employee_loan_account, el.interest_income_account
+		from
+			`tabRepayment Schedule` as rps, `tabEmployee Loan` as el
+		where
+			el.name = rps.parent and rps.payment_date between %(start_date)s and %(end_date)s and
+			el.repay_from_salary = 1 and el.docstatus = 1 and el.employee in %(employees)s""",
+		{"employees": employees, "start_date": start_date, "end_date": end_date}, as_dict=True):
+			loans.setdefault(d.employee, []).append(d)
+
+	return loans
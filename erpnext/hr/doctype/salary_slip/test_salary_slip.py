@@ -169,6 +169,31 @@ class TestSalarySlip(unittest.TestCase):
 			elif payroll_frequncy == "Daily":
 				self.assertEqual(ss.end_date, getdate(nowdate()))
 
+	def test_salary_slip_with_preloaded_payroll_data(self):
+		from erpnext.hr.doctype.salary_slip.salary_slip import get_payroll_data
+
+		self.make_employee("test_employee@salary.com")
+		employee = frappe.db.get_value("Employee", {"user_id": "test_employee@salary.com"})
+		ss = frappe.get_doc("Salary Slip",
+			self.make_employee_salary_slip("test_employee@salary.com", "Monthly"))
+
+		preloaded_ss = frappe.get_doc({
+			"doctype": "Salary Slip",
+			"employee": employee,
+			"payroll_frequency": "Monthly",
+			"start_date": ss.start_date,
+			"end_date": ss.end_date,
+			"posting_date": ss.posting_date,
+			"company": ss.company
+		})
+		preloaded_ss._payroll_data = get_payroll_data([employee], ss.start_date, ss.end_date)
+		preloaded_ss.get_emp_and_leave_details()
+		preloaded_ss.calculate_net_pay()
+
+		for fieldname in ("salary_structure", "total_working_days", "payment_days",
+			"gross_pay", "total_deduction", "net_pay"):
+			self.assertEqual(preloaded_ss.get(fieldname), ss.get(fieldname))
+
 	def make_employee(self, user):
 		if not frappe.db.get_value("User", user):
 			frappe.get_doc({
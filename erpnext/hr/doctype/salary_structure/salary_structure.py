@@ -2,9 +2,9 @@
 # License: GNU General Public License v3. See license.txt
 
 from __future__ import unicode_literals
-import frappe
+import frappe, types
 
-from frappe.utils import flt, cint, getdate
+from frappe.utils import flt, cint, cstr, getdate
 from frappe import _
 from frappe.model.mapper import get_mapped_doc
 from frappe.model.document import Document
@@ -18,6 +18,7 @@ class SalaryStructure(Document):
 			set_employee_name(e)
 		self.validate_date()
 		self.strip_condition_and_formula_fields()
+		self.validate_condition_and_formula_fields()
 
 	def get_ss_values(self,employee):
 		basic_info = frappe.db.sql("""select bank_name, bank_ac_no
@@ -73,6 +74,120 @@ class SalaryStructure(Document):
 			row.condition = row.condition.strip() if row.condition else ""
 			row.formula = row.formula.strip() if row.formula else ""
 
+	def validate_condition_and_formula_fields(self):
+		for row in self.earnings + self.deductions:
+			for fieldname in ("condition", "formula"):
+				try:
+					compile_expression(row.get(fieldname))
+				except SyntaxError as err:
+					frappe.throw(_("Row #{0}: Syntax error in {1} of {2}: {3}")
+						.format(row.idx, fieldname, row.salary_component, err))
+
+safe_eval_globals = {
+	"__builtins__": {},
+	"int": int,
+	"float": float,
+	"long": int,
+	"round": round
+}
+
+def compile_expression(expression):
+	'''Compiles a condition or formula, with the same restrictions as `frappe.safe_eval`'''
+	expression = expression.strip() if expression else None
+	if not expression:
+		return None
+
+	if '__' in expression:
+		frappe.throw(_('Illegal rule {0}. Cannot use "__"').format(frappe.bold(expression)))
+
+	return compile(expression, '<salary structure formula>', 'eval')
+
+def eval_expression(code, data):
+	return eval(code, safe_eval_globals, data)
+
+def get_compiled_formulas(salary_structure):
+	'''Returns the conditions and formulas of the Salary Structure compiled once per version of the
+		structure in the request or background job, with the order in which components must be
+		evaluated and the names they use'''
+	if not getattr(frappe.local, "compiled_salary_formulas", None):
+		frappe.local.compiled_salary_formulas = {}
+
+	key = (salary_structure.name, cstr(salary_structure.modified))
+	if key not in frappe.local.compiled_salary_formulas:
+		frappe.local.compiled_salary_formulas[key] = compile_formulas(salary_structure)
+
+	return frappe.local.compiled_salary_formulas[key]
+
+def compile_formulas(salary_structure):
+	rows, names = [], set()
+	for parentfield in ('earnings', 'deductions'):
+		for d in salary_structure.get(parentfield):
+			row = frappe._dict({
+				"position": len(rows),
+				"parentfield": parentfield,
+				"component": frappe._dict({
+					"salary_component": d.salary_component,
+					"abbr": d.abbr,
+					"statistical_component": d.statistical_component,
+					"depends_on_lwp": d.depends_on_lwp,
+					"do_not_include_in_total": d.do_not_include_in_total
+				}),
+				"abbr": d.abbr,
+				"amount": d.amount,
+				"condition": compile_expression(d.condition),
+				"formula": compile_expression(d.formula) if d.amount_based_on_formula else None
+			})
+			row.names = get_code_names(row.condition) | get_code_names(row.formula)
+			names.update(row.names)
+			rows.append(row)
+
+	return frappe._dict({
+		"rows": rows,
+		"eval_order": get_evaluation_order(rows),
+		"names": names
+	})
+
+def get_code_names(code):
+	'''Returns the names used by the compiled expression, including those used inside the
+		lambdas, generator expressions and comprehensions it contains'''
+	if not code:
+		return set()
+
+	names = set(code.co_names)
+	for const in code.co_consts:
+		if isinstance(const, types.CodeType):
+			names |= get_code_names(const)
+
+	return names
+
+def get_evaluation_order(rows):
+	'''Orders rows so that a component is evaluated before the conditions and formulas using its
+		abbreviation. Rows keep the structure order otherwise, circular references are broken where
+		they are first reached'''
+	rows_by_abbr = {}
+	for row in rows:
+		if row.abbr:
+			rows_by_abbr.setdefault(row.abbr, []).append(row)
+
+	ordered, visited = [], set()
+	def visit(row, path):
+		if row.position in visited or row.position in path:
+			return
+
+		path.add(row.position)
+		for name in sorted(row.names, key=lambda n: rows_by_abbr[n][0].position if n in rows_by_abbr else 0):
+			for dependency in rows_by_abbr.get(name, []):
+				visit(dependency, path)
+		path.remove(row.position)
+
+		visited.add(row.position)
+		ordered.append(row)
+
+	for row in rows:
+		visit(row, set())
+
+	return ordered
+
 @frappe.whitelist()
 def make_salary_slip(source_name, target_doc = None, employee = None, as_print = False, print_format = None):
 	def postprocess(source, target):
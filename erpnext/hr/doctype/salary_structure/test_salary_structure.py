@@ -7,7 +7,8 @@ import unittest
 import erpnext
 from frappe.utils.make_random import get_random
 from frappe.utils import nowdate, add_days, add_years, getdate, add_months
-from erpnext.hr.doctype.salary_structure.salary_structure import make_salary_slip
+from erpnext.hr.doctype.salary_structure.salary_structure import make_salary_slip, compile_formulas, \
+	eval_expression
 from erpnext.hr.doctype.salary_slip.test_salary_slip \
 	import make_earning_salary_component, make_deduction_salary_component
 
@@ -63,6 +64,47 @@ class TestSalaryStructure(unittest.TestCase):
 		for row in salary_structure.deductions:
 			self.assertFalse(("\n" in row.formula) or ("\n" in row.condition))
 
+	def test_compiled_formula_evaluation_order(self):
+		salary_structure = frappe._dict({
+			"name": "_Test Compiled Formulas",
+			"earnings": [
+				frappe._dict(abbr="HRA", amount_based_on_formula=1, formula="BS * .2"),
+				frappe._dict(abbr="BS", amount_based_on_formula=1, formula="base * .5"),
+				frappe._dict(abbr="SA", amount=300, condition="BS > 1000")
+			],
+			"deductions": [
+				frappe._dict(abbr="PT", amount_based_on_formula=1, formula="(BS + HRA) * .1")
+			]
+		})
+
+		compiled = compile_formulas(salary_structure)
+		self.assertEqual([d.abbr for d in compiled.eval_order], ["BS", "HRA", "SA", "PT"])
+		self.assertEqual([d.abbr for d in compiled.rows], ["HRA", "BS", "SA", "PT"])
+		self.assertTrue(set(["base", "BS", "HRA"]).issubset(compiled.names))
+
+		data = frappe._dict(base=10000, BS=0, HRA=0, SA=0, PT=0)
+		for d in compiled.eval_order:
+			if d.condition and not eval_expression(d.condition, data):
+				continue
+			data[d.abbr] = eval_expression(d.formula, data) if d.formula else d.amount
+
+		self.assertEqual((data.BS, data.HRA, data.SA, data.PT), (5000, 1000, 300, 600))
+
+	def test_compiled_formula_names_in_nested_expressions(self):
+		salary_structure = frappe._dict({
+			"name": "_Test Compiled Nested Formulas",
+			"earnings": [
+				frappe._dict(abbr="TA", amount_based_on_formula=1, formula="sum(d * .1 for d in [BS, HRA])"),
+				frappe._dict(abbr="BS", amount_based_on_formula=1, formula="base * .5"),
+				frappe._dict(abbr="HRA", amount_based_on_formula=1, formula="(lambda b: b * .2)(BS)")
+			],
+			"deductions": []
+		})
+
+		compiled = compile_formulas(salary_structure)
+		self.assertTrue(set(["base", "BS", "HRA"]).issubset(compiled.names))
+		self.assertEqual([d.abbr for d in compiled.eval_order], ["BS", "HRA", "TA"])
+
 def make_employee(user):
 	if not frappe.db.get_value("User", user):
 		frappe.get_doc({
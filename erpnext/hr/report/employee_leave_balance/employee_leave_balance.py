@@ -4,8 +4,9 @@
 from __future__ import unicode_literals
 import frappe
 from frappe import _
-from erpnext.hr.doctype.leave_application.leave_application \
-	import get_leave_allocation_records, get_leave_balance_on, get_approved_leaves_for_period
+from frappe.utils import flt
+from erpnext.hr.doctype.leave_ledger_entry.leave_ledger_entry \
+	import get_leaves_taken_for_period, get_leave_balances
 
 
 def execute(filters=None):
@@ -31,30 +32,37 @@ def get_columns(leave_types):
 	
 def get_data(filters, leave_types):
 	user = frappe.session.user
-	allocation_records_based_on_to_date = get_leave_allocation_records(filters.to_date)
 
 	active_employees = frappe.get_all("Employee", 
 		filters = { "status": "Active", "company": filters.company}, 
 		fields = ["name", "employee_name", "department", "user_id"])
-	
+
+	employees = [d.name for d in active_employees]
+	if not employees:
+		return []
+
+	leaves_taken = get_leaves_taken_for_period(filters.from_date, filters.to_date, employees)
+	closing_balances = get_leave_balances(filters.to_date, employees)
+	leave_approvers = get_leave_approvers(employees)
+	is_hr_manager = "HR Manager" in frappe.get_roles(user)
+
 	data = []
 	for employee in active_employees:
-		leave_approvers = [l.leave_approver for l in frappe.db.sql("""select leave_approver from `tabEmployee Leave Approver` where parent = %s""",
-							(employee.name),as_dict=True)]
-		if (len(leave_approvers) and user in leave_approvers) or (user in ["Administrator", employee.user_id]) or ("HR Manager" in frappe.get_roles(user)):
+		if (user in leave_approvers.get(employee.name, [])) or (user in ["Administrator", employee.user_id]) or is_hr_manager:
 			row = [employee.name, employee.employee_name, employee.department]
 
 			for leave_type in leave_types:
-				# leaves taken
-				leaves_taken = get_approved_leaves_for_period(employee.name, leave_type,
-					filters.from_date, filters.to_date)
-	
-				# closing balance
-				closing = get_leave_balance_on(employee.name, leave_type, filters.to_date,
-					allocation_records_based_on_to_date.get(employee.name, frappe._dict()))
-
-				row += [leaves_taken, closing]
+				row += [flt(leaves_taken.get(employee.name, {}).get(leave_type)),
+					flt(closing_balances.get(employee.name, {}).get(leave_type))]
 			
 			data.append(row)
 		
-	return data
\ No newline at end of file
+	return data
+
+def get_leave_approvers(employees):
+	leave_approvers = {}
+	for d in frappe.db.sql("""select parent, leave_approver from `tabEmployee Leave Approver`
+		where parent in %s""", [employees], as_dict=True):
+			leave_approvers.setdefault(d.parent, []).append(d.leave_approver)
+
+	return leave_approvers
@@ -0,0 +1,10 @@
+# Copyright (c) 2018, Frappe and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+import frappe
+from erpnext.stock.doctype.batch_bin.batch_bin import rebuild_batch_bins
+
+def execute():
+	frappe.reload_doc("stock", "doctype", "batch_bin")
+	rebuild_batch_bins()
@@ -0,0 +1,12 @@
+# Copyright (c) 2018, Frappe and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+import frappe
+from erpnext.accounts.doctype.budget.budget import make_budget_expenses
+
+def execute():
+	frappe.reload_doc("accounts", "doctype", "budget_expense")
+
+	for name in frappe.db.sql_list("select name from `tabBudget` where docstatus=1"):
+		make_budget_expenses(frappe.get_doc("Budget", name))
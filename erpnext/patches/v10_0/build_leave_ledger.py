@@ -0,0 +1,10 @@
+# Copyright (c) 2018, Frappe and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+import frappe
+from erpnext.hr.doctype.leave_ledger_entry.leave_ledger_entry import rebuild_leave_ledger
+
+def execute():
+	frappe.reload_doc("hr", "doctype", "leave_ledger_entry")
+	rebuild_leave_ledger()
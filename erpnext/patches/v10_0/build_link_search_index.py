@@ -0,0 +1,10 @@
+# Copyright (c) 2018, Frappe and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+import frappe
+from erpnext.utilities.doctype.link_search_token.link_search_token import rebuild_search_index
+
+def execute():
+	frappe.reload_doc("utilities", "doctype", "link_search_token")
+	rebuild_search_index()
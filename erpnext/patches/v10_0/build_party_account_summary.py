@@ -0,0 +1,10 @@
+# Copyright (c) 2018, Frappe and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+import frappe
+from erpnext.accounts.doctype.party_account_summary.party_account_summary import rebuild_party_account_summary
+
+def execute():
+	frappe.reload_doc("accounts", "doctype", "party_account_summary")
+	rebuild_party_account_summary()
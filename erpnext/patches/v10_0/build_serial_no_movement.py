@@ -0,0 +1,10 @@
+# Copyright (c) 2018, Frappe and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+import frappe
+from erpnext.stock.doctype.serial_no_movement.serial_no_movement import rebuild_serial_no_movements
+
+def execute():
+	frappe.reload_doc("stock", "doctype", "serial_no_movement")
+	rebuild_serial_no_movements()
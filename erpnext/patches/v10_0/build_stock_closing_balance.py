@@ -0,0 +1,10 @@
+# Copyright (c) 2018, Frappe and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+import frappe
+from erpnext.stock.doctype.stock_closing_balance.stock_closing_balance import rebuild_closing_balances
+
+def execute():
+	frappe.reload_doc("stock", "doctype", "stock_closing_balance")
+	rebuild_closing_balances()
@@ -6,7 +6,9 @@ import frappe, json
 from frappe import _
 from frappe.utils import flt
 from datetime import date
+from erpnext.utilities.report_cache import cached_report
 
+@cached_report("GSTR-1", doctypes=("Sales Invoice",))
 def execute(filters=None):
 	return Gstr1Report(filters).run()
 
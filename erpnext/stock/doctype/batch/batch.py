@@ -146,21 +146,22 @@ def get_batch_qty(batch_no=None, warehouse=None, item_code=None):
 	out = 0
 	if batch_no and warehouse:
 		out = float(frappe.db.sql("""select sum(actual_qty)
-			from `tabStock Ledger Entry`
+			from `tabBatch Bin`
 			where warehouse=%s and batch_no=%s""",
 			(warehouse, batch_no))[0][0] or 0)
 
 	if batch_no and not warehouse:
 		out = frappe.db.sql('''select warehouse, sum(actual_qty) as qty
-			from `tabStock Ledger Entry`
+			from `tabBatch Bin`
 			where batch_no=%s
 			group by warehouse''', batch_no, as_dict=1)
 
 	if not batch_no and item_code and warehouse:
 		out = frappe.db.sql('''select batch_no, sum(actual_qty) as qty
-			from `tabStock Ledger Entry`
+			from `tabBatch Bin`
 			where item_code = %s and warehouse=%s
-			group by batch_no''', (item_code, warehouse), as_dict=1)
+			group by batch_no
+			order by batch_no''', (item_code, warehouse), as_dict=1)
 
 	return out
 
@@ -203,19 +204,128 @@ def split_batch(batch_no, item_code, warehouse, qty, new_batch_id=None):
 
 
 def set_batch_nos(doc, warehouse_field, throw=False):
-	"""Automatically select `batch_no` for outgoing items in item table"""
-	for d in doc.items:
-		qty = d.get('stock_qty') or d.get('transfer_qty') or d.get('qty') or 0
-		has_batch_no = frappe.db.get_value('Item', d.item_code, 'has_batch_no')
-		warehouse = d.get(warehouse_field, None)
-		if has_batch_no and warehouse and qty > 0:
-			if not d.batch_no:
-				d.batch_no = get_batch_no(d.item_code, warehouse, qty, throw)
-			else:
-				batch_qty = get_batch_qty(batch_no=d.batch_no, warehouse=warehouse)
-				if flt(batch_qty, d.precision("qty")) < flt(qty, d.precision("qty")):
-					frappe.throw(_("Row #{0}: The batch {1} has only {2} qty. Please select another batch which has {3} qty available or split the row into multiple rows, to deliver/issue from multiple batches").format(d.idx, d.batch_no, batch_qty, qty))
+	"""Automatically select `batch_no` for outgoing items in item table.
+
+	Batches of all the rows are loaded at once and allocated First Expiring First Out over the
+	whole document, so that two rows of an item do not pick the same batch. A row is split into
+	one row per batch if no single batch has its qty."""
+	item_codes = list(set(d.item_code for d in doc.items if d.item_code))
+	if not item_codes:
+		return
+
+	batch_items = frappe.db.sql_list("""select name from tabItem
+		where name in ({0}) and has_batch_no=1""".format(", ".join(["%s"] * len(item_codes))),
+		tuple(item_codes))
+
+	rows = [d for d in doc.items if d.item_code in batch_items and d.get(warehouse_field)
+		and get_row_qty(d) > 0]
+	if not rows:
+		return
+
+	batches = get_batches_for_items(set((d.item_code, d.get(warehouse_field)) for d in rows))
+	available = dict(((d.item_code, d.warehouse, d.batch_no), flt(d.qty))
+		for item_batches in batches.values() for d in item_batches)
+
+	# selected batches are validated first and are not available for the other rows
+	for d in rows:
+		if d.batch_no:
+			qty, warehouse = get_row_qty(d), d.get(warehouse_field)
+			batch_qty = sum(flt(b.qty) for b in batches.get((d.item_code, warehouse), [])
+				if b.batch_no == d.batch_no)
+
+			if flt(batch_qty, d.precision("qty")) < flt(qty, d.precision("qty")):
+				frappe.throw(_("Row #{0}: The batch {1} has only {2} qty. Please select another batch which has {3} qty available or split the row into multiple rows, to deliver/issue from multiple batches").format(d.idx, d.batch_no, batch_qty, qty))
+
+			key = (d.item_code, warehouse, d.batch_no)
+			available[key] = available.get(key, 0) - qty
+
+	split_rows = False
+	for d in rows:
+		if d.batch_no:
+			continue
+
+		qty, warehouse = get_row_qty(d), d.get(warehouse_field)
+		fefo_batches = [b for b in batches.get((d.item_code, warehouse), [])
+			if not b.expired and flt(available[(d.item_code, warehouse, b.batch_no)], d.precision("qty")) > 0]
+
+		# a single batch is preferred
+		for b in fefo_batches:
+			if flt(available[(d.item_code, warehouse, b.batch_no)], d.precision("qty")) >= flt(qty, d.precision("qty")):
+				d.batch_no = b.batch_no
+				available[(d.item_code, warehouse, b.batch_no)] -= qty
+				break
+
+		if d.batch_no:
+			continue
+
+		allocations = []
+		for b in fefo_batches:
+			allocated_qty = min(available[(d.item_code, warehouse, b.batch_no)], qty - sum(a[1] for a in allocations))
+			if flt(allocated_qty, d.precision("qty")) > 0:
+				allocations.append((b.batch_no, allocated_qty))
+
+		if not d.get("serial_no") and allocations \
+			and flt(sum(a[1] for a in allocations), d.precision("qty")) >= flt(qty, d.precision("qty")):
+				for batch_no, allocated_qty in allocations:
+					available[(d.item_code, warehouse, batch_no)] -= allocated_qty
+				split_row_by_batches(doc, d, allocations)
+				split_rows = True
+		else:
+			frappe.msgprint(_('Please select a Batch for Item {0}. Unable to find a single batch that fulfills this requirement').format(frappe.bold(d.item_code)))
+			if throw:
+				raise UnableToSelectBatchError
+
+	if split_rows:
+		for i, d in enumerate(doc.items):
+			d.idx = i + 1
+
+		if hasattr(doc, "calculate_taxes_and_totals"):
+			doc.calculate_taxes_and_totals()
+
+def get_row_qty(d):
+	return d.get('stock_qty') or d.get('transfer_qty') or d.get('qty') or 0
+
+def split_row_by_batches(doc, d, allocations):
+	"""Sets the first batch on the row and adds a copy of the row below it for every other batch"""
+	conversion_factor = flt(d.get("conversion_factor")) or 1.0
+	position = doc.items.index(d)
+
+	for i, (batch_no, qty) in enumerate(allocations):
+		row = d
+		if i:
+			row = doc.append("items", dict((key, value) for key, value in d.as_dict().items()
+				if key not in ("name", "idx")))
+			doc.items.remove(row)
+			doc.items.insert(position + i, row)
+
+		row.batch_no = batch_no
+		row.qty = flt(qty / conversion_factor, row.precision("qty"))
+		for fieldname in ("stock_qty", "transfer_qty"):
+			if row.meta.get_field(fieldname):
+				row.set(fieldname, qty)
+
+	frappe.msgprint(_("Row #{0}: Item {1} is issued from batches {2}").format(d.idx,
+		frappe.bold(d.item_code), ", ".join(a[0] for a in allocations)))
+
+def get_batches_for_items(item_warehouses):
+	"""Returns {(item_code, warehouse): [batches]} of all the batches having stock, in the
+		order of expiry date, with one query for all the items of a document"""
+	item_warehouses = list(item_warehouses)
+	batches = {}
+	if not item_warehouses:
+		return batches
+
+	for d in frappe.db.sql("""select bb.item_code, bb.warehouse, bb.batch_no, bb.actual_qty as qty,
+			(b.expiry_date is not null and b.expiry_date < curdate()) as expired
+		from `tabBatch Bin` bb, `tabBatch` b
+		where b.batch_id = bb.batch_no and bb.actual_qty > 0
+			and ({0})
+		order by b.expiry_date, b.creation""".format(
+			" or ".join(["(bb.item_code=%s and bb.warehouse=%s)"] * len(item_warehouses))),
+		tuple([value for d in item_warehouses for value in d]), as_dict=1):
+			batches.setdefault((d.item_code, d.warehouse), []).append(d)
 
+	return batches
 
 
 @frappe.whitelist()
@@ -246,11 +356,10 @@ def get_batch_no(item_code, warehouse, qty=1, throw=False):
 
 def get_batches(item_code, warehouse, qty=1, throw=False):
 	batches = frappe.db.sql(
-		'select batch_id, sum(actual_qty) as qty from `tabBatch` join `tabStock Ledger Entry` '
-		'on `tabBatch`.batch_id = `tabStock Ledger Entry`.batch_no '
-		'where `tabStock Ledger Entry`.item_code = %s and  `tabStock Ledger Entry`.warehouse = %s '
-		'and (`tabBatch`.expiry_date >= CURDATE() or `tabBatch`.expiry_date IS NULL)'
-		'group by batch_id '
+		'select batch_id, `tabBatch Bin`.actual_qty as qty from `tabBatch` join `tabBatch Bin` '
+		'on `tabBatch`.batch_id = `tabBatch Bin`.batch_no '
+		'where `tabBatch Bin`.item_code = %s and  `tabBatch Bin`.warehouse = %s '
+		'and (`tabBatch`.expiry_date >= CURDATE() or `tabBatch`.expiry_date IS NULL) '
 		'order by `tabBatch`.expiry_date ASC, `tabBatch`.creation ASC',
 		(item_code, warehouse),
 		as_dict=True
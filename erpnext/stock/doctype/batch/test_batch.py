@@ -165,6 +165,31 @@ class TestBatch(unittest.TestCase):
 
 		self.assertEqual(get_batch_qty('batch a', '_Test Warehouse - _TC'), 90)
 
+	def test_delivery_note_from_multiple_batches(self):
+		'''Test splitting of a row when no single batch has the qty'''
+		self.make_batch_item('ITEM-BATCH-3')
+		self.make_new_batch_and_entry('ITEM-BATCH-3', 'batch c', '_Test Warehouse - _TC')
+		self.make_new_batch_and_entry('ITEM-BATCH-3', 'batch d', '_Test Warehouse - _TC')
+
+		qty = get_batch_qty('batch c', '_Test Warehouse - _TC')
+		delivery_note = frappe.get_doc(dict(
+			doctype = 'Delivery Note',
+			customer = '_Test Customer',
+			company = '_Test Company',
+			items = [
+				dict(
+					item_code = 'ITEM-BATCH-3',
+					qty = qty + 10,
+					rate = 10,
+					warehouse = '_Test Warehouse - _TC'
+				)
+			]
+		)).insert()
+
+		self.assertEqual([(d.batch_no, d.qty) for d in delivery_note.items],
+			[('batch c', qty), ('batch d', 10)])
+		self.assertEqual(delivery_note.net_total, (qty + 10) * 10)
+
 	@classmethod
 	def make_new_batch_and_entry(cls, item_name, batch_name, warehouse):
 		'''Make a new stock entry for given target warehouse and batch name of item'''
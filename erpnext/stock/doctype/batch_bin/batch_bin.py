@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe.utils import flt
+from frappe.model.document import Document
+from erpnext.utilities.raw_insert import add_to_row
+
+class BatchBin(Document):
+	pass
+
+def on_doctype_update():
+	# one row per item, warehouse and batch, also serves the lookups by item and warehouse
+	frappe.db.add_unique("Batch Bin", ["item_code", "warehouse", "batch_no"])
+	frappe.db.add_index("Batch Bin", ["batch_no", "warehouse"])
+
+def update_batch_bin(args):
+	'''Adds the qty of a Stock Ledger Entry to the balance of its item, warehouse and batch,
+		called along with `update_bin`'''
+	if not (args.get("batch_no") and flt(args.get("actual_qty"))):
+		return
+
+	add_to_row("Batch Bin", {"item_code": args.get("item_code"), "warehouse": args.get("warehouse"),
+		"batch_no": args.get("batch_no")}, {"actual_qty": flt(args.get("actual_qty"))})
+
+def rebuild_batch_bins():
+	'''Rebuilds the batch balances from the Stock Ledger Entries'''
+	frappe.db.sql("delete from `tabBatch Bin`")
+	for d in frappe.db.sql("""select item_code, warehouse, batch_no, sum(actual_qty) as actual_qty
+		from `tabStock Ledger Entry` where ifnull(batch_no, '') != ''
+		group by item_code, warehouse, batch_no""", as_dict=1):
+			batch_bin = frappe.get_doc(dict(d, doctype="Batch Bin"))
+			batch_bin.flags.ignore_permissions = 1
+			batch_bin.db_insert()
@@ -4,10 +4,14 @@
 from __future__ import unicode_literals
 import frappe
 
-from frappe.utils import cint, cstr, flt, add_days, nowdate, getdate
+from frappe.utils import cint, cstr, flt, add_days, nowdate, getdate, now
 from frappe import _, ValidationError
 
 from erpnext.controllers.stock_controller import StockController
+from erpnext.utilities.naming import get_names_from_series
+from erpnext.utilities.raw_insert import bulk_insert
+from erpnext.stock.doctype.serial_no_movement.serial_no_movement import make_serial_no_movements, \
+	get_serial_no_ledger_entries
 
 class SerialNoCannotCreateDirectError(ValidationError): pass
 class SerialNoCannotCannotChangeError(ValidationError): pass
@@ -84,7 +88,7 @@ class SerialNo(StockController):
 			if purchase_sle.voucher_type == "Purchase Receipt":
 				self.supplier, self.supplier_name = \
 					frappe.db.get_value("Purchase Receipt", purchase_sle.voucher_no,
-						["supplier", "supplier_name"])
+						["supplier", "supplier_name"], cache=True)
 
 			# If sales return entry
 			if self.purchase_document_type == 'Delivery Note':
@@ -103,7 +107,7 @@ class SerialNo(StockController):
 			if delivery_sle.voucher_type  in ("Delivery Note", "Sales Invoice"):
 				self.customer, self.customer_name = \
 					frappe.db.get_value(delivery_sle.voucher_type, delivery_sle.voucher_no,
-						["customer", "customer_name"])
+						["customer", "customer_name"], cache=True)
 			if self.warranty_period:
 				self.warranty_expiry_date	= add_days(cstr(delivery_sle.posting_date),
 					cint(self.warranty_period))
@@ -113,9 +117,10 @@ class SerialNo(StockController):
 				"warranty_expiry_date"):
 					self.set(fieldname, None)
 
-	def get_last_sle(self):
+	def get_last_sle(self, sle_dict=None):
 		entries = {}
-		sle_dict = self.get_stock_ledger_entries()
+		if sle_dict is None:
+			sle_dict = self.get_stock_ledger_entries()
 		if sle_dict:
 			if sle_dict.get("incoming", []):
 				entries["purchase_sle"] = sle_dict["incoming"][0]
@@ -129,30 +134,13 @@ class SerialNo(StockController):
 		return entries
 
 	def get_stock_ledger_entries(self):
-		sle_dict = {}
-		for sle in frappe.db.sql("""select * from `tabStock Ledger Entry`
-			where serial_no like %s and item_code=%s and ifnull(is_cancelled, 'No')='No'
-			order by posting_date desc, posting_time desc, name desc""",
-			("%%%s%%" % self.name, self.item_code), as_dict=1):
-				if self.name.upper() in get_serial_nos(sle.serial_no):
-					if sle.actual_qty > 0:
-						sle_dict.setdefault("incoming", []).append(sle)
-					else:
-						sle_dict.setdefault("outgoing", []).append(sle)
-
-		return sle_dict
+		return get_serial_no_ledger_entries([self.name], self.item_code).get(self.name.upper(), {})
 
 	def on_trash(self):
-		sl_entries = frappe.db.sql("""select serial_no from `tabStock Ledger Entry`
-			where serial_no like %s and item_code=%s and ifnull(is_cancelled, 'No')='No'""",
-			("%%%s%%" % self.name, self.item_code), as_dict=True)
-
-		# Find the exact match
-		sle_exists = False
-		for d in sl_entries:
-			if self.name.upper() in get_serial_nos(d.serial_no):
-				sle_exists = True
-				break
+		sle_exists = frappe.db.sql("""select m.name
+			from `tabSerial No Movement` m, `tabStock Ledger Entry` sle
+			where m.serial_no=%s and m.stock_ledger_entry = sle.name and sle.item_code=%s
+				and ifnull(sle.is_cancelled, 'No')='No' limit 1""", (self.name, self.item_code))
 
 		if sle_exists:
 			frappe.throw(_("Cannot delete Serial No {0}, as it is used in stock transactions").format(self.name))
@@ -204,9 +192,14 @@ def validate_serial_no(sle, item_det):
 			if len(serial_nos) != len(set(serial_nos)):
 				frappe.throw(_("Duplicate Serial No entered for Item {0}").format(sle.item_code), SerialNoDuplicateError)
 
+			serial_no_details = dict((d.name.upper(), d) for d in frappe.db.sql("""select name, item_code,
+					warehouse, purchase_document_no, delivery_document_type
+				from `tabSerial No` where name in ({0})""".format(", ".join(["%s"] * len(serial_nos))),
+				tuple(serial_nos), as_dict=1))
+
 			for serial_no in serial_nos:
-				if frappe.db.exists("Serial No", serial_no):
-					sr = frappe.get_doc("Serial No", serial_no)
+				if serial_no in serial_no_details:
+					sr = serial_no_details[serial_no]
 
 					if sr.item_code!=sle.item_code:
 						if not allow_serial_nos_with_different_item(serial_no, sle):
@@ -270,24 +263,64 @@ def allow_serial_nos_with_different_item(sle_serial_no, sle):
 def update_serial_nos(sle, item_det):
 	if sle.is_cancelled == "No" and not sle.serial_no and sle.actual_qty > 0 \
 			and item_det.has_serial_no == 1 and item_det.serial_no_series:
-		from frappe.model.naming import make_autoname
-		serial_nos = []
-		for i in range(cint(sle.actual_qty)):
-			serial_nos.append(make_autoname(item_det.serial_no_series, "Serial No"))
+		serial_nos = get_names_from_series(item_det.serial_no_series, cint(sle.actual_qty))
 		frappe.db.set(sle, "serial_no", "\n".join(serial_nos))
 		validate_serial_no(sle, item_det)
 
 	if sle.serial_no:
+		# movements first, the serial no details are set from them
+		make_serial_no_movements(sle)
+
 		serial_nos = get_serial_nos(sle.serial_no)
-		for serial_no in serial_nos:
-			if frappe.db.exists("Serial No", serial_no):
-				sr = frappe.get_doc("Serial No", serial_no)
-				sr.via_stock_ledger = True
-				sr.item_code = sle.item_code
-				sr.warehouse = sle.warehouse if sle.actual_qty > 0 else None
-				sr.save(ignore_permissions=True)
-			elif sle.actual_qty > 0:
-				make_serial_no(serial_no, sle)
+		existing_serial_nos = dict((name.upper(), name) for name in frappe.db.sql_list("""select name
+			from `tabSerial No` where name in ({0})""".format(", ".join(["%s"] * len(serial_nos))),
+			tuple(serial_nos)))
+
+		if sle.actual_qty > 0:
+			make_serial_nos([serial_no for serial_no in serial_nos
+				if serial_no not in existing_serial_nos], sle)
+
+		update_serial_no_details(list(existing_serial_nos.values()), sle.item_code,
+			sle.warehouse if sle.actual_qty > 0 else None)
+
+def update_serial_no_details(serial_nos, item_code, warehouse):
+	"""Sets item, warehouse, purchase and delivery details and maintenance status of the serial nos
+		as on saving them via the stock ledger, with one update for all serial nos having the same values"""
+	if not serial_nos:
+		return
+
+	item = frappe.db.get_value("Item", item_code, ["has_serial_no", "item_group", "description",
+		"item_name", "brand", "warranty_period"], as_dict=1)
+	if item.has_serial_no!=1:
+		frappe.throw(_("Item {0} is not setup for Serial Nos. Check Item master").format(item_code))
+
+	fields = ("item_code", "warehouse", "item_group", "description", "item_name", "brand", "warranty_period",
+		"purchase_document_type", "purchase_document_no", "purchase_date", "purchase_time", "purchase_rate",
+		"supplier", "supplier_name", "sales_invoice", "delivery_document_type", "delivery_document_no",
+		"delivery_date", "delivery_time", "customer", "customer_name", "warranty_expiry_date",
+		"amc_expiry_date", "maintenance_status")
+
+	sle_dict = get_serial_no_ledger_entries(serial_nos, item_code)
+
+	updates = {}
+	for d in frappe.db.sql("""select name, sales_invoice, warranty_expiry_date, amc_expiry_date
+		from `tabSerial No` where name in ({0})""".format(", ".join(["%s"] * len(serial_nos))),
+		tuple(serial_nos), as_dict=1):
+			sr = frappe.get_doc(dict(d, doctype="Serial No", item_code=item_code, warehouse=warehouse,
+				item_group=item.item_group, description=item.description, item_name=item.item_name,
+				brand=item.brand, warranty_period=item.warranty_period))
+
+			last_sle = sr.get_last_sle(sle_dict.get(d.name.upper(), {}))
+			sr.set_purchase_details(last_sle.get("purchase_sle"))
+			sr.set_sales_details(last_sle.get("delivery_sle"))
+			sr.set_maintenance_status()
+
+			updates.setdefault(tuple(sr.get(fieldname) for fieldname in fields), []).append(d.name)
+
+	for values, names in updates.items():
+		frappe.db.sql("""update `tabSerial No` set {0}, modified=%s, modified_by=%s
+			where name in ({1})""".format(", ".join("{0}=%s".format(f) for f in fields),
+			", ".join(["%s"] * len(names))), values + (now(), frappe.session.user) + tuple(names))
 
 def get_item_details(item_code):
 	return frappe.db.sql("""select name, has_batch_no, docstatus,
@@ -298,22 +331,48 @@ def get_serial_nos(serial_no):
 	return [s.strip() for s in cstr(serial_no).strip().upper().replace(',', '\n').split('\n')
 		if s.strip()]
 
-def make_serial_no(serial_no, sle):
+def make_serial_nos(serial_nos, sle):
+	"""Creates the new serial nos received by the Stock Ledger Entry with multi-row inserts.
+		The values are the same for all the serial nos, so they are set once on a template
+		as on saving a Serial No via the stock ledger."""
+	if not serial_nos:
+		return
+
+	item = frappe.db.get_value("Item", sle.item_code, ["has_serial_no", "item_group", "description",
+		"item_name", "brand", "warranty_period"], as_dict=1)
+	if item.has_serial_no!=1:
+		frappe.throw(_("Item {0} is not setup for Serial Nos. Check Item master").format(sle.item_code))
+
 	sr = frappe.new_doc("Serial No")
-	sr.warehouse = None
-	sr.dont_update_if_missing.append("warehouse")
-	sr.flags.ignore_permissions = True
+	sr.update({
+		"item_code": sle.item_code,
+		"warehouse": sle.warehouse,
+		"company": sle.company,
+		"item_group": item.item_group,
+		"description": item.description,
+		"item_name": item.item_name,
+		"brand": item.brand,
+		"warranty_period": item.warranty_period
+	})
+
+	# the receiving entry is the only entry of a new serial no
+	sr.set_purchase_details(sle)
+	sr.set_sales_details(None)
+	sr.set_maintenance_status()
+
+	fields = ("item_code", "warehouse", "company", "item_group", "description", "item_name", "brand",
+		"warranty_period", "purchase_document_type", "purchase_document_no", "purchase_date",
+		"purchase_time", "purchase_rate", "supplier", "supplier_name", "maintenance_status")
+	values = tuple(sr.get(fieldname) for fieldname in fields)
 
-	sr.serial_no = serial_no
-	sr.item_code = sle.item_code
-	sr.company = sle.company
-	sr.via_stock_ledger = True
-	sr.insert()
+	bulk_insert("Serial No", ("name", "serial_no") + fields,
+		[(serial_no, serial_no) + values for serial_no in serial_nos])
 
-	sr.warehouse = sle.warehouse
-	sr.save()
-	frappe.msgprint(_("Serial No {0} created").format(sr.name))
-	return sr.name
+	if len(serial_nos) == 1:
+		frappe.msgprint(_("Serial No {0} created").format(serial_nos[0]))
+	else:
+		frappe.msgprint(_("{0} Serial Nos created, from {1} to {2}").format(len(serial_nos),
+			serial_nos[0], serial_nos[-1]))
 
 def update_serial_nos_after_submit(controller, parentfield):
 	stock_ledger_entries = frappe.db.sql("""select voucher_detail_no, serial_no, actual_qty, warehouse
@@ -351,13 +410,21 @@ def update_serial_nos_after_submit(controller, parentfield):
 							break
 
 def update_maintenance_status():
-	serial_nos = frappe.db.sql('''select name from `tabSerial No` where (amc_expiry_date<%s or
-		warranty_expiry_date<%s) and maintenance_status not in ('Out of Warranty', 'Out of AMC')''',
-		(nowdate(), nowdate()))
-	for serial_no in serial_nos:
-		doc = frappe.get_doc("Serial No", serial_no[0])
-		doc.set_maintenance_status()
-		frappe.db.set_value('Serial No', doc.name, 'maintenance_status', doc.maintenance_status)
+	'''Daily job, sets the maintenance status of the Serial Nos whose warranty or AMC has expired
+		in a single update (same rules as `set_maintenance_status`), only rows whose status
+		changes are written'''
+	status = """case
+			when warranty_expiry_date >= %(today)s then 'Under Warranty'
+			when amc_expiry_date >= %(today)s then 'Under AMC'
+			when amc_expiry_date < %(today)s then 'Out of AMC'
+			else 'Out of Warranty'
+		end"""
+
+	frappe.db.sql("""update `tabSerial No`
+		set maintenance_status = {status}, modified = %(now)s
+		where (amc_expiry_date < %(today)s or warranty_expiry_date < %(today)s)
+			and ifnull(maintenance_status, '') != {status}""".format(status=status),
+		{"today": nowdate(), "now": now()})
 
 def get_delivery_note_serial_no(item_code, qty, delivery_note):
 	serial_nos = ''
@@ -29,3 +29,70 @@ class TestSerialNo(unittest.TestCase):
 
 		sr.warehouse = "_Test Warehouse - _TC"
 		self.assertTrue(SerialNoCannotCannotChangeError, sr.save)
+
+	def test_serial_no_movements(self):
+		from erpnext.stock.doctype.stock_entry.test_stock_entry import make_serialized_item
+		from erpnext.stock.doctype.stock_entry.stock_entry_utils import make_stock_entry
+
+		se = make_serialized_item()
+		serial_nos = get_serial_nos(se.get("items")[0].serial_no)
+
+		self.assertEqual(frappe.db.sql("""select serial_no, direction, warehouse from `tabSerial No Movement`
+			where voucher_type='Stock Entry' and voucher_no=%s order by serial_no""", se.name),
+			tuple((serial_no, "Inward", "_Test Warehouse - _TC") for serial_no in sorted(serial_nos)))
+
+		transfer = make_stock_entry(item_code="_Test Serialized Item With Series", qty=2,
+			serial_no="\n".join(serial_nos), source="_Test Warehouse - _TC", target="_Test Warehouse 1 - _TC")
+
+		for serial_no in serial_nos:
+			sr = frappe.get_doc("Serial No", serial_no)
+			self.assertEqual(sr.warehouse, "_Test Warehouse 1 - _TC")
+			self.assertEqual(sr.purchase_document_no, transfer.name)
+			self.assertEqual(len(sr.get_stock_ledger_entries().get("incoming")), 2)
+
+		transfer.cancel()
+		self.assertFalse(frappe.db.get_value("Serial No Movement", {"voucher_no": transfer.name}))
+		for serial_no in serial_nos:
+			sr = frappe.get_doc("Serial No", serial_no)
+			self.assertEqual(sr.warehouse, "_Test Warehouse - _TC")
+			self.assertEqual(sr.purchase_document_no, se.name)
+
+	def test_bulk_serial_nos_from_series(self):
+		from erpnext.stock.doctype.stock_entry.test_stock_entry import make_serialized_item
+
+		serial_no_series = frappe.db.get_value("Item", "_Test Serialized Item With Series", "serial_no_series")
+		serial_nos = get_names_from_series(serial_no_series, 3)
+		self.assertEqual(len(set(serial_nos)), 3)
+		self.assertNotIn(serial_nos[-1], get_names_from_series(serial_no_series, 1))
+		self.assertRaises(frappe.ValidationError, get_names_from_series, "SN#####", 1)
+
+		se = make_serialized_item()
+		for serial_no in get_serial_nos(se.get("items")[0].serial_no):
+			sr = frappe.get_doc("Serial No", serial_no)
+			self.assertEqual(sr.item_code, "_Test Serialized Item With Series")
+			self.assertEqual(sr.warehouse, se.get("items")[0].t_warehouse)
+			self.assertEqual(sr.company, se.company)
+			self.assertEqual(sr.purchase_document_no, se.name)
+
+	def test_update_maintenance_status(self):
+		statuses = {
+			"_TCSER0002": (add_days(nowdate(), -1), None, "Out of Warranty"),
+			"_TCSER0003": (add_days(nowdate(), -10), add_days(nowdate(), -1), "Out of AMC"),
+			"_TCSER0004": (add_days(nowdate(), -1), add_days(nowdate(), 30), "Under AMC")
+		}
+
+		for serial_no, (warranty_expiry_date, amc_expiry_date, status) in statuses.items():
+			frappe.delete_doc_if_exists("Serial No", serial_no)
+			sr = frappe.new_doc("Serial No")
+			sr.item_code = "_Test Serialized Item"
+			sr.serial_no = serial_no
+			sr.insert()
+
+			frappe.db.sql("""update `tabSerial No` set warranty_expiry_date=%s, amc_expiry_date=%s,
+				maintenance_status='Under Warranty' where name=%s""",
+				(warranty_expiry_date, amc_expiry_date, serial_no))
+
+		update_maintenance_status()
+
+		for serial_no, (warranty_expiry_date, amc_expiry_date, status) in statuses.items():
+			self.assertEqual(frappe.db.get_value("Serial No", serial_no, "maintenance_status"), status)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe.utils import flt
+from frappe.model.document import Document
+from erpnext.utilities.raw_insert import bulk_insert
+
+class SerialNoMovement(Document):
+	pass
+
+def on_doctype_update():
+	frappe.db.add_index("Serial No Movement", ["voucher_type", "voucher_no"])
+
+def make_serial_no_movements(sle):
+	'''Posts a movement row for every serial no of a submitted Stock Ledger Entry'''
+	from erpnext.stock.doctype.serial_no.serial_no import get_serial_nos
+
+	if sle.get("is_cancelled") == "Yes" or not sle.serial_no:
+		return
+
+	direction = "Inward" if flt(sle.actual_qty) > 0 else "Outward"
+
+	fields = ("name", "serial_no", "item_code", "warehouse", "direction", "stock_ledger_entry",
+		"voucher_type", "voucher_no", "posting_date", "posting_time")
+
+	# a voucher can move thousands of serial nos
+	bulk_insert("Serial No Movement", fields, [(frappe.generate_hash("", 10),
+		serial_no, sle.item_code, sle.warehouse, direction, sle.name,
+		sle.voucher_type, sle.voucher_no, sle.posting_date, sle.posting_time)
+		for serial_no in get_serial_nos(sle.serial_no)])
+
+def delete_serial_no_movements(voucher_type, voucher_no):
+	frappe.db.sql("""delete from `tabSerial No Movement`
+		where voucher_type=%s and voucher_no=%s""", (voucher_type, voucher_no))
+
+def get_serial_no_ledger_entries(serial_nos, item_code=None):
+	'''Returns {serial no: {"incoming": [sle], "outgoing": [sle]}}, latest first'''
+	serial_nos = list(serial_nos)
+	if not serial_nos:
+		return {}
+
+	condition = " and sle.item_code=%s" if item_code else ""
+	values = serial_nos + ([item_code] if item_code else [])
+
+	sle_dict = {}
+	for sle in frappe.db.sql("""select m.serial_no as movement_serial_no, sle.*
+		from `tabSerial No Movement` m, `tabStock Ledger Entry` sle
+		where m.serial_no in ({0}) and m.stock_ledger_entry = sle.name
+			and ifnull(sle.is_cancelled, 'No')='No' {1}
+		order by sle.posting_date desc, sle.posting_time desc, sle.name desc"""
+		.format(", ".join(["%s"] * len(serial_nos)), condition), tuple(values), as_dict=1):
+			sle_dict.setdefault(sle.movement_serial_no.upper(), {})\
+				.setdefault("incoming" if sle.actual_qty > 0 else "outgoing", []).append(sle)
+
+	return sle_dict
+
+def rebuild_serial_no_movements():
+	'''Rebuilds the movements from the serial nos of all the Stock Ledger Entries'''
+	frappe.db.sql("delete from `tabSerial No Movement`")
+	for sle in frappe.db.sql("""select name, item_code, warehouse, actual_qty, serial_no, is_cancelled,
+			voucher_type, voucher_no, posting_date, posting_time
+		from `tabStock Ledger Entry` where ifnull(serial_no, '') != ''""", as_dict=1):
+			make_serial_no_movements(sle)
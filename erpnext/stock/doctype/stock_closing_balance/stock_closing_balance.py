@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe.utils import flt, get_first_day, getdate
+from frappe.model.document import Document
+
+class StockClosingBalance(Document):
+	pass
+
+def on_doctype_update():
+	frappe.db.add_index("Stock Closing Balance", ["item_code", "warehouse", "month_start_date"])
+
+def update_closing_balances(item_code, warehouse, company, previous_sle, entries):
+	'''Rewrites the month end balances of the item and warehouse from the month of `previous_sle`
+		onwards. `entries` are all the stock ledger entries after `previous_sle`, in posting order,
+		as reposted by `update_entries_after`'''
+	closing_balances = {}
+	for sle in ([previous_sle] if previous_sle else []) + list(entries):
+		closing_balances[get_first_day(sle.posting_date)] = sle
+
+	condition = ""
+	if previous_sle:
+		condition = " and month_start_date >= %(month_start_date)s"
+
+	frappe.db.sql("""delete from `tabStock Closing Balance`
+		where item_code=%(item_code)s and warehouse=%(warehouse)s {0}""".format(condition), {
+			"item_code": item_code,
+			"warehouse": warehouse,
+			"month_start_date": get_first_day(previous_sle.posting_date) if previous_sle else None
+		})
+
+	for month_start_date, sle in closing_balances.items():
+		frappe.get_doc({
+			"doctype": "Stock Closing Balance",
+			"item_code": item_code,
+			"warehouse": warehouse,
+			"company": company,
+			"month_start_date": month_start_date,
+			"qty_after_transaction": flt(sle.qty_after_transaction),
+			"valuation_rate": flt(sle.valuation_rate),
+			"stock_value": flt(sle.stock_value)
+		}).db_insert()
+
+def get_stock_balances(posting_date, conditions="", values=None):
+	'''Returns {(company, item_code, warehouse): balance} at the start of the posting date.
+
+		Balances are taken from the closing balance of the previous months and carried forward with
+		the stock ledger entries of the month before the posting date, so only those are scanned.
+		`conditions` are applied to both tables and may refer to them as `sle`.'''
+	values = dict(values or {})
+	values.update({
+		"posting_date": getdate(posting_date),
+		"month_start_date": get_first_day(posting_date)
+	})
+
+	balances = {}
+	for d in frappe.db.sql("""
+		select sle.company, sle.item_code, sle.warehouse,
+			sle.qty_after_transaction, sle.valuation_rate, sle.stock_value
+		from `tabStock Closing Balance` sle, (
+			select item_code, warehouse, max(month_start_date) as month_start_date
+			from `tabStock Closing Balance` sle
+			where month_start_date < %(month_start_date)s {conditions}
+			group by item_code, warehouse
+		) last_closing
+		where sle.item_code = last_closing.item_code and sle.warehouse = last_closing.warehouse
+			and sle.month_start_date = last_closing.month_start_date""".format(conditions=conditions),
+		values, as_dict=1):
+			balances[(d.company, d.item_code, d.warehouse)] = d
+
+	for d in frappe.db.sql("""
+		select sle.company, sle.item_code, sle.warehouse,
+			sle.qty_after_transaction, sle.valuation_rate, sle.stock_value
+		from `tabStock Ledger Entry` sle
+		where sle.posting_date >= %(month_start_date)s and sle.posting_date < %(posting_date)s
+			and ifnull(sle.is_cancelled, 'No') = 'No' {conditions}
+		order by sle.posting_date, sle.posting_time, sle.name""".format(conditions=conditions),
+		values, as_dict=1):
+			balances[(d.company, d.item_code, d.warehouse)] = d
+
+	return balances
+
+def rebuild_closing_balances():
+	'''Rebuilds the closing balances of all items and warehouses from the stock ledger'''
+	frappe.db.sql("delete from `tabStock Closing Balance`")
+	for item_code, warehouse, company in frappe.db.sql("""select distinct item_code, warehouse, company
+		from `tabStock Ledger Entry` where ifnull(is_cancelled, 'No') = 'No'"""):
+			update_closing_balances(item_code, warehouse, company, None, frappe.db.sql("""
+				select posting_date, qty_after_transaction, valuation_rate, stock_value
+				from `tabStock Ledger Entry`
+				where item_code=%s and warehouse=%s and ifnull(is_cancelled, 'No') = 'No'
+				order by posting_date, posting_time, name""", (item_code, warehouse), as_dict=1))
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from erpnext.stock.doctype.item.test_item import create_item
+from erpnext.stock.doctype.stock_entry.stock_entry_utils import make_stock_entry
+from erpnext.stock.doctype.stock_closing_balance.stock_closing_balance import get_stock_balances, \
+	rebuild_closing_balances
+
+class TestStockClosingBalance(unittest.TestCase):
+	def test_closing_balance_on_backdated_entry(self):
+		item_code = "_Test Item For Closing Balance"
+		warehouse = "_Test Warehouse - _TC"
+		create_item(item_code)
+		frappe.db.sql("delete from `tabStock Ledger Entry` where item_code=%s", item_code)
+		frappe.db.sql("delete from `tabStock Closing Balance` where item_code=%s", item_code)
+
+		make_stock_entry(item_code=item_code, target=warehouse, qty=10, basic_rate=10,
+			posting_date="2017-01-10", posting_time="10:00")
+		make_stock_entry(item_code=item_code, source=warehouse, qty=4,
+			posting_date="2017-03-10", posting_time="10:00")
+
+		# backdated receipt reposts the closing balance of the later months
+		se = make_stock_entry(item_code=item_code, target=warehouse, qty=5, basic_rate=10,
+			posting_date="2017-02-10", posting_time="10:00")
+
+		closing_qty = dict(frappe.db.sql("""select month_start_date, qty_after_transaction
+			from `tabStock Closing Balance` where item_code=%s and warehouse=%s""", (item_code, warehouse)))
+		self.assertEqual([closing_qty.get(frappe.utils.getdate(d)) for d in
+			("2017-01-01", "2017-02-01", "2017-03-01")], [10, 15, 11])
+
+		balances = get_stock_balances("2017-03-15", " and sle.item_code=%(item_code)s",
+			{"item_code": item_code})
+		self.assertEqual(balances[("_Test Company", item_code, warehouse)].qty_after_transaction, 11)
+
+		se.cancel()
+		self.assertEqual(frappe.db.get_value("Stock Closing Balance", {"item_code": item_code,
+			"month_start_date": "2017-02-01"}), None)
+		self.assertEqual(frappe.db.get_value("Stock Closing Balance", {"item_code": item_code,
+			"month_start_date": "2017-03-01"}, "qty_after_transaction"), 6)
+
+		rebuild_closing_balances()
+		self.assertEqual(get_stock_balances("2017-04-01", " and sle.item_code=%(item_code)s",
+			{"item_code": item_code})[("_Test Company", item_code, warehouse)].qty_after_transaction, 6)
@@ -34,6 +34,9 @@ class StockLedgerEntry(Document):
 		if not self.get("via_landed_cost_voucher"):
 			from erpnext.stock.doctype.serial_no.serial_no import process_serial_no
 			process_serial_no(self)
+		else:
+			from erpnext.stock.doctype.serial_no_movement.serial_no_movement import make_serial_no_movements
+			make_serial_no_movements(self)
 
 	#check for item quantity available in stock
 	def actual_amt_check(self):
@@ -6,7 +6,7 @@ import frappe, erpnext
 import frappe.defaults
 from frappe import msgprint, _
 from frappe.utils import cstr, flt, cint
-from erpnext.stock.stock_ledger import update_entries_after
+from erpnext.stock.stock_ledger import update_entries_after, delete_cancelled_entry
 from erpnext.controllers.stock_controller import StockController
 from erpnext.stock.utils import get_stock_balance
 
@@ -213,8 +213,7 @@ class StockReconciliation(StockController):
 			(self.doctype, self.name), as_dict=1)
 
 		# delete entries
-		frappe.db.sql("""delete from `tabStock Ledger Entry`
-			where voucher_type=%s and voucher_no=%s""", (self.doctype, self.name))
+		delete_cancelled_entry(self.doctype, self.name)
 
 		# repost future entries for selected item_code, warehouse
 		for entries in existing_entries:
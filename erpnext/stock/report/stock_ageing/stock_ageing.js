@@ -35,6 +35,12 @@ frappe.query_reports["Stock Ageing"] = {
 			"label": __("Brand"),
 			"fieldtype": "Link",
 			"options": "Brand"
+		},
+		{
+			"fieldname":"show_warehouse_wise_stock",
+			"label": __("Show Warehouse-wise Stock"),
+			"fieldtype": "Check",
+			"default": 0
 		}
 	]
 }
\ No newline at end of file
@@ -4,25 +4,29 @@
 from __future__ import unicode_literals
 import frappe
 from frappe import _
-from frappe.utils import date_diff, flt
+from frappe.utils import date_diff, flt, getdate
+from collections import deque
+
+# number of items whose stock ledger entries are loaded at a time
+ITEM_CHUNK_SIZE = 100
 
 def execute(filters=None):
 
-	columns = get_columns()
-	item_details = get_fifo_queue(filters)
+	columns = get_columns(filters)
 	to_date = filters["to_date"]
 	data = []
-	for item, item_dict in item_details.items():
-		fifo_queue = item_dict["fifo_queue"]
-		details = item_dict["details"]
+	for key, details, fifo_queue in get_fifo_queues(filters):
 		if not fifo_queue: continue
 
 		average_age = get_average_age(fifo_queue, to_date)
 		earliest_age = date_diff(to_date, fifo_queue[0][1])
 		latest_age = date_diff(to_date, fifo_queue[-1][1])
 
-		data.append([item, details.item_name, details.description, details.item_group,
-			details.brand, average_age, earliest_age, latest_age, details.stock_uom])
+		row = [details.name, details.item_name, details.description, details.item_group, details.brand]
+		if filters.get("show_warehouse_wise_stock"):
+			row.append(key[1])
+
+		data.append(row + [average_age, earliest_age, latest_age, details.stock_uom])
 
 	return columns, data
 
@@ -35,54 +39,100 @@ def get_average_age(fifo_queue, to_date):
 
 	return (age_qty / total_qty) if total_qty else 0.0
 
-def get_columns():
-	return [_("Item Code") + ":Link/Item:100", _("Item Name") + "::100", _("Description") + "::200",
-		_("Item Group") + ":Link/Item Group:100", _("Brand") + ":Link/Brand:100", _("Average Age") + ":Float:100",
-		_("Earliest") + ":Int:80", _("Latest") + ":Int:80", _("UOM") + ":Link/UOM:100"]
+def get_columns(filters=None):
+	columns = [_("Item Code") + ":Link/Item:100", _("Item Name") + "::100", _("Description") + "::200",
+		_("Item Group") + ":Link/Item Group:100", _("Brand") + ":Link/Brand:100"]
+
+	if filters and filters.get("show_warehouse_wise_stock"):
+		columns.append(_("Warehouse") + ":Link/Warehouse:100")
+
+	return columns + [_("Average Age") + ":Float:100", _("Earliest") + ":Int:80",
+		_("Latest") + ":Int:80", _("UOM") + ":Link/UOM:100"]
 
 def get_fifo_queue(filters):
 	item_details = {}
-	for d in get_stock_ledger_entries(filters):
-		item_details.setdefault(d.name, {"details": d, "fifo_queue": []})
-		fifo_queue = item_details[d.name]["fifo_queue"]
-
-		if d.voucher_type == "Stock Reconciliation":
-			d.actual_qty = flt(d.qty_after_transaction) - flt(item_details[d.name].get("qty_after_transaction", 0))
-
-		if d.actual_qty > 0:
-			fifo_queue.append([d.actual_qty, d.posting_date])
-		else:
-			qty_to_pop = abs(d.actual_qty)
-			while qty_to_pop:
-				batch = fifo_queue[0] if fifo_queue else [0, None]
-				if 0 < batch[0] <= qty_to_pop:
-					# if batch qty > 0
-					# not enough or exactly same qty in current batch, clear batch
-					qty_to_pop -= batch[0]
-					fifo_queue.pop(0)
-				else:
-					# all from current batch
-					batch[0] -= qty_to_pop
-					qty_to_pop = 0
-
-		item_details[d.name]["qty_after_transaction"] = d.qty_after_transaction
+	for key, details, fifo_queue in get_fifo_queues(filters):
+		item_details[key] = {"details": details, "fifo_queue": fifo_queue}
 
 	return item_details
 
-def get_stock_ledger_entries(filters):
+def get_fifo_queues(filters):
+	"""Replays the stock ledger one item at a time, keeping a FIFO queue of [qty, posting date]
+		per warehouse. Yields (key, item details, fifo queue) as soon as an item is done,
+		key is the item code, or (item code, warehouse) if `show_warehouse_wise_stock` is set.
+		The stock ledger entries are loaded `ITEM_CHUNK_SIZE` items at a time"""
+	item_details = get_item_details(filters)
+	item_codes = sorted(item_details)
+
+	for i in range(0, len(item_codes), ITEM_CHUNK_SIZE):
+		item_code, warehouse_queues = None, {}
+		for d in get_stock_ledger_entries(filters, item_codes[i:i + ITEM_CHUNK_SIZE]):
+			if d.item_code != item_code:
+				for row in get_item_fifo_queues(item_code, warehouse_queues, item_details, filters):
+					yield row
+				item_code, warehouse_queues = d.item_code, {}
+
+			update_fifo_queue(warehouse_queues.setdefault(d.warehouse,
+				frappe._dict({"fifo_queue": deque(), "qty_after_transaction": 0.0})), d)
+
+		for row in get_item_fifo_queues(item_code, warehouse_queues, item_details, filters):
+			yield row
+
+def get_item_fifo_queues(item_code, warehouse_queues, item_details, filters):
+	if not item_code:
+		return []
+
+	details = item_details.get(item_code)
+	if filters.get("show_warehouse_wise_stock"):
+		return [((item_code, warehouse), details, queue.fifo_queue)
+			for warehouse, queue in sorted(warehouse_queues.items())]
+
+	# merge the warehouse queues, oldest first
+	fifo_queue = sorted([batch for queue in warehouse_queues.values() for batch in queue.fifo_queue],
+		key=lambda batch: getdate(batch[1]))
+
+	return [(item_code, details, fifo_queue)]
+
+def update_fifo_queue(queue, d):
+	fifo_queue = queue.fifo_queue
+
+	if d.voucher_type == "Stock Reconciliation":
+		d.actual_qty = flt(d.qty_after_transaction) - flt(queue.qty_after_transaction)
+
+	if d.actual_qty > 0:
+		fifo_queue.append([d.actual_qty, d.posting_date])
+	else:
+		qty_to_pop = abs(d.actual_qty)
+		while qty_to_pop and fifo_queue:
+			batch = fifo_queue[0]
+			if batch[0] <= qty_to_pop:
+				# not enough or exactly same qty in current batch, clear batch
+				qty_to_pop -= batch[0]
+				fifo_queue.popleft()
+			else:
+				# all from current batch
+				batch[0] -= qty_to_pop
+				qty_to_pop = 0
+
+	queue.qty_after_transaction = d.qty_after_transaction
+
+def get_item_details(filters):
+	return dict((d.name, d) for d in frappe.db.sql("""select name, item_name, description,
+			stock_uom, brand, item_group
+		from `tabItem` {0}""".format(get_item_conditions(filters)), filters, as_dict=True))
+
+def get_stock_ledger_entries(filters, item_codes):
+	values = dict(filters, item_codes=tuple(item_codes))
+
 	return frappe.db.sql("""select
-			item.name, item.item_name, item_group, brand, description, item.stock_uom,
-			actual_qty, posting_date, voucher_type, qty_after_transaction
-		from `tabStock Ledger Entry` sle,
-			(select name, item_name, description, stock_uom, brand, item_group
-				from `tabItem` {item_conditions}) item
-		where item_code = item.name and
+			item_code, warehouse, actual_qty, posting_date, voucher_type, qty_after_transaction
+		from `tabStock Ledger Entry`
+		where item_code in %(item_codes)s and
 			company = %(company)s and
 			posting_date <= %(to_date)s
 			{sle_conditions}
-			order by posting_date, posting_time, sle.name"""\
-		.format(item_conditions=get_item_conditions(filters),
-			sle_conditions=get_sle_conditions(filters)), filters, as_dict=True)
+			order by item_code, posting_date, posting_time, name"""\
+		.format(sle_conditions=get_sle_conditions(filters)), values, as_dict=True)
 
 def get_item_conditions(filters):
 	conditions = []
@@ -4,10 +4,13 @@
 from __future__ import unicode_literals
 import frappe
 from frappe import _
-from frappe.utils import flt, cint, getdate
+from frappe.utils import flt, cint
+from erpnext.stock.doctype.stock_closing_balance.stock_closing_balance import get_stock_balances
 
 from six import iteritems
+from erpnext.utilities.report_cache import cached_report
 
+@cached_report("Stock Balance", doctypes=("Stock Ledger Entry", "Item", "Item Group", "Warehouse"))
 def execute(filters=None):
 	if not filters: filters = {}
 
@@ -80,64 +83,64 @@ def get_columns():
 
 	return columns
 
-def get_conditions(filters):
+def get_conditions(filters, values):
 	conditions = ""
 	if not filters.get("from_date"):
 		frappe.throw(_("'From Date' is required"))
 
 	if filters.get("to_date"):
-		conditions += " and sle.posting_date <= '%s'" % frappe.db.escape(filters.get("to_date"))
+		conditions += " and sle.posting_date >= %(from_date)s"
+		conditions += " and sle.posting_date <= %(to_date)s"
+		values.update({"from_date": filters.get("from_date"), "to_date": filters.get("to_date")})
 	else:
 		frappe.throw(_("'To Date' is required"))
 
-	if filters.get("item_group"):		
-		ig_details = frappe.db.get_value("Item Group", filters.get("item_group"), 
+	return conditions + get_item_warehouse_conditions(filters, values)
+
+def get_item_warehouse_conditions(filters, values):
+	"""Returns the item and warehouse conditions on `sle`, their values are added to `values`"""
+	conditions = ""
+	if filters.get("item_group"):
+		ig_details = frappe.db.get_value("Item Group", filters.get("item_group"),
 			["lft", "rgt"], as_dict=1)
-			
+
 		if ig_details:
-			conditions += """ 
-				and exists (select name from `tabItem Group` ig 
-				where ig.lft >= %s and ig.rgt <= %s and item.item_group = ig.name)
-			""" % (ig_details.lft, ig_details.rgt)
-		
+			conditions += """
+				and exists (select item.name from `tabItem` item, `tabItem Group` ig
+				where ig.lft >= %(item_group_lft)s and ig.rgt <= %(item_group_rgt)s
+					and item.item_group = ig.name and item.name = sle.item_code)"""
+			values.update({"item_group_lft": ig_details.lft, "item_group_rgt": ig_details.rgt})
+
 	if filters.get("item_code"):
-		conditions += " and sle.item_code = '%s'" % frappe.db.escape(filters.get("item_code"), percent=False)
+		conditions += " and sle.item_code = %(item_code)s"
+		values["item_code"] = filters.get("item_code")
 
 	if filters.get("warehouse"):
 		warehouse_details = frappe.db.get_value("Warehouse", filters.get("warehouse"), ["lft", "rgt"], as_dict=1)
 		if warehouse_details:
-			conditions += " and exists (select name from `tabWarehouse` wh \
-				where wh.lft >= %s and wh.rgt <= %s and sle.warehouse = wh.name)"%(warehouse_details.lft,
-				warehouse_details.rgt)
+			conditions += """ and exists (select name from `tabWarehouse` wh
+				where wh.lft >= %(warehouse_lft)s and wh.rgt <= %(warehouse_rgt)s and sle.warehouse = wh.name)"""
+			values.update({"warehouse_lft": warehouse_details.lft, "warehouse_rgt": warehouse_details.rgt})
 
 	return conditions
 
 def get_stock_ledger_entries(filters):
-	conditions = get_conditions(filters)
-	
-	join_table_query = ""
-	if filters.get("item_group"):
-		join_table_query = "inner join `tabItem` item on item.name = sle.item_code"
-	
+	values = {}
+	conditions = get_conditions(filters, values)
+
 	return frappe.db.sql("""
 		select
 			sle.item_code, warehouse, sle.posting_date, sle.actual_qty, sle.valuation_rate,
 			sle.company, sle.voucher_type, sle.qty_after_transaction, sle.stock_value_difference
 		from
-			`tabStock Ledger Entry` sle force index (posting_sort_index) %s
-		where sle.docstatus < 2 %s 
-		order by sle.posting_date, sle.posting_time, sle.name""" %
-		(join_table_query, conditions), as_dict=1)
+			`tabStock Ledger Entry` sle force index (posting_sort_index)
+		where sle.docstatus < 2 {0}
+		order by sle.posting_date, sle.posting_time, sle.name""".format(conditions), values, as_dict=1)
 
 def get_item_warehouse_map(filters):
 	iwb_map = {}
-	from_date = getdate(filters.get("from_date"))
-	to_date = getdate(filters.get("to_date"))
-
-	sle = get_stock_ledger_entries(filters)
 
-	for d in sle:
-		key = (d.company, d.item_code, d.warehouse)
+	def _get_qty_dict(key):
 		if key not in iwb_map:
 			iwb_map[key] = frappe._dict({
 				"opening_qty": 0.0, "opening_val": 0.0,
@@ -147,7 +150,19 @@ def get_item_warehouse_map(filters):
 				"val_rate": 0.0
 			})
 
-		qty_dict = iwb_map[(d.company, d.item_code, d.warehouse)]
+		return iwb_map[key]
+
+	# opening from the stock closing balances, only entries of the period are scanned
+	values = {}
+	conditions = get_item_warehouse_conditions(filters, values)
+	for key, d in iteritems(get_stock_balances(filters.get("from_date"), conditions, values)):
+			qty_dict = _get_qty_dict(key)
+			qty_dict.opening_qty = qty_dict.bal_qty = flt(d.qty_after_transaction)
+			qty_dict.opening_val = qty_dict.bal_val = flt(d.stock_value)
+			qty_dict.val_rate = d.valuation_rate
+
+	for d in get_stock_ledger_entries(filters):
+		qty_dict = _get_qty_dict((d.company, d.item_code, d.warehouse))
 
 		if d.voucher_type == "Stock Reconciliation":
 			qty_diff = flt(d.qty_after_transaction) - qty_dict.bal_qty
@@ -156,17 +171,12 @@ def get_item_warehouse_map(filters):
 
 		value_diff = flt(d.stock_value_difference)
 
-		if d.posting_date < from_date:
-			qty_dict.opening_qty += qty_diff
-			qty_dict.opening_val += value_diff
-
-		elif d.posting_date >= from_date and d.posting_date <= to_date:
-			if qty_diff > 0:
-				qty_dict.in_qty += qty_diff
-				qty_dict.in_val += value_diff
-			else:
-				qty_dict.out_qty += abs(qty_diff)
-				qty_dict.out_val += abs(value_diff)
+		if qty_diff > 0:
+			qty_dict.in_qty += qty_diff
+			qty_dict.in_val += value_diff
+		else:
+			qty_dict.out_qty += abs(qty_diff)
+			qty_dict.out_val += abs(value_diff)
 
 		qty_dict.val_rate = d.valuation_rate
 		qty_dict.bal_qty += qty_diff
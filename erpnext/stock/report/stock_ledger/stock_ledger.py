@@ -4,6 +4,7 @@
 from __future__ import unicode_literals
 import frappe
 from frappe import _
+from frappe.utils import flt
 
 def execute(filters=None):
 	columns = get_columns()
@@ -103,13 +104,19 @@ def get_opening_balance(filters, columns):
 	if not (filters.item_code and filters.warehouse and filters.from_date):
 		return
 
-	from erpnext.stock.stock_ledger import get_previous_sle
-	last_entry = get_previous_sle({
-		"item_code": filters.item_code,
-		"warehouse_condition": get_warehouse_condition(filters.warehouse),
-		"posting_date": filters.from_date,
-		"posting_time": "00:00:00"
+	from erpnext.stock.doctype.stock_closing_balance.stock_closing_balance import get_stock_balances
+	balances = get_stock_balances(filters.from_date, " and sle.item_code=%(item_code)s and {0}".format(
+		get_warehouse_condition(filters.warehouse) or "1=1"), {"item_code": filters.item_code}).values()
+
+	last_entry = frappe._dict({
+		"qty_after_transaction": sum([flt(d.qty_after_transaction) for d in balances]),
+		"stock_value": sum([flt(d.stock_value) for d in balances])
 	})
+	if len(balances) == 1:
+		last_entry.valuation_rate = list(balances)[0].valuation_rate
+	elif last_entry.qty_after_transaction:
+		last_entry.valuation_rate = last_entry.stock_value / last_entry.qty_after_transaction
+
 	row = [""]*len(columns)
 	row[1] = _("'Opening'")
 	for i, v in ((9, 'qty_after_transaction'), (11, 'valuation_rate'), (12, 'stock_value')):
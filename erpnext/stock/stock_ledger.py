@@ -6,6 +6,10 @@ import frappe, erpnext
 from frappe import _
 from frappe.utils import cint, flt, cstr, now
 from erpnext.stock.utils import get_valuation_method
+from erpnext.stock.doctype.stock_closing_balance.stock_closing_balance import update_closing_balances
+from erpnext.stock.doctype.serial_no_movement.serial_no_movement import delete_serial_no_movements
+from erpnext.stock.doctype.batch_bin.batch_bin import update_batch_bin
+from erpnext.utilities.report_cache import update_data_version
 import json
 
 from six import iteritems
@@ -38,10 +42,14 @@ def make_sl_entries(sl_entries, is_amended=None, allow_negative_stock=False, via
 				"is_amended": is_amended
 			})
 			update_bin(args, allow_negative_stock, via_landed_cost_voucher)
+			if sle_id:
+				update_batch_bin(args)
 
 		if cancel:
 			delete_cancelled_entry(sl_entries[0].get('voucher_type'), sl_entries[0].get('voucher_no'))
 
+		update_data_version("Stock Ledger Entry")
+
 def set_as_cancel(voucher_type, voucher_no):
 	frappe.db.sql("""update `tabStock Ledger Entry` set is_cancelled='Yes',
 		modified=%s, modified_by=%s
@@ -61,6 +69,8 @@ def make_entry(args, allow_negative_stock=False, via_landed_cost_voucher=False):
 def delete_cancelled_entry(voucher_type, voucher_no):
 	frappe.db.sql("""delete from `tabStock Ledger Entry`
 		where voucher_type=%s and voucher_no=%s""", (voucher_type, voucher_no))
+	delete_serial_no_movements(voucher_type, voucher_no)
+	update_data_version("Stock Ledger Entry")
 
 class update_entries_after(object):
 	"""
@@ -118,6 +128,9 @@ class update_entries_after(object):
 		if self.exceptions:
 			self.raise_exceptions()
 
+		update_closing_balances(self.item_code, self.warehouse, self.company,
+			self.previous_sle, entries_to_fix)
+
 		self.update_bin()
 
 	def update_bin(self):
@@ -0,0 +1,66 @@
+# Copyright (c) 2018, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+import unittest, frappe
+from erpnext.utilities.report_cache import (cached_report, run_cached_report, build_report_cache,
+	get_cache_key, get_data_version, get_stats)
+
+runs = []
+
+@cached_report("_Test Cached Report", doctypes=("ToDo",))
+def execute(filters=None):
+	runs.append(filters)
+	return [{"fieldname": "run", "label": "Run"}], [[len(runs)]]
+
+class TestReportCache(unittest.TestCase):
+	def setUp(self):
+		frappe.flags.use_report_cache = True
+		self.filters = {"test": frappe.generate_hash(length=10)}
+		del runs[:]
+
+	def tearDown(self):
+		frappe.flags.use_report_cache = False
+
+	def test_cached_report(self):
+		result = execute(self.filters)
+		self.assertEqual(execute(self.filters), result)
+		self.assertEqual(len(runs), 1)
+		self.assertTrue(get_stats("_Test Cached Report").get("hits"))
+
+		# other filters are cached separately
+		execute({"test": frappe.generate_hash(length=10)})
+		self.assertEqual(len(runs), 2)
+
+		# the uncached method always computes
+		execute.uncached(self.filters)
+		self.assertEqual(len(runs), 3)
+
+	def test_write_after_cached_run_recomputes(self):
+		execute(self.filters)
+		version = get_data_version(["ToDo"])
+
+		frappe.get_doc({"doctype": "ToDo", "description": "_Test Report Cache"}).insert()
+		self.assertNotEqual(get_data_version(["ToDo"]), version)
+
+		self.assertEqual(execute(self.filters)[1], [[2]])
+		self.assertEqual(len(runs), 2)
+
+	def test_run_cached_report(self):
+		result = run_cached_report("_Test Cached Report", execute.uncached, self.filters, ("ToDo",))
+		self.assertEqual(run_cached_report("_Test Cached Report", execute.uncached, self.filters,
+			("ToDo",)), result)
+		self.assertEqual(len(runs), 1)
+
+	def test_build_report_cache(self):
+		key = get_cache_key("_Test Cached Report", self.filters)
+		frappe.cache().set_value(key + ":job", 1)
+
+		build_report_cache("_Test Cached Report", "erpnext.tests.test_report_cache.execute",
+			self.filters, ("ToDo",), 3600)
+		self.assertEqual(len(runs), 1)
+		self.assertFalse(frappe.cache().get_value(key + ":job"))
+
+		# served from the cache built in the background
+		self.assertEqual(execute(self.filters)[1], [[1]])
+		self.assertEqual(len(runs), 1)
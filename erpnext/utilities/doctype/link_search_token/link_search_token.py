@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+'''Word index for the link field searches of Item, Customer and Supplier.
+
+Every record is split into lowercase words (name, searched fields and barcodes) stored as
+one row per word. A search matches the records having a word starting with each word typed,
+which is a range scan on the `(reference_doctype, token)` index instead of a `LIKE '%txt%'`
+scan over the master table.
+
+The index is maintained on save, rename and delete of the masters and built by
+`rebuild_search_index`, the queries fall back to `LIKE` until it is built.'''
+
+from __future__ import unicode_literals
+import frappe, re
+from frappe.utils import cstr, strip_html
+from frappe.model.document import Document
+from erpnext.utilities.raw_insert import bulk_insert
+
+INDEXED_DOCTYPES = ("Item", "Customer", "Supplier")
+MAX_TOKENS = 100
+MAX_SEARCH_WORDS = 5
+
+class LinkSearchToken(Document):
+	pass
+
+def on_doctype_update():
+	frappe.db.add_index("Link Search Token", ["reference_doctype", "token"])
+	frappe.db.add_index("Link Search Token", ["reference_doctype", "reference_name"])
+
+def is_search_index_built():
+	return frappe.db.get_default("link_search_index") == "1"
+
+def get_indexed_fields(doctype):
+	'''Returns the fields indexed along with `name`'''
+	if doctype == "Item":
+		return ["item_code", "item_group", "item_name", "description"]
+
+	fields = ["customer_name"] if doctype == "Customer" else ["supplier_name"]
+	return fields + [f for f in frappe.get_meta(doctype).get_search_fields()
+		if f not in fields and f != "name"]
+
+def get_words(value):
+	'''Returns the lowercase words of the value, in order and without duplicates'''
+	words = []
+	for word in re.split(r"[\W_]+", strip_html(cstr(value)).lower(), flags=re.UNICODE):
+		if word and word not in words:
+			words.append(word[:140])
+
+	return words
+
+def get_tokens(doctype, values):
+	tokens = []
+	for fieldname in ["name"] + get_indexed_fields(doctype) + ["barcodes"]:
+		value = values.get(fieldname)
+		for word in get_words(" ".join(value) if isinstance(value, list) else value):
+			if word not in tokens:
+				tokens.append(word)
+
+	return tokens[:MAX_TOKENS]
+
+def update_search_index(doc, method=None):
+	'''Updates the words of the master, called on update of Item, Customer and Supplier'''
+	if not is_search_index_built():
+		return
+
+	values = doc.as_dict()
+	if doc.doctype == "Item":
+		values["barcodes"] = [d.barcode for d in doc.get("barcodes") if d.barcode]
+
+	tokens = get_tokens(doc.doctype, values)
+	existing = frappe.db.sql_list("""select token from `tabLink Search Token`
+		where reference_doctype=%s and reference_name=%s""", (doc.doctype, doc.name))
+
+	if sorted(existing) != sorted(tokens):
+		delete_search_index(doc)
+		insert_tokens([(doc.doctype, doc.name, token) for token in tokens])
+
+def update_search_index_after_rename(doc, method, old, new, merge=False):
+	frappe.db.sql("""delete from `tabLink Search Token`
+		where reference_doctype=%s and reference_name=%s""", (doc.doctype, old))
+	update_search_index(frappe.get_doc(doc.doctype, new))
+
+def delete_search_index(doc, method=None):
+	frappe.db.sql("""delete from `tabLink Search Token`
+		where reference_doctype=%s and reference_name=%s""", (doc.doctype, doc.name))
+
+def insert_tokens(rows):
+	'''Inserts `(reference_doctype, reference_name, token)` rows'''
+	bulk_insert("Link Search Token", ("name", "reference_doctype", "reference_name", "token"),
+		[(frappe.generate_hash(length=10),) + tuple(row) for row in rows])
+
+def rebuild_search_index():
+	'''Rebuilds the index of all the indexed doctypes and enables it for the link queries'''
+	frappe.db.sql("delete from `tabLink Search Token`")
+
+	for doctype in INDEXED_DOCTYPES:
+		barcodes = {}
+		if doctype == "Item":
+			for parent, barcode in frappe.db.sql("""select parent, barcode from `tabItem Barcode`
+				where ifnull(barcode, '') != ''"""):
+				barcodes.setdefault(parent, []).append(barcode)
+
+		fields = ["name"] + [f for f in get_indexed_fields(doctype) if f != "name"]
+		rows = []
+		for d in frappe.db.sql("select {0} from `tab{1}`".format(
+			", ".join("`{0}`".format(f) for f in fields), doctype), as_dict=1):
+			d.barcodes = barcodes.get(d.name, [])
+			rows.extend([(doctype, d.name, token) for token in get_tokens(doctype, d)])
+
+			if len(rows) >= 5000:
+				insert_tokens(rows)
+				rows = []
+
+		insert_tokens(rows)
+
+	frappe.db.set_default("link_search_index", "1")
+
+def get_search_index_join(doctype, txt, searchfields):
+	'''Returns the join on the index restricting `tab{doctype}` to the records having a word
+		starting with each word of `txt`, and its values. Returns None if the LIKE search is
+		to be used, i.e. the index is not built or a searched field is not indexed'''
+	words = get_words(txt)[:MAX_SEARCH_WORDS]
+	if not (words and is_search_index_built()):
+		return
+
+	indexed_fields = ["name"] + get_indexed_fields(doctype)
+	if [f for f in searchfields if f not in indexed_fields]:
+		return
+
+	values = {"search_doctype": doctype}
+	for i, word in enumerate(words):
+		values["search_word_{0}".format(i)] = word.replace("\\", "\\\\") \
+			.replace("%", "\\%").replace("_", "\\_") + "%"
+
+	keys = ["%(search_word_{0})s".format(i) for i in range(len(words))]
+	join = """inner join (select reference_name from `tabLink Search Token`
+			where reference_doctype=%(search_doctype)s and ({conditions})
+			group by reference_name
+			having {having}) search_index
+		on search_index.reference_name = `tab{doctype}`.name""".format(
+			conditions=" or ".join("token like " + key for key in keys),
+			having=" and ".join("max(token like {0}) = 1".format(key) for key in keys),
+			doctype=doctype)
+
+	return join, values
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2018, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from erpnext.controllers.queries import item_query, customer_query
+from erpnext.utilities.doctype.link_search_token.link_search_token import (rebuild_search_index,
+	get_search_index_join)
+
+test_dependencies = ["Item", "Customer"]
+
+class TestLinkSearchToken(unittest.TestCase):
+	def setUp(self):
+		rebuild_search_index()
+
+	def test_link_queries_use_search_index(self):
+		self.assertTrue(get_search_index_join("Item", "test ite", ["name"]))
+
+		items = [d[0] for d in item_query("Item", "ite _tes", "name", 0, 20, {})]
+		self.assertTrue("_Test Item" in items)
+
+		customers = [d[0] for d in customer_query("Customer", "cust test", "name", 0, 20, {})]
+		self.assertTrue("_Test Customer" in customers)
+
+	def test_link_queries_match_inside_words(self):
+		# the index only matches the start of words, the LIKE search tops up the results
+		items = [d[0] for d in item_query("Item", "est ite", "name", 0, 20, {})]
+		self.assertTrue("_Test Item" in items)
+		self.assertEqual(len(items), len(set(items)))
+
+	def test_link_query_pages(self):
+		# pages are sliced from the indexed results followed by the LIKE matches
+		items = [d[0] for d in item_query("Item", "test", "name", 0, 6, {})]
+		pages = [d[0] for start in range(0, 6, 2) for d in item_query("Item", "test", "name", start, 2, {})]
+		self.assertEqual(pages, items)
+
+	def test_search_index_updated_on_save(self):
+		item = frappe.get_doc("Item", "_Test Item")
+		item.item_name = "_Test Item Searchable Widget"
+		item.save()
+
+		items = [d[0] for d in item_query("Item", "searchable wid", "name", 0, 20, {})]
+		self.assertEqual(items, ["_Test Item"])
+
+		item.item_name = "_Test Item"
+		item.save()
+		self.assertFalse(item_query("Item", "searchable wid", "name", 0, 20, {}))
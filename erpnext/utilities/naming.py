@@ -0,0 +1,44 @@
+# Copyright (c) 2018, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe import _
+from frappe.utils import cint, now_datetime
+
+def get_names_from_series(series, qty):
+	"""Returns `qty` consecutive names from the naming series (e.g. `GL.#######`), the block
+		is reserved with a single update of the series counter instead of one `make_autoname` per name"""
+	if "#" not in series:
+		series = series + ".#####"
+	elif "." not in series:
+		frappe.throw(_("Invalid naming series (. missing)"))
+
+	today = now_datetime()
+	date_parts = {
+		"YY": today.strftime("%y"),
+		"MM": today.strftime("%m"),
+		"DD": today.strftime("%d"),
+		"YYYY": today.strftime("%Y")
+	}
+
+	prefix, suffix, digits = "", "", None
+	for part in series.split("."):
+		if part.startswith("#"):
+			if digits is None:
+				digits = len(part)
+		elif digits is None:
+			prefix += date_parts.get(part, part)
+		else:
+			suffix += date_parts.get(part, part)
+
+	current = frappe.db.sql("select `current` from `tabSeries` where name=%s for update", prefix)
+	if current and current[0][0] is not None:
+		current = cint(current[0][0])
+		frappe.db.sql("update `tabSeries` set `current` = `current` + %s where name=%s", (qty, prefix))
+	else:
+		current = 0
+		frappe.db.sql("insert into `tabSeries` (name, `current`) values (%s, %s)", (prefix, qty))
+
+	return [prefix + ("%0" + str(digits) + "d") % (current + i) + suffix
+		for i in range(1, cint(qty) + 1)]
@@ -0,0 +1,53 @@
+# Copyright (c) 2018, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe.utils import now
+
+def bulk_insert(doctype, fields, rows, docstatus=0, chunk_size=500, after_chunk=None):
+	"""Inserts `rows`, tuples of the values of `fields` (which must include `name`), in `tab{doctype}`
+		with multi-row inserts of `chunk_size` rows. The standard columns are set by this method,
+		the document controller is not run so the rows must be validated by the caller.
+		`after_chunk` is called with the number of rows inserted so far after every chunk"""
+	timestamp, user = now(), frappe.session.user
+	standard_values = (timestamp, timestamp, user, user, docstatus)
+
+	fields = tuple(fields) + ("creation", "modified", "owner", "modified_by", "docstatus")
+	row_placeholder = "({0})".format(", ".join(["%s"] * len(fields)))
+
+	for i in range(0, len(rows), chunk_size):
+		chunk = rows[i:i + chunk_size]
+		frappe.db.sql("""insert into `tab{doctype}` ({fields}) values {values}""".format(
+			doctype=doctype,
+			fields=", ".join("`{0}`".format(f) for f in fields),
+			values=", ".join([row_placeholder] * len(chunk))),
+			tuple([value for row in chunk for value in tuple(row) + standard_values]))
+
+		if after_chunk:
+			after_chunk(i + len(chunk))
+
+def add_to_row(doctype, key, amounts, values=None):
+	"""Adds `amounts` ({fieldname: amount}) to the row of `tab{doctype}` having the unique
+		`key` ({fieldname: value}), inserting the row with `values` if it does not exist.
+		Done in a single statement against the unique key, so that concurrent postings
+		neither overwrite each other nor create two rows"""
+	timestamp = now()
+	row = dict(values or {})
+	row.update(key)
+	row.update(amounts)
+	row.update({
+		"name": frappe.generate_hash(length=10),
+		"creation": timestamp,
+		"modified": timestamp,
+		"owner": frappe.session.user,
+		"modified_by": frappe.session.user,
+		"docstatus": 0
+	})
+
+	frappe.db.sql("""insert into `tab{doctype}` ({fields}) values ({values})
+		on duplicate key update {updates}, modified = values(modified)""".format(
+			doctype=doctype,
+			fields=", ".join("`{0}`".format(f) for f in row),
+			values=", ".join("%({0})s".format(f) for f in row),
+			updates=", ".join("`{0}` = `{0}` + values(`{0}`)".format(f) for f in amounts)), row)
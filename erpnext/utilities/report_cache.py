@@ -0,0 +1,162 @@
+# Copyright (c) 2018, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+'''Result cache for heavy query reports.
+
+Decorate the `execute` method of a report with `cached_report`. Results are cached per report,
+user and filters along with the data version of the doctypes the report reads, a counter
+incremented in the transaction writing the doctype. A cached result is served as long as the
+version is unchanged.
+
+Reports that took longer than `background_after` seconds on their last run are computed in a
+background job, the previous result (or an empty report) is returned in the meantime.'''
+
+from __future__ import unicode_literals
+import frappe, json, hashlib, time
+from frappe import _
+from frappe.utils import cint
+from functools import wraps
+
+def cached_report(report_name, doctypes=("GL Entry",), background_after=30, expires_in_sec=6*3600):
+	def decorator(execute):
+		@wraps(execute)
+		def wrapper(filters=None):
+			return run_cached_report(report_name, execute, filters, doctypes,
+				background_after, expires_in_sec)
+
+		wrapper.uncached = execute
+		return wrapper
+
+	return decorator
+
+def run_cached_report(report_name, execute, filters, doctypes, background_after=30, expires_in_sec=6*3600):
+	if (frappe.flags.in_test and not frappe.flags.use_report_cache) or frappe.flags.in_background_report:
+		return execute(filters)
+
+	key = get_cache_key(report_name, filters)
+	register_doctypes(doctypes)
+	version = get_data_version(doctypes)
+
+	cached = frappe.cache().get_value(key)
+	if cached and cached.get("version") == version:
+		update_stats(report_name, hits=1)
+		return cached.get("result")
+
+	update_stats(report_name, misses=1)
+	stats = get_stats(report_name)
+
+	if stats.get("last_compute_time", 0) > background_after and (cached or stats.get("columns")):
+		if not frappe.cache().get_value(key + ":job"):
+			frappe.cache().set_value(key + ":job", 1, expires_in_sec=3600)
+			frappe.enqueue("erpnext.utilities.report_cache.build_report_cache", queue="long",
+				timeout=3600, report_name=report_name, method=get_method_path(execute),
+				filters=filters, doctypes=doctypes, expires_in_sec=expires_in_sec)
+			update_stats(report_name, background_runs=1)
+
+		message = _("This report is being updated in the background, please refresh in a while.")
+		if cached:
+			return with_message(cached.get("result"), message)
+
+		return stats.get("columns"), [], message
+
+	return compute_report(report_name, execute, filters, key, version, expires_in_sec)
+
+def compute_report(report_name, execute, filters, key, version, expires_in_sec):
+	start = time.time()
+	result = execute(filters)
+	compute_time = time.time() - start
+
+	frappe.cache().set_value(key, {"version": version, "result": result}, expires_in_sec=expires_in_sec)
+	update_stats(report_name, last_compute_time=compute_time, compute_time=compute_time,
+		columns=result[0] if result else None)
+
+	return result
+
+def build_report_cache(report_name, method, filters, doctypes, expires_in_sec):
+	'''Background job, computes the report and updates the cache'''
+	key = get_cache_key(report_name, filters)
+	execute = frappe.get_attr(method)
+	execute = getattr(execute, "uncached", execute)
+
+	frappe.flags.in_background_report = True
+	try:
+		compute_report(report_name, execute, filters, key, get_data_version(doctypes), expires_in_sec)
+	finally:
+		frappe.flags.in_background_report = False
+		frappe.cache().delete_value(key + ":job")
+
+def get_cache_key(report_name, filters):
+	filters = json.dumps(filters or {}, sort_keys=True, default=str)
+	return "report_cache:{0}:{1}".format(report_name,
+		hashlib.md5("{0}:{1}".format(frappe.session.user, filters).encode("utf-8")).hexdigest())
+
+def get_data_version(doctypes):
+	'''Returns the data version of the doctypes, counters kept in `tabSeries` and incremented by
+		`update_data_version` in the transaction writing the records. The version is read from the
+		database along with the data, so a report running while a write is not yet committed
+		computes the old data under the old version, and the next run after the commit recomputes'''
+	versions = dict(frappe.db.sql("""select name, `current` from `tabSeries` where name in %(names)s""",
+		{"names": tuple(get_version_series(doctype) for doctype in doctypes)}))
+
+	return [[doctype, cint(versions.get(get_version_series(doctype)))] for doctype in doctypes]
+
+def update_data_version(doctype):
+	'''Invalidates the cached reports reading the doctype, called for the ledgers by the
+		posting and cancelling methods and for the other doctypes on write via `doc_events`'''
+	frappe.db.sql("""insert into `tabSeries` (name, `current`) values (%s, 1)
+		on duplicate key update `current` = `current` + 1""", get_version_series(doctype))
+
+def update_doc_data_version(doc, method=None):
+	# only for the doctypes read by a cached report, not to lock a version row on every write
+	if frappe.cache().hget("report_cache_doctypes", doc.doctype):
+		update_data_version(doc.doctype)
+
+def register_doctypes(doctypes):
+	for doctype in doctypes:
+		frappe.cache().hset("report_cache_doctypes", doctype, 1)
+
+def get_version_series(doctype):
+	return "report_data_version:" + doctype
+
+def get_method_path(execute):
+	return "{0}.{1}".format(execute.__module__, execute.__name__)
+
+def with_message(result, message):
+	result = list(result)
+	if len(result) == 2:
+		result.append(message)
+
+	return result
+
+def update_stats(report_name, hits=0, misses=0, background_runs=0, compute_time=0,
+	last_compute_time=None, columns=None):
+	stats = get_stats(report_name)
+	stats["hits"] = stats.get("hits", 0) + hits
+	stats["misses"] = stats.get("misses", 0) + misses
+	stats["background_runs"] = stats.get("background_runs", 0) + background_runs
+
+	if last_compute_time is not None:
+		stats["runs"] = stats.get("runs", 0) + 1
+		stats["total_compute_time"] = stats.get("total_compute_time", 0) + compute_time
+		stats["last_compute_time"] = last_compute_time
+
+	if columns is not None:
+		stats["columns"] = columns
+
+	frappe.cache().hset("report_cache_stats", report_name, stats)
+
+def get_stats(report_name):
+	return frappe.cache().hget("report_cache_stats", report_name) or {}
+
+@frappe.whitelist()
+def get_report_cache_stats():
+	'''Returns hits, misses, background runs and compute times of the cached reports'''
+	frappe.only_for("System Manager")
+
+	stats = {}
+	for report_name in frappe.cache().hkeys("report_cache_stats"):
+		report_name = frappe.as_unicode(report_name)
+		stats[report_name] = get_stats(report_name)
+		stats[report_name].pop("columns", None)
+
+	return stats